@@ -6,8 +6,10 @@ import queue
 from datetime import datetime
 import tkinter as tk
 from tkinter import ttk
-from joblib import load
+import json
+import time
 import sqlite3
+from collections import deque, Counter
 import pandas as pd
 import numpy as np
 import random
@@ -22,28 +24,52 @@ if SRC_DIR not in sys.path:
 if PROJECT_ROOT not in sys.path:
     sys.path.append(PROJECT_ROOT)
 
-from config_and_db import DB_PATH, MODEL_DIR, DEFAULT_INTERFACE, init_db
-from realtime_flow_predict import process_packet
+from config_and_db import DB_PATH, MODEL_DIR, default_interface, init_db
+from model_registry import ModelRegistry, DEFAULT_MODELS, FEATURE_SCHEMA_PATH
+from reservoir import StratifiedReservoir
+from engine_service import EngineClient, engine_running, spawn_engine, SOCKET_PATH
+from cascade import CASCADE_CONFIG
 
-# inicjalizacja DB
-init_db()
+# --------------------------------------------------------------------
+# MODELE (rejestr: mmap + podmiana nowych wersji bez restartu)
+# ładowane przy pierwszym użyciu, nie przy imporcie modułu
+# --------------------------------------------------------------------
+registry = ModelRegistry(MODEL_DIR)
+_models_loaded = None
+_models_lock = threading.Lock()
+
+def get_models():
+    global _models_loaded
+    if _models_loaded is None:
+        with _models_lock:
+            if _models_loaded is None:
+                models = registry.live(DEFAULT_MODELS)
+                models.watch()
+                _models_loaded = models
+    return _models_loaded
 
 # --------------------------------------------------------------------
-# MODELE
+# OPCJE SILNIKA (spawn_engine)
 # --------------------------------------------------------------------
-models_loaded = {}
-MODEL_FILES = {
-    "rf": os.path.join(MODEL_DIR, "RandomForest_pipeline.pkl"),
-    "lr": os.path.join(MODEL_DIR, "LogisticRegression_pipeline.pkl"),
-    "mlp": os.path.join(MODEL_DIR, "MLP_pipeline.pkl")
-}
-
-for key, path in MODEL_FILES.items():
-    try:
-        models_loaded[key] = load(path)
-        print(f"Załadowano model: {key} ({path})")
-    except Exception as e:
-        print(f"Nie udało się załadować modelu {key}: {e}")
+ENGINE_CASCADE = True       # kaskada z progami z cascade.json (jeśli kalibracja była uruchomiona)
+ENGINE_REDUCED = False      # modele <Nazwa>Reduced + przycięta ekstrakcja (feature_pruning.py)
+ENGINE_ONLINE_MODEL = False # OnlineSGD z online_update.py w głosowaniu (nie razem z ENGINE_REDUCED)
+ENGINE_PREFILTER = False    # prefiltr floodów (flood_prefilter.py)
+
+def engine_args(models=None):
+    """models: skróty zaznaczonych modeli (checkboxy) — silnik głosuje tylko nimi."""
+    args = []
+    if models:
+        args += ["--models", *models]
+    if ENGINE_CASCADE and os.path.exists(CASCADE_CONFIG):
+        args += ["--cascade", CASCADE_CONFIG]
+    if ENGINE_REDUCED:
+        args += ["--reduced", FEATURE_SCHEMA_PATH]
+    elif ENGINE_ONLINE_MODEL:
+        args += ["--online-model"]
+    if ENGINE_PREFILTER:
+        args += ["--prefilter"]
+    return args
 
 # --------------------------------------------------------------------
 # CSV do generatorów
@@ -52,6 +78,21 @@ DATA_DIR = os.path.join(PROJECT_ROOT, "data", "normalized")
 ATTACK_CSV = os.path.join(DATA_DIR, "Thursday-WorkingHours-Afternoon-Infilteration.pcap_ISCX_clean.csv")
 BENIGN_CSV = os.path.join(DATA_DIR, "Friday-WorkingHours-Morning.pcap_ISCX_clean.csv")
 
+# Pule próbek: CSV czytane raz w tle (chunkami), per klasa rezerwuar float32,
+# zapisywany jako .npy (kolejne starty: mmap, bez parsowania CSV)
+POOL_SIZE = 20_000          # wierszy na klasę
+POOL_CSV_CHUNK = 50_000
+POOL_CACHE_DIR = os.path.join(DATA_DIR, "gui_pools")
+BURST_DEFAULT = 500
+
+# Widok flow: ograniczony bufor wierszy + limit wstawień na tick, agregaty w stałym rytmie
+MAX_TREE_ROWS = 1_000           # tyle ostatnich flow trzyma Treeview
+MAX_INSERTS_PER_TICK = 100      # reszta zdarzeń z ticka trafia tylko do liczników
+MAX_DRAIN_PER_TICK = 50_000     # górny limit zdarzeń zdejmowanych z kolejki w jednym ticku
+GUI_TICK_MS = 100
+STATS_TICK_MS = 1_000
+TOP_SOURCES = 5
+
 # --------------------------------------------------------------------
 # Kolejka GUI
 # --------------------------------------------------------------------
@@ -68,28 +109,107 @@ def random_port():
     return random.randint(1024, 65535)
 
 # --------------------------------------------------------------------
-# Predykcja pojedynczego modelu
-# --------------------------------------------------------------------
-def predict_single(features, model):
-    X = np.array(features, dtype=float).reshape(1, -1)
-    return int(model.predict(X)[0])
-
-# --------------------------------------------------------------------
-# Generator flow z CSV
+# Pule próbek z CSV (zamiast pd.read_csv całego pliku przy każdym kliknięciu)
 # --------------------------------------------------------------------
-def load_random_flow(csv_path):
-    try:
-        df = pd.read_csv(csv_path)
-    except Exception as e:
-        print(f"Błąd wczytywania CSV {csv_path}: {e}")
-        return None
-
-    df = df.sample(1)              # losowy wiersz
-    if "Label" in df.columns:
-        df = df.drop(columns=["Label"])
-
-    features = df.values.flatten().astype(float).tolist()
-    return features
+def _csv_signature(paths):
+    return {p: [os.path.getmtime(p), os.path.getsize(p)] for p in paths if os.path.exists(p)}
+
+
+class SamplePools:
+    """
+    Per-klasowe pule gotowych wierszy cech (float32), budowane w wątku w tle.
+    Klasa wiersza z kolumny Label (BENIGN → 0, reszta → 1); plik bez Label → klasa z `sources`.
+    """
+    def __init__(self, sources, pool_size=POOL_SIZE, cache_dir=POOL_CACHE_DIR, seed=None):
+        self.sources = sources              # {ścieżka_csv: domyślna_klasa}
+        self.pool_size = pool_size
+        self.cache_dir = cache_dir
+        self.rng = np.random.default_rng(seed)
+        self.pools = {}
+        self.ready = threading.Event()
+        self.error = None
+
+    def start(self):
+        threading.Thread(target=self._load, daemon=True).start()
+        return self
+
+    # ---------------- cache .npy ----------------
+    def _meta_path(self):
+        return os.path.join(self.cache_dir, "pools.json")
+
+    def _load_cache(self, signature):
+        try:
+            with open(self._meta_path()) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("signature") != signature or meta.get("pool_size") != self.pool_size:
+            return None
+        return {int(label): np.load(os.path.join(self.cache_dir, f"pool_{label}.npy"), mmap_mode="r")
+                for label in meta["labels"]}
+
+    def _save_cache(self, signature):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for label, rows in self.pools.items():
+            path = os.path.join(self.cache_dir, f"pool_{label}.npy")
+            tmp = path + ".tmp.npy"
+            np.save(tmp, rows)
+            os.replace(tmp, path)
+        with open(self._meta_path(), "w") as f:
+            json.dump({"signature": signature, "pool_size": self.pool_size,
+                       "labels": sorted(self.pools)}, f)
+
+    # ---------------- budowa pul ----------------
+    def _stream_csv(self, path, default_label, reservoir, n_features):
+        for chunk in pd.read_csv(path, chunksize=POOL_CSV_CHUNK, low_memory=False):
+            if "Label" in chunk.columns:
+                y = (chunk["Label"].astype(str).str.strip() != "BENIGN").to_numpy(np.int8)
+                chunk = chunk.drop(columns=["Label"])
+            else:
+                y = np.full(len(chunk), default_label, dtype=np.int8)
+            X = chunk.apply(pd.to_numeric, errors="coerce").to_numpy(np.float32)
+            if n_features is not None and X.shape[1] != n_features:
+                print(f"⚠️ {os.path.basename(path)}: {X.shape[1]} kolumn zamiast {n_features} — pomijam plik")
+                return n_features
+            X = np.nan_to_num(X, nan=0.0, posinf=0.0, neginf=0.0)
+            reservoir.add(X, y)
+            n_features = X.shape[1]
+        return n_features
+
+    def _load(self):
+        try:
+            signature = _csv_signature(self.sources)
+            cached = self._load_cache(signature)
+            if cached:
+                self.pools = cached
+            else:
+                reservoir = StratifiedReservoir(self.pool_size, seed=self.rng, dtype=np.float32)
+                n_features = None
+                for path, label in self.sources.items():
+                    if not os.path.exists(path):
+                        print(f"⚠️ Brak pliku {path}")
+                        continue
+                    n_features = self._stream_csv(path, label, reservoir, n_features)
+                self.pools = {int(k): v for k, v in reservoir.values().items() if len(v)}
+                if self.pools:
+                    self._save_cache(signature)
+            sizes = ", ".join(f"{k}: {len(v)}" for k, v in sorted(self.pools.items()))
+            print(f"✅ Pule próbek gotowe ({sizes})" if self.pools else "❌ Pule próbek puste")
+        except Exception as e:
+            self.error = e
+            print(f"❌ Błąd budowy pul próbek: {e}")
+        finally:
+            self.ready.set()
+
+    def sample(self, label, n=1):
+        """n losowych wierszy klasy `label` (ze zwracaniem) albo None, gdy pula niegotowa/pusta."""
+        pool = self.pools.get(label) if self.ready.is_set() else None
+        if pool is None or len(pool) == 0:
+            return None
+        return np.asarray(pool[self.rng.integers(0, len(pool), size=n)])
+
+
+sample_pools = SamplePools({ATTACK_CSV: 1, BENIGN_CSV: 0})
 
 # --------------------------------------------------------------------
 # GUI
@@ -126,6 +246,30 @@ class FirewallGUI:
         self.gen_benign_btn = tk.Button(frame_buttons, text="Generate BENIGN flow", command=self.generate_benign_flow)
         self.gen_benign_btn.pack(side="left", padx=5)
 
+        self.burst_var = tk.StringVar(value=str(BURST_DEFAULT))
+        tk.Spinbox(frame_buttons, from_=1, to=100_000, width=7, textvariable=self.burst_var).pack(side="left")
+        self.gen_burst_btn = tk.Button(frame_buttons, text="Generate N flows", command=self.generate_burst)
+        self.gen_burst_btn.pack(side="left", padx=5)
+
+        # AGREGATY
+        frame_stats = tk.LabelFrame(root, text="Statystyki")
+        frame_stats.pack(fill="x", padx=5, pady=5)
+        self.stats_var = tk.StringVar(value="flows/s: 0   drops/s: 0")
+        self.top_var = tk.StringVar(value="top źródła: -")
+        tk.Label(frame_stats, textvariable=self.stats_var, anchor="w").pack(fill="x")
+        tk.Label(frame_stats, textvariable=self.top_var, anchor="w").pack(fill="x")
+        self.engine_var = tk.StringVar(value="silnik: odłączony")
+        tk.Label(frame_stats, textvariable=self.engine_var, anchor="w").pack(fill="x")
+        self.engine_proc = None
+        self.engine_client = None
+        self.engine_stats = None
+
+        self.tree_rows = deque()
+        self.total_flows = self.total_drops = self.skipped_rows = 0
+        self.stats_ts, self.stats_flows, self.stats_drops = time.monotonic(), 0, 0
+        self.window_sources = Counter()
+        self.window_drop_sources = Counter()
+
         # LOGI
         frame_logs = tk.LabelFrame(root, text="Flowy")
         frame_logs.pack(fill="both", expand=True, padx=5, pady=5)
@@ -140,11 +284,14 @@ class FirewallGUI:
         self.tree.pack(fill="both", expand=True)
 
         self.update_gui_from_queue()
+        self.update_stats()
+        self.update_engine_status()
 
     # --------------------------------------------------------------------
     # Modele zaznaczone
     # --------------------------------------------------------------------
     def get_enabled_model(self):
+        models_loaded = get_models()
         if self.rf_var.get() and "rf" in models_loaded:
             return "rf", models_loaded["rf"]
         if self.lr_var.get() and "lr" in models_loaded:
@@ -153,13 +300,18 @@ class FirewallGUI:
             return "mlp", models_loaded["mlp"]
         return None, None
 
+    def get_enabled_models(self):
+        """Skróty zaznaczonych modeli — wybór modeli głosujących w silniku."""
+        enabled = {"rf": self.rf_var.get(), "lr": self.lr_var.get(), "mlp": self.mlp_var.get()}
+        return [name for name, on in enabled.items() if on]
+
     # --------------------------------------------------------------------
-    # Dodawanie flow do GUI
+    # Dodawanie flow do GUI (bufor pierścieniowy MAX_TREE_ROWS)
     # --------------------------------------------------------------------
-    def add_flow_to_tree(self, flow_key, pkt_count, pred, decision):
-        ts = datetime.now().isoformat()
+    def add_flow_to_tree(self, flow_key, pkt_count, pred, decision, ts=None):
+        ts = ts or datetime.now().isoformat()
 
-        self.tree.insert("", 0, values=(
+        iid = self.tree.insert("", 0, values=(
             ts,
             flow_key[0],
             flow_key[1],
@@ -170,93 +322,183 @@ class FirewallGUI:
             pred,
             decision
         ))
+        self.tree_rows.append(iid)
+
+    def trim_tree(self):
+        excess = len(self.tree_rows) - MAX_TREE_ROWS
+        if excess > 0:
+            self.tree.delete(*(self.tree_rows.popleft() for _ in range(excess)))
 
     def update_gui_from_queue(self):
-        while not packet_queue.empty():
-            flow_key, pkt_count, pred, decision = packet_queue.get()
-            self.add_flow_to_tree(flow_key, pkt_count, pred, decision)
-        self.root.after(200, self.update_gui_from_queue)
+        # zdejmujemy zdarzenia (z limitem), wszystkie liczą się do agregatów,
+        # a do Treeview trafia tylko MAX_INSERTS_PER_TICK najnowszych
+        batch = []
+        try:
+            for _ in range(MAX_DRAIN_PER_TICK):
+                batch.append(packet_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        if batch:
+            self.total_flows += len(batch)
+            drops = [ev[0][0] for ev in batch if ev[3] == "DROP"]
+            self.total_drops += len(drops)
+            self.window_sources.update(ev[0][0] for ev in batch)
+            self.window_drop_sources.update(drops)
+
+            shown = batch[-MAX_INSERTS_PER_TICK:]
+            self.skipped_rows += len(batch) - len(shown)
+            ts = datetime.now().isoformat()
+            for flow_key, pkt_count, pred, decision in shown:
+                self.add_flow_to_tree(flow_key, pkt_count, pred, decision, ts)
+            self.trim_tree()
+
+        self.root.after(GUI_TICK_MS, self.update_gui_from_queue)
+
+    def update_stats(self):
+        now = time.monotonic()
+        dt = max(now - self.stats_ts, 1e-6)
+        flows_rate = (self.total_flows - self.stats_flows) / dt
+        drops_rate = (self.total_drops - self.stats_drops) / dt
+        self.stats_ts, self.stats_flows, self.stats_drops = now, self.total_flows, self.total_drops
+
+        top = self.window_drop_sources.most_common(TOP_SOURCES) or self.window_sources.most_common(TOP_SOURCES)
+        self.window_sources = Counter()
+        self.window_drop_sources = Counter()
+
+        self.stats_var.set(
+            f"flows/s: {flows_rate:,.0f}   drops/s: {drops_rate:,.0f}   "
+            f"flow: {self.total_flows:,}   DROP: {self.total_drops:,}   "
+            f"pominięte w widoku: {self.skipped_rows:,}"
+        )
+        self.top_var.set("top źródła: " + (", ".join(f"{ip} ({n})" for ip, n in top) or "-"))
+        self.root.after(STATS_TICK_MS, self.update_stats)
 
     # --------------------------------------------------------------------
-    # Generate flows from CSV
+    # Generate flows z pul próbek (jedno wywołanie predict na całą paczkę)
     # --------------------------------------------------------------------
-    def generate_attack_flow(self):
+    def generate_flows(self, labels):
         model_name, model = self.get_enabled_model()
         if model is None:
             print("Brak włączonego modelu.")
-            return
-
-        features = load_random_flow(ATTACK_CSV)
-        if features is None:
-            print("Nie udało się wygenerować attack flow.")
-            return
-
-        pred = predict_single(features, model)
-        decision = "DROP" if pred == 1 else "ACCEPT"
-
-        flow_key = (random_ip(), random_ip(), random_port(), random_port(), 6)
-        pkt_count = int(features[15]) if len(features) > 15 else 1
+            return None
+        if not sample_pools.ready.is_set():
+            print("⚠️ Pule próbek jeszcze się ładują...")
+            return None
+
+        labels = np.asarray(labels, dtype=np.int8)
+        parts, truth = [], []
+        for label in (0, 1):
+            n = int((labels == label).sum())
+            if n == 0:
+                continue
+            rows = sample_pools.sample(label, n)
+            if rows is None:
+                print(f"Brak próbek klasy {'ATTACK' if label else 'BENIGN'}.")
+                continue
+            parts.append(rows)
+            truth.append(np.full(n, label, dtype=np.int8))
+        if not parts:
+            return None
+
+        X = np.concatenate(parts)
+        y = np.concatenate(truth)
+        preds = np.asarray(model.predict(X)).astype(int)
+
+        for features, pred in zip(X, preds):
+            decision = "DROP" if pred == 1 else "ACCEPT"
+            flow_key = (random_ip(), random_ip(), random_port(), random_port(), 6)
+            pkt_count = int(features[15]) if len(features) > 15 else 1
+            packet_queue.put((flow_key, pkt_count, int(pred), decision))
+        return y, preds
 
-        packet_queue.put((flow_key, pkt_count, pred, decision))
-        print(f"ATTACK → pred={pred}, decision={decision}")
+    def generate_attack_flow(self):
+        res = self.generate_flows([1])
+        if res is not None:
+            pred = int(res[1][0])
+            print(f"ATTACK → pred={pred}, decision={'DROP' if pred == 1 else 'ACCEPT'}")
 
     def generate_benign_flow(self):
-        model_name, model = self.get_enabled_model()
-        if model is None:
-            print("Brak włączonego modelu.")
-            return
-
-        features = load_random_flow(BENIGN_CSV)
-        if features is None:
-            print("Nie udało się wygenerować benign flow.")
+        res = self.generate_flows([0])
+        if res is not None:
+            pred = int(res[1][0])
+            print(f"BENIGN → pred={pred}, decision={'DROP' if pred == 1 else 'ACCEPT'}")
+
+    def generate_burst(self):
+        try:
+            n = max(1, int(self.burst_var.get()))
+        except ValueError:
+            print("Niepoprawna liczba flow.")
             return
-
-        pred = predict_single(features, model)
-        decision = "DROP" if pred == 1 else "ACCEPT"
-
-        flow_key = (random_ip(), random_ip(), random_port(), random_port(), 6)
-        pkt_count = int(features[15]) if len(features) > 15 else 1
-
-        packet_queue.put((flow_key, pkt_count, pred, decision))
-        print(f"BENIGN → pred={pred}, decision={decision}")
+        labels = np.zeros(n, dtype=np.int8)
+        labels[:n // 2] = 1
+        res = self.generate_flows(labels)
+        if res is not None:
+            y, preds = res
+            acc = float((y == preds).mean())
+            print(f"Burst {len(y)} flow → DROP={int(preds.sum())}, ACCEPT={int((preds == 0).sum())}, "
+                  f"trafność={acc:.3f}")
 
     # --------------------------------------------------------------------
-    # Sniffing
+    # Sniffing — silnik w osobnym procesie (engine_service), GUI jako klient
     # --------------------------------------------------------------------
+    def on_engine_event(self, event):
+        # wątek klienta: tylko kolejka, Tk dotykany wyłącznie z update_gui_from_queue
+        if event.get("type") == "verdict":
+            preds = event.get("preds") or {}
+            pred = max(preds.values()) if preds else "-"
+            packet_queue.put((tuple(event["key"]), event["pkt_count"], pred, event["decision"]))
+        elif event.get("type") == "stats":
+            self.engine_stats = event
+
+    def update_engine_status(self):
+        st = self.engine_stats
+        if self.engine_client is None:
+            text = "silnik: odłączony"
+        elif not self.engine_client.connected.is_set():
+            text = "silnik: łączenie..."
+        elif st is None:
+            text = "silnik: połączony"
+        else:
+            text = (f"silnik (pid {st['pid']}): pakiety {st['packets']:,}   aktywne flow {st['live_flows']:,}   "
+                    f"DROP {st['verdicts'].get('DROP', 0):,}   utracone zdarzenia {st['events_dropped']:,}")
+        self.engine_var.set(text)
+        self.root.after(STATS_TICK_MS, self.update_engine_status)
+
     def start_sniff(self):
         global running
         if running:
             return
+        selected = self.get_enabled_models()
+        if not selected:
+            print("⚠️ Zaznacz co najmniej jeden model")
+            return
         running = True
 
-        model_name, model = self.get_enabled_model()
-
-        def packet_callback(pkt):
-            result = process_packet(pkt)
-
-            if result is None:
-                return
-
-            flow_key, pkt_count, features = result
-            pred = predict_single(features, model)
-            decision = "DROP" if pred == 1 else "ACCEPT"
-
-            packet_queue.put((flow_key, pkt_count, pred, decision))
-
-        from scapy.all import sniff
-        self.sniff_thread = threading.Thread(
-            target=lambda: sniff(iface=DEFAULT_INTERFACE, prn=packet_callback, store=False),
-            daemon=True
-        )
-        self.sniff_thread.start()
+        # podłączamy się do działającego silnika albo go uruchamiamy
+        iface = default_interface()
+        if not engine_running(SOCKET_PATH):
+            self.engine_proc = spawn_engine(iface, SOCKET_PATH, extra_args=engine_args(selected))
+            print(f"Uruchomiono silnik (pid {self.engine_proc.pid}) na {iface}, modele: {', '.join(selected)}")
+        else:
+            print("⚠️ Silnik już działa — zaznaczenie modeli nie zmienia jego konfiguracji")
+        self.engine_client = EngineClient(self.on_engine_event, SOCKET_PATH).start()
 
         self.start_btn.config(state="disabled")
         self.stop_btn.config(state="normal")
-        print(f"Sniffing started on {DEFAULT_INTERFACE}")
+        print(f"Sniffing started on {iface}")
 
     def stop_sniff(self):
         global running
         running = False
+        if self.engine_client is not None:
+            self.engine_client.stop()
+            self.engine_client = None
+        # zatrzymujemy tylko silnik uruchomiony przez to GUI
+        if self.engine_proc is not None:
+            self.engine_proc.terminate()
+            self.engine_proc = None
+        self.engine_stats = None
         self.start_btn.config(state="normal")
         self.stop_btn.config(state="disabled")
         print("Sniffing stopped.")
@@ -266,6 +508,9 @@ class FirewallGUI:
 # Start GUI
 # --------------------------------------------------------------------
 if __name__ == "__main__":
+    init_db()
+    sample_pools.start()
+    threading.Thread(target=get_models, daemon=True).start()   # modele w tle, okno od razu
     root = tk.Tk()
     gui = FirewallGUI(root)
     root.mainloop()
@@ -1,42 +1,54 @@
 #!/usr/bin/env python3
 """
-BEZPIECZNY TEST DDoS – SYN + UDP flood
-Niewielkie natężenie, nie zawiesi systemu.
-"""
-
-from scapy.layers.inet import IP, TCP, UDP, ICMP
-from scapy.all import send
-import random
-import time
-#!/usr/bin/env python3
-"""
 Test ruchu dla firewalla – działa na interfejsie LOOPBACK (lo).
-Generuje: TCP SYN, UDP, ICMP ping.
-Bezpieczny, mała intensywność.
+Generuje ruch przez src/traffic_generator.py (gotowe ramki, wysyłka AF_PACKET, stałe tempo):
+TCP SYN flood, UDP flood, powolny skan portów, sesje HTTP-podobne z odpowiedziami.
+Wymaga roota (gniazdo AF_PACKET).
 """
+
+import os
+import sys
+import argparse
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE, "src"))
+
+from traffic_generator import run_scenario, SCENARIOS
+
 TARGET_IP = "127.0.0.1"
-TARGET_PORT = 80
 INTERFACE = "lo"
 
 # Bardzo agresywne parametry - gwarantuje DROP
-PACKETS = 500         # dużo pakietów -> duży wolumen
-SLEEP = 0.0005        # prawie zero IAT -> cecha ataku CICIDS
+RATE = 20_000         # pakietów/s
+DURATION = 2.0        # sekundy
+WORKERS = 1
 
 
-def force_drop_test():
+def force_drop_test(rate=RATE, duration=DURATION, workers=WORKERS):
     print("\nSTART: Force-DROP test (TCP SYN Flood)\n")
 
-    for i in range(PACKETS):
-        sport = random.randint(1024, 65535)
-        pkt = IP(dst=TARGET_IP) / TCP(sport=sport, dport=TARGET_PORT, flags="S")
+    res = run_scenario("syn_flood", rate=rate, duration=duration, workers=workers,
+                       iface=INTERFACE, target=TARGET_IP)
+    print(f"Wysłano {res['sent']} pakietów w {res['seconds']:.2f}s ({res['pps']:,.0f} pkt/s)")
 
-        send(pkt, iface=INTERFACE, verbose=False)
+    print("\nKONIEC TESTU — firewall powinien wykonać DROP.\n")
 
-        # ekstremalnie mały odstęp = pewny trigger modeli CICIDS
-        time.sleep(SLEEP)
 
-    print("\nKONIEC TESTU — firewall powinien wykonać DROP.\n")
+def parse_args():
+    p = argparse.ArgumentParser(description="Test ruchu dla firewalla na interfejsie lo.")
+    p.add_argument("--scenario", choices=list(SCENARIOS), default="syn_flood")
+    p.add_argument("--rate", type=float, default=None, help="Pakiety/s (domyślnie wg scenariusza).")
+    p.add_argument("--duration", type=float, default=DURATION)
+    p.add_argument("--workers", type=int, default=WORKERS)
+    return p.parse_args()
 
 
 if __name__ == "__main__":
-    force_drop_test()
+    args = parse_args()
+    if args.scenario == "syn_flood":
+        force_drop_test(args.rate or RATE, args.duration, args.workers)
+    else:
+        res = run_scenario(args.scenario, rate=args.rate, duration=args.duration, workers=args.workers,
+                           iface=INTERFACE, target=TARGET_IP)
+        print(f"{res['scenario']}: wysłano {res['sent']} pakietów w {res['seconds']:.2f}s "
+              f"({res['pps']:,.0f} pkt/s)")
@@ -1,4 +1,4 @@
-import os
+import sys
 import joblib
 from sklearn.metrics import accuracy_score
 import numpy as np
@@ -8,27 +8,26 @@ MODEL_PATH = BASE + "/models/MLP_pipeline.pkl"   # albo MLP_pipeline.pkl
 SCALER_PATH = BASE + "/data/normalized/scaler.pkl"
 DATA_DIR = BASE + "/data/normalized"
 
-# wczytanie modelu i scalera
-model = joblib.load(MODEL_PATH)
+sys.path.append(BASE + "/src")
+from model_registry import ModelRegistry
+from shard_loader import ShardSet
+
+# wczytanie modelu (mmap przez rejestr) i scalera
+model = ModelRegistry(BASE + "/models", prefer_compiled=False).load(MODEL_PATH)
 scaler = joblib.load(SCALER_PATH)
 
-# znajdź wszystkie pliki chunków
-chunks = sorted([
-    os.path.join(DATA_DIR, f)
-    for f in os.listdir(DATA_DIR)
-    if f.endswith(".pkl") and "chunk" in f
-])
+# shardy float32 z manifestu (mmap — X[:2000] to widok, bez wczytywania całego sharda)
+shards = ShardSet(DATA_DIR)
 
-print("Znalezione chunki:")
-for c in chunks:
-    print(" •", c)
+print("Znalezione shardy:")
+for entry in shards.shards:
+    print(" •", entry["name"])
 
 acc_list = []
 
 print("\nStart testów...\n")
 
-for chunk_path in chunks:
-    X, y = joblib.load(chunk_path)
+for entry, (X, y, _) in zip(shards.shards, shards):
 
     # szybki podzbiór
     X_small = X[:2000]
@@ -38,7 +37,7 @@ for chunk_path in chunks:
     try:
         X_small = scaler.transform(X_small)
     except:
-        print("Skaler nie pasuje do danych — pomijam ten chunk:", chunk_path)
+        print("Skaler nie pasuje do danych — pomijam ten shard:", entry["name"])
         continue
 
     # predykcja
@@ -46,7 +45,7 @@ for chunk_path in chunks:
     acc = accuracy_score(y_small, y_pred)
     acc_list.append(acc)
 
-    print(f"{os.path.basename(chunk_path)} → accuracy: {acc:.4f}")
+    print(f"{entry['name']} → accuracy: {acc:.4f}")
 
 # podsumowanie
 if acc_list:
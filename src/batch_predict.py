@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+batch_predict.py
+
+Równoległe ponowne ocenianie historycznych danych (shardy z NORMALIZED_DATA_DIR).
+- Shardy float32 .npy z manifestu (mmap, shard_loader.py) albo stare chunki joblib wg --pattern
+- Chunki rozdzielane na pulę procesów; każdy worker ładuje modele raz (rejestr, mmap)
+- Każdy chunk oceniany w całości (predict_proba jednym przejściem + głosowanie większościowe)
+- Predykcje i pewności zapisywane do osobnego pliku .npz na chunk (wznawialne)
+- Krok scalania: jeden CSV z predykcjami + zbiorcze metryki per model do tabeli logs
+"""
+
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+import pandas as pd
+from threadpoolctl import threadpool_limits
+
+from config_and_db import NORMALIZED_DATA_DIR, DATA_DIR, MODEL_DIR, DB_PATH
+from model_registry import ModelRegistry, DEFAULT_MODELS
+from predict_models import score_chunk, update_confusion, metrics_from_confusion
+from log_db import log_run
+from shard_loader import list_shard_files, load_shard_file
+
+OUT_DIR = os.path.join(DATA_DIR, "predictions")
+
+# -------------------------------------------------------------
+# WORKER
+# -------------------------------------------------------------
+_models = {}
+_scaler = None
+_threads = 1
+
+def _init_worker(model_names, model_dir, scaler_path, threads):
+    """Modele ładowane raz na proces; przez mmap współdzielą strony pliku."""
+    global _scaler, _threads
+    _threads = threads
+    registry = ModelRegistry(model_dir)
+    for key, name in model_names.items():
+        try:
+            _models[key] = registry.load(name)
+        except Exception as e:
+            print(f"⚠️ [{os.getpid()}] Model {key} niedostępny: {e}")
+    if scaler_path:
+        _scaler = joblib.load(scaler_path)
+
+def _score_shard(shard_path, out_path):
+    t0 = time.perf_counter()
+    X, y, _ = load_shard_file(shard_path)
+    if _scaler is not None:
+        X = _scaler.transform(X)
+    with threadpool_limits(limits=_threads):
+        results = score_chunk(_models, X, ensemble=True)
+    tmp = out_path + ".tmp.npz"
+    np.savez(tmp, y_true=np.asarray(y), **{c: results[c].values for c in results.columns})
+    os.replace(tmp, out_path)
+    return {"shard": os.path.basename(shard_path), "rows": int(X.shape[0]),
+            "seconds": time.perf_counter() - t0}
+
+# -------------------------------------------------------------
+# SCALANIE
+# -------------------------------------------------------------
+def merge_shards(out_paths, merged_csv=None):
+    """Łączy wyniki chunków (w kolejności) i liczy metryki dla każdej kolumny pred_*."""
+    confusions = {}
+    n_rows = 0
+    if merged_csv and os.path.exists(merged_csv):
+        os.remove(merged_csv)
+    for i, path in enumerate(out_paths):
+        with np.load(path) as data:
+            cols = {k: data[k] for k in data.files}
+        y_true = cols.pop("y_true")
+        for name, values in cols.items():
+            if name.startswith("pred_"):
+                update_confusion(confusions.setdefault(name[len("pred_"):], {}), y_true, values)
+        if merged_csv:
+            df = pd.DataFrame(cols)
+            df.insert(0, "shard", os.path.basename(path)[:-len(".npz")])
+            df["y_true"] = y_true
+            df.to_csv(merged_csv, mode="a", header=(i == 0), index=False)
+        n_rows += len(y_true)
+    metrics = {}
+    for name, counts in confusions.items():
+        accuracy, f1, per_class = metrics_from_confusion(counts)
+        metrics[name] = {"accuracy": accuracy, "f1": f1, "per_class": per_class,
+                         "confusion": {f"{t}->{p}": c for (t, p), c in sorted(counts.items())}}
+    return n_rows, metrics
+
+def list_shards(data_dir=NORMALIZED_DATA_DIR, pattern="*_chunk*.pkl"):
+    return list_shard_files(data_dir, pattern)
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Równoległa predykcja po chunkach z NORMALIZED_DATA_DIR.")
+    p.add_argument("--data-dir", default=NORMALIZED_DATA_DIR, help="Folder z shardami (manifest.json) lub chunkami.")
+    p.add_argument("--pattern", default="*_chunk*.pkl", help="Wzorzec nazw starych chunków (bez manifestu).")
+    p.add_argument("--out-dir", default=OUT_DIR, help="Folder na wyniki per chunk.")
+    p.add_argument("--merged-csv", default=os.path.join(OUT_DIR, "predictions_all.csv"),
+                   help="Scalony CSV (pusty napis = bez scalania do CSV).")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--threads", type=int, default=1, help="Wątki BLAS na workera.")
+    p.add_argument("--scaler", default=None, help="Opcjonalny scaler stosowany przed predykcją.")
+    p.add_argument("--models", nargs="*", choices=list(DEFAULT_MODELS.keys()), default=list(DEFAULT_MODELS.keys()))
+    p.add_argument("--overwrite", action="store_true", help="Oceń ponownie chunki z istniejącym wynikiem.")
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    os.makedirs(args.out_dir, exist_ok=True)
+    shards = list_shards(args.data_dir, args.pattern)
+    if not shards:
+        print(f"❌ Brak chunków w {args.data_dir}")
+        return
+    out_paths = [os.path.join(args.out_dir, os.path.splitext(os.path.basename(s))[0].removesuffix("_X") + ".npz")
+                 for s in shards]
+    todo = [(s, o) for s, o in zip(shards, out_paths) if args.overwrite or not os.path.exists(o)]
+    print(f"Chunki: {len(shards)} (do oceny: {len(todo)}), workerów: {args.workers}")
+
+    model_names = {k: DEFAULT_MODELS[k] for k in args.models}
+    t0 = time.perf_counter()
+    done_rows = 0
+    if todo:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                 initargs=(model_names, MODEL_DIR, args.scaler, args.threads)) as pool:
+            futures = {pool.submit(_score_shard, s, o): s for s, o in todo}
+            for n, fut in enumerate(as_completed(futures), 1):
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    print(f"\n❌ Chunk {os.path.basename(futures[fut])} nie powiódł się: {e}")
+                    continue
+                done_rows += res["rows"]
+                rate = done_rows / max(time.perf_counter() - t0, 1e-9)
+                print(f"[{n}/{len(todo)}] {res['shard']}: {res['rows']} wierszy "
+                      f"w {res['seconds']:.1f}s ({rate:,.0f} wierszy/s łącznie)")
+
+    finished = [o for o in out_paths if os.path.exists(o)]
+    n_rows, metrics = merge_shards(finished, args.merged_csv or None)
+    elapsed = time.perf_counter() - t0
+    print(f"\n🎉 Oceniono {n_rows} wierszy z {len(finished)} chunków w {elapsed / 60:.1f} min")
+
+    for name, m in metrics.items():
+        if m["accuracy"] is None:
+            continue
+        print(f"  {name:<10} accuracy={m['accuracy']:.4f}  F1={m['f1']:.4f}")
+        try:
+            log_run(script="batch_predict",
+                    n_rows=n_rows,
+                    models_used=name,
+                    ensemble_used=(name == "ensemble"),
+                    accuracy=m["accuracy"],
+                    f1_score=m["f1"],
+                    notes=json.dumps({"shards": len(finished), "seconds": round(elapsed, 1),
+                                      "confusion": m["confusion"]}),
+                    db_path=DB_PATH)
+        except Exception as e:
+            print(f"Błąd logowania: {e}")
+
+if __name__ == "__main__":
+    main()
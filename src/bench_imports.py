@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+bench_imports.py
+
+Pomiar czasu importu modułów projektu (python -X importtime, każdy moduł w świeżym procesie).
+- czas skumulowany importu modułu (z importtime) i czas całego procesu (ścian)
+- najdroższe zależności importowane po drodze
+- --save / --baseline: zapis i porównanie z poprzednim pomiarem (JSON w REPORTS_DIR)
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import statistics
+
+from config_and_db import REPORTS_DIR, SRC_DIR
+
+MODULES = ["config_and_db", "log_db", "firewall_rules", "model_registry",
+           "realtime_flow_predict", "engine_service"]
+REPEATS = 5
+TOP_DEPS = 5
+BASELINE_PATH = os.path.join(REPORTS_DIR, "bench_imports_baseline.json")
+
+
+def parse_importtime(stderr):
+    """[(moduł, self_us, cumulative_us)] z wyjścia -X importtime."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cum_us, name = line[len("import time:"):].split("|")
+            rows.append((name.strip(), int(self_us), int(cum_us)))
+        except ValueError:
+            continue
+    return rows
+
+
+def measure(module, repeats=REPEATS):
+    cum, wall, deps = [], [], {}
+    env = dict(os.environ, PYTHONPATH=SRC_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        res = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                             capture_output=True, text=True, env=env, cwd=SRC_DIR)
+        wall.append(time.perf_counter() - t0)
+        if res.returncode != 0:
+            raise RuntimeError(f"import {module} nieudany:\n{res.stderr[-500:]}")
+        rows = parse_importtime(res.stderr)
+        cum.append(next((c for name, _, c in rows if name == module), 0) / 1e6)
+        # koszt własny zsumowany po pakietach najwyższego poziomu (scapy.* → scapy)
+        run = {}
+        for name, self_us, _ in rows:
+            root = name.split(".")[0]
+            if root != module:
+                run[root] = run.get(root, 0) + self_us / 1e6
+        for root, t in run.items():
+            deps[root] = max(deps.get(root, 0), t)
+    top = sorted(deps.items(), key=lambda kv: -kv[1])[:TOP_DEPS]
+    return {"import_s": statistics.median(cum), "process_s": statistics.median(wall),
+            "top_deps": {k: round(v, 4) for k, v in top}}
+
+
+def main():
+    p = argparse.ArgumentParser(description="Czas importu modułów projektu.")
+    p.add_argument("modules", nargs="*", default=MODULES)
+    p.add_argument("--repeats", type=int, default=REPEATS)
+    p.add_argument("--save", action="store_true", help="Zapisz wynik jako baseline.")
+    p.add_argument("--baseline", default=BASELINE_PATH)
+    args = p.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    print(f"{'moduł':<24}{'import [ms]':>12}{'proces [ms]':>13}{'baseline [ms]':>15}  najdroższe zależności")
+    for module in args.modules:
+        r = results[module] = measure(module, args.repeats)
+        base = baseline.get(module, {}).get("import_s")
+        base_txt = f"{base * 1000:>15.1f}" if base is not None else f"{'-':>15}"
+        deps = ", ".join(f"{k} {v * 1000:.0f}" for k, v in r["top_deps"].items())
+        print(f"{module:<24}{r['import_s'] * 1000:>12.1f}{r['process_s'] * 1000:>13.1f}{base_txt}  {deps}")
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Zapisano baseline: {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+bench_realtime.py
+
+Powtarzalny benchmark silnika realtime (process_packet) — bez sieci i bez roota.
+- Strumienie generowane wcześniej w pamięci (pakiety zdekodowane z bajtów, jak ze sniffera):
+  benign (mieszanka flowów dwukierunkowych), syn_flood (losowe sporty), udp_flood,
+  elephant (kilka długich flowów), mix (benign + syn_flood)
+- Zegar wirtualny (parametr now=), więc timeouty flowów nie zależą od szybkości maszyny
+- Modele: stub (stały koszt), real (rejestr) albo none
+- Raport: pakiety/s, p50/p99/p999 latencji pakietu i pakietu z werdyktem,
+  bajty na aktywny flow (tracemalloc), szczytowy RSS
+- Porównanie z zapisanym baseline (JSON); regresja → kod wyjścia 1
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import resource
+import tracemalloc
+
+import numpy as np
+from scapy.layers.inet import IP, TCP, UDP
+from scapy.packet import Raw
+
+from config_and_db import REPORTS_DIR, init_db
+import realtime_flow_predict as engine
+from flood_prefilter import FloodPrefilter
+from flow_table import POLICIES, MAX_FLOWS
+from hotpath_profiler import PROFILER
+
+SCENARIOS = ("benign", "syn_flood", "udp_flood", "elephant", "mix")
+DEFAULT_PACKETS = 50_000
+BASELINE_PATH = os.path.join(REPORTS_DIR, "bench_realtime_baseline.json")
+TOLERANCE = 0.10          # dopuszczalne pogorszenie względem baseline
+TARGET_IP = "10.0.0.1"
+
+# -------------------------------------------------------------
+# STRUMIENIE PAKIETÓW
+# -------------------------------------------------------------
+def _dissect(pkt):
+    # pakiet zdekodowany z bajtów ma bufor surowy — len(pkt) bez ponownej serializacji
+    return IP(bytes(pkt))
+
+def _rand_ip(rng):
+    return "172.16.{}.{}".format(*rng.integers(1, 255, size=2))
+
+def gen_benign(n, rng, pps=5_000, pkts_per_flow=20):
+    """Flowy dwukierunkowe TCP (żądanie/odpowiedź), przeplatane losowo."""
+    n_flows = max(1, n // pkts_per_flow)
+    templates = []
+    for _ in range(n_flows):
+        src, sport = _rand_ip(rng), int(rng.integers(1024, 65535))
+        dport = int(rng.choice([80, 443, 22, 53]))
+        size = int(rng.integers(40, 1400))
+        fwd = _dissect(IP(src=src, dst=TARGET_IP) / TCP(sport=sport, dport=dport, flags="PA") / Raw(b"x" * size))
+        bwd = _dissect(IP(src=TARGET_IP, dst=src) / TCP(sport=dport, dport=sport, flags="A") / Raw(b"y" * (size // 2)))
+        templates.append((fwd, bwd))
+    flow_ids = rng.integers(0, n_flows, size=n)
+    direction = rng.random(n) < 0.5
+    return [templates[f][int(d)] for f, d in zip(flow_ids, direction)], pps
+
+def gen_syn_flood(n, rng, pps=50_000):
+    """Jak main.py force_drop_test: jedno źródło, losowy port źródłowy, sam SYN."""
+    sports = rng.integers(1024, 65535, size=n)
+    return [_dissect(IP(src="192.168.1.66", dst=TARGET_IP) / TCP(sport=int(s), dport=80, flags="S"))
+            for s in sports], pps
+
+def gen_udp_flood(n, rng, pps=50_000):
+    sports = rng.integers(1024, 65535, size=n)
+    dports = rng.integers(1, 65535, size=n)
+    return [_dissect(IP(src="192.168.1.77", dst=TARGET_IP) / UDP(sport=int(s), dport=int(d)) / Raw(b"z" * 512))
+            for s, d in zip(sports, dports)], pps
+
+def gen_elephant(n, rng, pps=2_000, n_flows=8):
+    """Kilka długich flowów — strumień trwa dłużej niż FLOW_TIMEOUT."""
+    templates = [_dissect(IP(src=_rand_ip(rng), dst=TARGET_IP) /
+                          TCP(sport=int(rng.integers(1024, 65535)), dport=443, flags="A") / Raw(b"e" * 1400))
+                 for _ in range(n_flows)]
+    return [templates[i] for i in rng.integers(0, n_flows, size=n)], pps
+
+def gen_mix(n, rng):
+    benign, _ = gen_benign(n - n // 4, rng)
+    flood, _ = gen_syn_flood(n // 4, rng)
+    stream = benign + flood
+    order = rng.permutation(len(stream))
+    return [stream[i] for i in order], 8_000
+
+GENERATORS = {"benign": gen_benign, "syn_flood": gen_syn_flood, "udp_flood": gen_udp_flood,
+              "elephant": gen_elephant, "mix": gen_mix}
+
+def build_stream(scenario, n, seed):
+    """Zwraca (pakiety, znaczniki czasu) — powtarzalne dla danego ziarna."""
+    rng = np.random.default_rng(seed)
+    packets, pps = GENERATORS[scenario](n, rng)
+    timestamps = 1_000_000.0 + np.arange(len(packets)) / pps
+    return packets, timestamps.tolist()
+
+# -------------------------------------------------------------
+# MODELE
+# -------------------------------------------------------------
+class StubModel:
+    """Stały, mały koszt predykcji: atak = flow z samymi SYN i bez ruchu zwrotnego."""
+    classes_ = np.array([0, 1])
+
+    def predict_proba(self, X):
+        X = np.asarray(X)
+        attack = (X[:, 43] > 0) & (X[:, 3] == 0)
+        p = np.where(attack, 0.99, 0.01)
+        return np.column_stack([1 - p, p])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] >= 0.5).astype(int)
+
+def load_models(kind):
+    if kind == "none":
+        return None, None
+    if kind == "stub":
+        return {"rf": StubModel(), "lr": StubModel(), "mlp": StubModel()}, {4: StubModel()}
+    from model_registry import ModelRegistry, DEFAULT_MODELS, EARLY_CHECKPOINTS, early_model_name
+    registry = ModelRegistry()
+    models = {k: registry.load(v) for k, v in DEFAULT_MODELS.items() if _exists(registry, v)}
+    early = {n: registry.load(early_model_name(n)) for n in EARLY_CHECKPOINTS
+             if _exists(registry, early_model_name(n))}
+    return models, early
+
+def _exists(registry, name):
+    try:
+        registry.resolve(name)
+        return True
+    except FileNotFoundError:
+        return False
+
+# -------------------------------------------------------------
+# POMIAR
+# -------------------------------------------------------------
+def reset_engine(args):
+    engine.configure_flow_table(max_flows=args.max_flows, policy=args.policy)
+    engine._blocked_until.clear()
+    return FloodPrefilter(now=0.0) if args.prefilter else None
+
+def run_stream(packets, timestamps, models, early, prefilter):
+    latencies = np.empty(len(packets), dtype=np.int64)
+    verdict = np.zeros(len(packets), dtype=bool)
+    perf = time.perf_counter_ns
+    process = engine.process_packet
+    t_start = perf()
+    for i, (pkt, ts) in enumerate(zip(packets, timestamps)):
+        t0 = perf()
+        res = process(pkt, models, None, early, prefilter, ts)
+        latencies[i] = perf() - t0
+        verdict[i] = res is not None
+    elapsed = (perf() - t_start) / 1e9
+    return latencies, verdict, elapsed
+
+def _pct_us(arr, q):
+    return round(float(np.percentile(arr, q)) / 1e3, 2) if arr.size else None
+
+def bench_scenario(scenario, args, models, early):
+    packets, timestamps = build_stream(scenario, args.packets, args.seed)
+
+    # przebieg rozgrzewkowy, potem pomiar czasu
+    prefilter = reset_engine(args)
+    run_stream(packets[:min(2000, len(packets))], timestamps, models, early, prefilter)
+    prefilter = reset_engine(args)
+    latencies, verdict, elapsed = run_stream(packets, timestamps, models, early, prefilter)
+    engine.flush_db()
+    table = engine.flows.stats()
+
+    result = {
+        "packets": len(packets),
+        "packets_per_s": round(len(packets) / elapsed, 1),
+        "p50_us": _pct_us(latencies, 50),
+        "p99_us": _pct_us(latencies, 99),
+        "p999_us": _pct_us(latencies, 99.9),
+        "verdicts": int(verdict.sum()),
+        "verdict_p50_us": _pct_us(latencies[verdict], 50),
+        "verdict_p99_us": _pct_us(latencies[verdict], 99),
+        "verdict_p999_us": _pct_us(latencies[verdict], 99.9),
+        "live_flows": table["flows"],
+        "evicted": table["evicted"],
+        "shed": table["shed"],
+    }
+
+    if args.memory:
+        # osobny przebieg pod tracemalloc (spowalnia, więc nie wpływa na czasy powyżej)
+        prefilter = reset_engine(args)
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        run_stream(packets, timestamps, models, early, prefilter)
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        engine.flush_db()
+        live = len(engine.flows)
+        result["bytes_per_flow"] = round((after - before) / live, 1) if live else None
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+# -------------------------------------------------------------
+# BASELINE
+# -------------------------------------------------------------
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Lista regresji: przepustowość niższa lub p99 wyższe o więcej niż tolerance."""
+    regressions = []
+    for scenario, res in results.items():
+        base = baseline.get(scenario)
+        if not base:
+            continue
+        if res["packets_per_s"] < base["packets_per_s"] * (1 - tolerance):
+            regressions.append(f"{scenario}: packets/s {base['packets_per_s']} → {res['packets_per_s']}")
+        for key in ("p99_us", "verdict_p99_us"):
+            if res.get(key) and base.get(key) and res[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{scenario}: {key} {base[key]} → {res[key]}")
+    return regressions
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Benchmark process_packet na strumieniach w pamięci.")
+    p.add_argument("--scenarios", nargs="*", choices=SCENARIOS, default=list(SCENARIOS))
+    p.add_argument("--packets", type=int, default=DEFAULT_PACKETS, help="Pakiety na scenariusz.")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--models", choices=["stub", "real", "none"], default="stub")
+    p.add_argument("--no-early", action="store_true", help="Bez modeli wczesnego werdyktu.")
+    p.add_argument("--prefilter", action="store_true", help="Włącz prefiltr floodów.")
+    p.add_argument("--policy", choices=POLICIES, default="lru")
+    p.add_argument("--max-flows", type=int, default=MAX_FLOWS)
+    p.add_argument("--no-memory", dest="memory", action="store_false", help="Pomiń pomiar bajtów na flow.")
+    p.add_argument("--profile", action="store_true", help="Raport etapów z hotpath_profiler.")
+    p.add_argument("--baseline", default=BASELINE_PATH, help="Plik baseline do porównania.")
+    p.add_argument("--save-baseline", action="store_true", help="Zapisz wyniki jako nowy baseline.")
+    p.add_argument("--tolerance", type=float, default=TOLERANCE)
+    p.add_argument("--out", default=None, help="Zapis wyników do pliku JSON.")
+    p.add_argument("--db", default=None, help="Baza flow_logs benchmarku (domyślnie plik tymczasowy).")
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+
+    # bez roota i bez zapisu do produkcyjnej bazy: firewall jako no-op, flow_logs w osobnym pliku
+    engine.take_mitigation_action = lambda src_ip, ttl_seconds=0, reason="": None
+    engine.DB_PATH = args.db or os.path.join(tempfile.mkdtemp(prefix="bench_"), "bench.db")
+    init_db(engine.DB_PATH)
+
+    models, early = load_models(args.models)
+    if args.no_early:
+        early = None
+    if args.profile:
+        PROFILER.reset()
+        PROFILER.enable()
+
+    results = {}
+    for scenario in args.scenarios:
+        res = bench_scenario(scenario, args, models, early)
+        results[scenario] = res
+        print(f"{scenario:<10} {res['packets_per_s']:>10,.0f} pkt/s | p50 {res['p50_us']} µs "
+              f"p99 {res['p99_us']} µs p999 {res['p999_us']} µs | werdykty {res['verdicts']} "
+              f"(p99 {res['verdict_p99_us']} µs) | flowy {res['live_flows']} "
+              f"({res.get('bytes_per_flow')} B/flow) | RSS {res['peak_rss_mb']} MB")
+
+    if args.profile:
+        PROFILER.print_report()
+
+    report = {"config": {k: v for k, v in vars(args).items() if k not in ("out", "db")},
+              "python": sys.version.split()[0], "results": results}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    exit_code = 0
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("results", {})
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\n❌ Regresje względem baseline:")
+            for r in regressions:
+                print("  -", r)
+            exit_code = 1
+        else:
+            print(f"\n✅ Brak regresji względem {args.baseline} (tolerancja {args.tolerance * 100:.0f}%)")
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n🎉 Baseline zapisany: {args.baseline}")
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
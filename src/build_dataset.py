@@ -2,7 +2,12 @@
 """
 build_dataset.py - Tworzy gotowe zbiory treningowe/testowe dla CICIDS2017.
 Nie używa imblearn. Obsługuje nierównowagę klas przez class_weight w modelach.
-Zapisuje X_train, X_test, y_train, y_test oraz scaler.pkl.
+Próbka budowana w jednym przejściu po chunkach (rezerwuar per klasa, reservoir.py) —
+pamięć ograniczona rozmiarem próbki; --attack-ratio ustala proporcje klas, --seed powtarzalność.
+Zapisuje X_train, X_test, y_train, y_test oraz scaler.pkl (+ feature_layout.json: kolumny CSV,
+nie układ ekstraktora realtime — feature_pruning.py odmówi pracy na takim zbiorze).
+Z --input-dir data/dedup (dedup_dataset.py) dodatkowo w_train/w_test — liczności wierszy
+jako opcjonalne sample_weight; scaler fitowany z wagami.
 """
 
 import pandas as pd
@@ -10,59 +15,83 @@ import numpy as np
 import glob
 import os
 import gc
+import argparse
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from config_and_db import CLEAN_DATA_DIR, DATA_DIR
+from reservoir import class_sampler
+from build_dataset_flow import write_feature_layout
 
 SAMPLE_SIZE = 500_000  # Liczba wierszy do próbki
+CHUNK_SIZE = 50_000    # wiersze wczytywane naraz
+SEED = 42
+FEATURE_LAYOUT = "cicids_csv"
+WEIGHT_COL = "Weight"
+DROP_COLS = ['Flow ID', 'Src IP', 'Dst IP', 'Timestamp']
 
-# Wczytaj wszystkie oczyszczone pliki
-files = glob.glob(os.path.join(CLEAN_DATA_DIR, "*_clean.csv"))
+parser = argparse.ArgumentParser(description="Budowa X_train/X_test/y_train/y_test + scaler.")
+parser.add_argument("--input-dir", default=CLEAN_DATA_DIR, help="Katalog CSV (np. data/dedup).")
+parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE)
+parser.add_argument("--attack-ratio", type=float, default=None,
+                    help="Udział ATTACK w próbce (domyślnie jak w danych).")
+parser.add_argument("--seed", type=int, default=SEED)
+args = parser.parse_args()
+
+def label_to_int(labels):
+    if pd.api.types.is_numeric_dtype(labels):
+        return labels.values.astype(np.int8)
+    return (labels.astype(str).str.strip().str.upper() != "BENIGN").values.astype(np.int8)
+
+# Jedno przejście po chunkach wszystkich plików → rezerwuar per klasa;
+# w pamięci tylko próbka + bieżący chunk (zamiast pd.concat całego zbioru)
+files = sorted(glob.glob(os.path.join(args.input_dir, "*.csv")))
 print(f"Znaleziono {len(files)} oczyszczonych plików.\n")
 
-data_parts = []
+sampler = class_sampler(args.sample_size, args.attack_ratio, seed=args.seed, dtype=np.float32)
+columns = None
+seen = {0: 0, 1: 0}
 for f in files:
     print(f"➡️  Wczytuję {os.path.basename(f)}")
-    df = pd.read_csv(f, low_memory=False)
-    df.columns = df.columns.str.strip()
-
-    float_cols = df.select_dtypes(include=['float64']).columns
-    int_cols = df.select_dtypes(include=['int64']).columns
-    df[float_cols] = df[float_cols].astype('float32')
-    df[int_cols] = df[int_cols].astype('int32')
-    df['Label'] = df['Label'].astype('int8')
-
-    for col in ['Flow ID', 'Src IP', 'Dst IP', 'Timestamp']:
-        if col in df.columns:
-            df.drop(columns=[col], inplace=True)
-
-    data_parts.append(df)
-    del df
+    for chunk in pd.read_csv(f, chunksize=CHUNK_SIZE, low_memory=False):
+        chunk.columns = chunk.columns.str.strip()
+        chunk = chunk.drop(columns=[c for c in DROP_COLS if c in chunk.columns])
+        y_chunk = label_to_int(chunk.pop('Label'))
+        if columns is None:
+            columns = list(chunk.columns)     # kolejność cech z pierwszego pliku
+        X_chunk = chunk.reindex(columns=columns, fill_value=0).apply(pd.to_numeric, errors='coerce')
+        X_chunk = X_chunk.replace([np.inf, -np.inf], np.nan).fillna(0).values
+        sampler.add(X_chunk, y_chunk)
+        for lbl in (0, 1):
+            seen[lbl] += int((y_chunk == lbl).sum())
+        del chunk, X_chunk
     gc.collect()
 
-data = pd.concat(data_parts, ignore_index=True)
-del data_parts
-gc.collect()
-
-if data.shape[0] > SAMPLE_SIZE:
-    data = data.sample(n=SAMPLE_SIZE, random_state=42)
-    print(f"ℹ️ Używam próbki {SAMPLE_SIZE} wierszy.\n")
+X_all, y_all = sampler.stacked(seed=args.seed)
+if not len(y_all):
+    raise SystemExit("❌ Brak danych wejściowych")
+data = pd.DataFrame(X_all, columns=columns)
+data['Label'] = y_all.astype('int8')
+del X_all, y_all
+print(f"ℹ️ Próbka {data.shape[0]} z {sum(seen.values())} wierszy "
+      f"(BENIGN {seen[0]} → {int((data['Label'] == 0).sum())}, ATTACK {seen[1]} → {int((data['Label'] == 1).sum())})\n")
 
 print(f"✅ Dane gotowe: {data.shape[0]} wierszy, {data.shape[1]} kolumn")
 
+has_weights = WEIGHT_COL in data.columns
+w = data.pop(WEIGHT_COL) if has_weights else pd.Series(1, index=data.index)
 X = data.drop(columns=['Label'])
 y = data['Label']
 del data
 gc.collect()
 
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, random_state=42, stratify=y
+X_train, X_test, y_train, y_test, w_train, w_test = train_test_split(
+    X, y, w, test_size=0.2, random_state=42, stratify=y
 )
-del X, y
+del X, y, w
 gc.collect()
 
 scaler = StandardScaler()
-X_train_scaled = scaler.fit_transform(X_train)
+X_train_scaled = scaler.fit(X_train, sample_weight=w_train.values if has_weights else None).transform(X_train)
 X_test_scaled = scaler.transform(X_test)
 del X_train, X_test
 gc.collect()
@@ -72,7 +101,15 @@ pd.DataFrame(X_train_scaled).to_pickle(os.path.join(DATA_DIR, "X_train.pkl"))
 pd.DataFrame(X_test_scaled).to_pickle(os.path.join(DATA_DIR, "X_test.pkl"))
 pd.DataFrame(y_train).to_pickle(os.path.join(DATA_DIR, "y_train.pkl"))
 pd.DataFrame(y_test).to_pickle(os.path.join(DATA_DIR, "y_test.pkl"))
+if has_weights:
+    pd.DataFrame(w_train).to_pickle(os.path.join(DATA_DIR, "w_train.pkl"))
+    pd.DataFrame(w_test).to_pickle(os.path.join(DATA_DIR, "w_test.pkl"))
+else:
+    for name in ("w_train.pkl", "w_test.pkl"):     # wagi z poprzedniego builda nie pasują do nowych wierszy
+        if os.path.exists(os.path.join(DATA_DIR, name)):
+            os.remove(os.path.join(DATA_DIR, name))
 import joblib
 joblib.dump(scaler, os.path.join(DATA_DIR, "scaler.pkl"))
+write_feature_layout(DATA_DIR, FEATURE_LAYOUT, X_train_scaled.shape[1])
 
 print("🎉 Zapisano gotowe zbiory i scaler w folderze data/:")
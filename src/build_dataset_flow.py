@@ -2,24 +2,48 @@
 """
 build_dataset_flow.py - Streamingowe przetwarzanie CICIDS2017 (clean CSV)
 - Chunkowe wczytywanie (50k wierszy)
-- Sampling max 500k flow
+- Próbka max 500k flowów: rezerwuar per klasa nad wszystkimi plikami (reservoir.py),
+  proporcje klas ze strumienia albo --attack-ratio; --seed dla powtarzalności
 - Wyświetla progres w konsoli
 - Tworzy X_train/X_test/y_train/y_test + scaler.pkl
+- feature_layout.json: znacznik układu kolumn (wektor ekstraktora realtime); build_dataset.py
+  zapisuje pod tymi samymi nazwami kolumny CSV — feature_pruning.py sprawdza znacznik
+- Migawki cech flowów po N pakietach (EARLY_CHECKPOINTS) → X_early_N.pkl / y_early_N.pkl
+  (surowe cechy, do train_early_models.py)
 """
 
 import pandas as pd
 import numpy as np
 import os
 import gc
+import json
+import argparse
 from collections import defaultdict
 from tqdm import tqdm
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from config_and_db import DATA_DIR, CLEAN_DATA_DIR
+from model_registry import EARLY_CHECKPOINTS
+from reservoir import class_sampler
 
 FLOW_TIMEOUT = 10        # max czas flow w sekundach
 MAX_FLOWS   = 500_000    # maksymalna liczba flow w zbiorze
 CHUNK_SIZE  = 50_000     # liczba wierszy na raz
+SEED        = 42
+FEATURE_LAYOUT = "realtime_flow"          # kolejność cech jak realtime_flow_predict.extract_flow_features
+LAYOUT_FILE = "feature_layout.json"
+
+def write_feature_layout(out_dir, layout, n_features):
+    """Znacznik układu kolumn X_train/X_test zapisany obok pickli."""
+    with open(os.path.join(out_dir, LAYOUT_FILE), "w") as f:
+        json.dump({"layout": layout, "n_features": int(n_features)}, f, indent=2)
+
+def read_feature_layout(data_dir=DATA_DIR):
+    try:
+        with open(os.path.join(data_dir, LAYOUT_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
 
 def calc_iat(timestamps):
     if len(timestamps) < 2:
@@ -100,8 +124,25 @@ def extract_flow_features(f):
     ]
     return features
 
-def build_dataset(csv_folder=CLEAN_DATA_DIR, max_flows=MAX_FLOWS):
-    all_files = [f for f in os.listdir(csv_folder) if f.endswith(".csv")]
+def label_to_int(labels):
+    return np.array([0 if "BENIGN" in str(lbl).upper() else 1 for lbl in labels])
+
+def save_early_datasets(early, out_dir=DATA_DIR, seed=SEED):
+    """Zapisuje migawki cech flowów uciętych po N pakietach (bez skalowania)."""
+    for n, sampler in sorted(early.items()):
+        X, y = sampler.stacked(seed=seed)
+        if not len(y):
+            print(f"Checkpoint {n}: brak flowów")
+            continue
+        X = pd.DataFrame(X, columns=[f"f{i}" for i in range(78)])
+        y = pd.DataFrame(y)
+        X.to_pickle(os.path.join(out_dir, f"X_early_{n}.pkl"))
+        y.to_pickle(os.path.join(out_dir, f"y_early_{n}.pkl"))
+        print(f"Checkpoint {n}: {len(y)} flowów (ATTACK: {int(y.values.sum())})")
+
+def build_dataset(csv_folder=CLEAN_DATA_DIR, max_flows=MAX_FLOWS, early_checkpoints=EARLY_CHECKPOINTS,
+                  attack_ratio=None, seed=SEED):
+    all_files = sorted(f for f in os.listdir(csv_folder) if f.endswith(".csv"))
     flows = defaultdict(lambda: {
         "timestamps": [], "fwd_lengths": [], "bwd_lengths": [],
         "fwd_flags": defaultdict(int), "bwd_flags": defaultdict(int),
@@ -109,9 +150,11 @@ def build_dataset(csv_folder=CLEAN_DATA_DIR, max_flows=MAX_FLOWS):
         "src_port": None, "dst_port": None, "proto": None, "label": None
     })
 
-    dataset = []
-    benign_count = 0
-    attack_count = 0
+    # próbki w jednym przejściu po wszystkich plikach — pamięć ograniczona max_flows
+    dataset = class_sampler(max_flows, attack_ratio, seed=seed, dtype=np.float64)
+    early = {n: class_sampler(max_flows, attack_ratio, seed=seed + n, dtype=np.float64)
+             for n in early_checkpoints}
+    seen = {0: 0, 1: 0}
 
     print("Start przetwarzania CICIDS2017 (streaming, no-freeze)\n")
 
@@ -125,6 +168,9 @@ def build_dataset(csv_folder=CLEAN_DATA_DIR, max_flows=MAX_FLOWS):
         label_col = label_col_candidates[0]
 
         for chunk in pd.read_csv(csv_path, chunksize=CHUNK_SIZE):
+            done_X, done_y = [], []
+            early_X = {n: [] for n in early}
+            early_y = {n: [] for n in early}
             for _, row in chunk.iterrows():
                 # Flow key
                 src_ip = row.get("Source IP","0.0.0.0")
@@ -157,40 +203,42 @@ def build_dataset(csv_folder=CLEAN_DATA_DIR, max_flows=MAX_FLOWS):
 
                 f["timestamps"].append(timestamp)
 
+                # migawka po N pakietach (tak jak widzi ją wczesny werdykt w realtime)
+                n_pkts = len(f["timestamps"])
+                if n_pkts in early:
+                    early_X[n_pkts].append(extract_flow_features(f))
+                    early_y[n_pkts].append(f["label"])
+
                 # timeout
                 if timestamp - f["start_time"] > FLOW_TIMEOUT:
-                    features = extract_flow_features(f)
-                    dataset.append(features + [label])
+                    done_X.append(extract_flow_features(f))
+                    done_y.append(label)
                     flows.pop(key)
 
+            # zakończone flowy z chunka → rezerwuar (całym batchem)
+            if done_X:
+                y_done = label_to_int(done_y)
+                dataset.add(np.asarray(done_X, dtype=np.float64), y_done)
+                for lbl in (0, 1):
+                    seen[lbl] += int((y_done == lbl).sum())
+            for n in early:
+                if early_X[n]:
+                    early[n].add(np.asarray(early_X[n], dtype=np.float64), label_to_int(early_y[n]))
+
             del chunk
             gc.collect()
 
-            # jeśli przekroczono max_flows
-            if len(dataset) >= max_flows:
-                dataset = dataset[:max_flows]
-                break
-        if len(dataset) >= max_flows:
-            break
+    X, y = dataset.stacked(seed=seed)
+    benign_count = int((y == 0).sum())
+    attack_count = int((y == 1).sum())
 
     # Podsumowanie
-    for lbl in [row[-1] for row in dataset]:
-        if "BENIGN" in str(lbl).upper():
-            benign_count += 1
-        else:
-            attack_count += 1
-
-    print(f"\nZebrano:\n  BENIGN: {benign_count}\n  ATTACK: {attack_count}")
+    print(f"\nZebrano (próbka z {seen[0]} BENIGN / {seen[1]} ATTACK flowów):"
+          f"\n  BENIGN: {benign_count}\n  ATTACK: {attack_count}")
 
     if benign_count==0 or attack_count==0:
         raise ValueError("BRAK dwóch klas! Sprawdź pliki CSV (muszą zawierać BENIGN i ATTACK).")
 
-    # Split dataset
-    df = pd.DataFrame(dataset, columns=[f"f{i}" for i in range(78)]+["label"])
-    X = df.drop(columns=["label"]).values
-    y_raw = df["label"].values
-    y = np.array([0 if "BENIGN" in str(lbl).upper() else 1 for lbl in y_raw])
-
     X_train,X_test,y_train,y_test = train_test_split(X,y,test_size=0.2,stratify=y,random_state=42)
 
     scaler = StandardScaler()
@@ -204,8 +252,18 @@ def build_dataset(csv_folder=CLEAN_DATA_DIR, max_flows=MAX_FLOWS):
     pd.DataFrame(y_test).to_pickle(os.path.join(DATA_DIR,"y_test.pkl"))
     import joblib
     joblib.dump(scaler, os.path.join(DATA_DIR,"scaler.pkl"))
+    write_feature_layout(DATA_DIR, FEATURE_LAYOUT, X_train.shape[1])
+
+    save_early_datasets(early, DATA_DIR, seed)
 
     print("\nBuild complete. Pickles saved in data/")
 
 if __name__=="__main__":
-    build_dataset()
+    p = argparse.ArgumentParser(description="Budowa zbioru flowów z CICIDS2017 (streaming).")
+    p.add_argument("--input-dir", default=CLEAN_DATA_DIR)
+    p.add_argument("--max-flows", type=int, default=MAX_FLOWS)
+    p.add_argument("--attack-ratio", type=float, default=None,
+                   help="Udział ATTACK w próbce (domyślnie jak w danych).")
+    p.add_argument("--seed", type=int, default=SEED)
+    args = p.parse_args()
+    build_dataset(args.input_dir, args.max_flows, attack_ratio=args.attack_ratio, seed=args.seed)
@@ -12,15 +12,7 @@ import sqlite3
 import time
 from datetime import datetime
 from scapy.all import sniff, IP, TCP, UDP
-from config_and_db import DB_PATH, DEFAULT_INTERFACE, init_db
-
-# Upewnij się, że baza i tabele istnieją
-init_db()
-
-INTERFACE = DEFAULT_INTERFACE
-print(f"Nasłuch na interfejsie: {INTERFACE}")
-
-os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+from config_and_db import DB_PATH, default_interface, init_db
 
 def process_packet(pkt):
     try:
@@ -44,8 +36,13 @@ def process_packet(pkt):
         print("Błąd process_packet:", e)
 
 def main():
+    # Upewnij się, że baza i tabele istnieją
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    init_db()
+    iface = default_interface()
+    print(f"Nasłuch na interfejsie: {iface}")
     try:
-        sniff(iface=INTERFACE, prn=process_packet, store=False)
+        sniff(iface=iface, prn=process_packet, store=False)
     except KeyboardInterrupt:
         print("\nZatrzymano przechwytywanie pakietów.")
     except Exception as e:
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+cascade.py
+
+Kaskadowy ensemble: tani model ocenia flow pierwszy, a tylko flowy z prawdopodobieństwem
+ataku w paśmie niepewności (low, high) trafiają do cięższych modeli (głosowanie większościowe).
+- CascadeEnsemble.classify_one() — tryb realtime (process_packet)
+- CascadeEnsemble.predict_batch() — tryb wsadowy (predict_models --cascade)
+- calibrate() — dobór progów offline na zbiorze testowym; zapis do models/cascade.json
+"""
+
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from config_and_db import DATA_DIR, MODEL_DIR, DB_PATH
+
+CASCADE_CONFIG = os.path.join(MODEL_DIR, "cascade.json")
+DEFAULT_ORDER = ("lr", "mlp", "rf")   # od najtańszego do najdroższego
+DEFAULT_LOW = 0.05
+DEFAULT_HIGH = 0.95
+BENIGN_LABEL = 0
+MAX_ACCURACY_DROP = 0.002             # dopuszczalny spadek accuracy względem pełnego ensemble
+
+def attack_probability(model, X):
+    """P(atak) = 1 - P(BENIGN); działa też dla modeli wieloklasowych."""
+    proba = model.predict_proba(X)
+    benign = np.flatnonzero(np.asarray(model.classes_) == BENIGN_LABEL)
+    return 1.0 - proba[:, benign[0]] if benign.size else proba.max(axis=1)
+
+
+class CascadeEnsemble:
+    def __init__(self, models, order=DEFAULT_ORDER, low=DEFAULT_LOW, high=DEFAULT_HIGH):
+        self.models = models          # dict albo LiveModels (hot reload działa dalej)
+        self.order = tuple(order)
+        self.low = low
+        self.high = high
+
+    @classmethod
+    def from_config(cls, models, path=CASCADE_CONFIG):
+        """Progi z kalibracji; bez pliku konfiguracji — wartości domyślne."""
+        if not os.path.exists(path):
+            return cls(models)
+        with open(path) as f:
+            cfg = json.load(f)
+        return cls(models, order=cfg.get("order", DEFAULT_ORDER),
+                   low=cfg.get("low", DEFAULT_LOW), high=cfg.get("high", DEFAULT_HIGH))
+
+    def stages(self):
+        """Dostępne modele w kolejności kaskady (migawka słownika modeli)."""
+        snapshot = dict(self.models.items())
+        return [(name, snapshot[name]) for name in self.order if name in snapshot]
+
+    def classify_one(self, X):
+        """Zwraca (preds, decision) dla jednego flow, jak głosowanie w process_packet."""
+        stages = self.stages()
+        if not stages:
+            return {}, "ACCEPT"
+        name, first = stages[0]
+        p = float(attack_probability(first, X)[0])
+        preds = {name: int(p >= 0.5)}
+        if p <= self.low:
+            return preds, "ACCEPT"
+        if p >= self.high:
+            return preds, "DROP"
+        votes = [preds[name]]
+        for name, model in stages[1:]:
+            pred = int(model.predict(X)[0])
+            preds[name] = pred
+            votes.append(pred)
+        return preds, "DROP" if votes.count(1) > len(votes) // 2 else "ACCEPT"
+
+    def predict_batch(self, X):
+        """
+        Zwraca (pred, p_first, escalated): etykiety kaskady, P(atak) z pierwszego modelu
+        i maskę flowów przekazanych do cięższych modeli.
+        """
+        from predict_models import majority_vote
+        stages = self.stages()
+        X = np.asarray(X, dtype=np.float64)
+        _, first = stages[0]
+        p = attack_probability(first, X)
+        pred = (p >= self.high).astype(np.float64)
+        escalated = (p > self.low) & (p < self.high)
+        if escalated.any() and len(stages) > 1:
+            X_esc = X[escalated]
+            votes = [(p[escalated] >= 0.5).astype(np.float64)]
+            votes += [np.asarray(model.predict(X_esc), dtype=np.float64) for _, model in stages[1:]]
+            pred[escalated] = majority_vote(votes)
+        else:
+            pred[escalated] = (p[escalated] >= 0.5)
+        return pred, p, escalated
+
+# -------------------------------------------------------------
+# KALIBRACJA
+# -------------------------------------------------------------
+def _cost_per_row_us(model, X, n_rows=2000):
+    X = X[:n_rows]
+    t0 = time.perf_counter()
+    model.predict(X)
+    return (time.perf_counter() - t0) / max(X.shape[0], 1) * 1e6
+
+def calibrate(models, X, y, order=DEFAULT_ORDER, max_drop=MAX_ACCURACY_DROP):
+    """
+    Przeszukuje siatkę (low, high). Flow eskalowany dostaje głos wszystkich modeli
+    (łącznie z pierwszym), więc jego wynik = pełny ensemble — wystarczy jedno przejście.
+    Wybór: najniższy koszt przy accuracy >= accuracy pełnego ensemble - max_drop.
+    """
+    from predict_models import majority_vote
+    stages = [(n, models[n]) for n in order if n in models]
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y).ravel()
+    p = attack_probability(stages[0][1], X)
+    first_pred = (p >= 0.5).astype(np.float64)
+    full = majority_vote([first_pred] + [np.asarray(m.predict(X), dtype=np.float64) for _, m in stages[1:]])
+    acc_full = float((full == y).mean())
+
+    costs = {n: _cost_per_row_us(m, X) for n, m in stages}
+    cost_first = costs[stages[0][0]]
+    cost_rest = sum(costs[n] for n, _ in stages[1:])
+    cost_full = cost_first + cost_rest
+
+    best = None
+    for low in np.linspace(0.0, 0.5, 51):
+        for high in np.linspace(0.5, 1.0, 51):
+            escalated = (p > low) & (p < high)
+            pred = np.where(escalated, full, (p >= high).astype(np.float64))
+            acc = float((pred == y).mean())
+            if acc < acc_full - max_drop:
+                continue
+            frac = float(escalated.mean())
+            cost = cost_first + frac * cost_rest
+            if best is None or cost < best["cost_us"] or (cost == best["cost_us"] and acc > best["accuracy"]):
+                best = {"low": float(low), "high": float(high), "accuracy": acc,
+                        "escalated_fraction": frac, "cost_us": cost}
+    return {
+        "order": [n for n, _ in stages],
+        "low": best["low"], "high": best["high"],
+        "accuracy_full": acc_full,
+        "accuracy_cascade": best["accuracy"],
+        "escalated_fraction": best["escalated_fraction"],
+        "cost_full_us": cost_full,
+        "cost_cascade_us": best["cost_us"],
+        "speedup": cost_full / best["cost_us"] if best["cost_us"] else None,
+        "model_cost_us": costs,
+        "n_rows": int(X.shape[0]),
+    }
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Kalibracja kaskadowego ensemble na zbiorze testowym.")
+    p.add_argument("--order", nargs="*", default=list(DEFAULT_ORDER), help="Kolejność modeli (tani → drogi).")
+    p.add_argument("--max-drop", type=float, default=MAX_ACCURACY_DROP,
+                   help="Dopuszczalny spadek accuracy względem pełnego ensemble.")
+    p.add_argument("--out", default=CASCADE_CONFIG)
+    return p.parse_args()
+
+def main():
+    from model_registry import ModelRegistry, DEFAULT_MODELS
+    from log_db import log_run
+
+    args = parse_args()
+    X_test = pd.read_pickle(os.path.join(DATA_DIR, "X_test.pkl")).values
+    y_test = pd.read_pickle(os.path.join(DATA_DIR, "y_test.pkl")).values.ravel()
+
+    registry = ModelRegistry()
+    models = {}
+    for key in args.order:
+        try:
+            models[key] = registry.load(DEFAULT_MODELS.get(key, key))
+        except FileNotFoundError as e:
+            print(f"⚠️ {e}")
+    if not models:
+        print("❌ Brak modeli do kalibracji.")
+        return
+
+    cfg = calibrate(models, X_test, y_test, order=args.order, max_drop=args.max_drop)
+    with open(args.out, "w") as f:
+        json.dump(cfg, f, indent=2)
+
+    print(f"✅ Kaskada {' → '.join(cfg['order'])}: low={cfg['low']:.2f} high={cfg['high']:.2f}")
+    print(f"   accuracy: pełny {cfg['accuracy_full']:.4f} → kaskada {cfg['accuracy_cascade']:.4f}")
+    print(f"   eskalowane: {cfg['escalated_fraction'] * 100:.1f}% flowów, "
+          f"koszt {cfg['cost_full_us']:.1f} → {cfg['cost_cascade_us']:.1f} µs/flow (x{cfg['speedup']:.1f})")
+    print(f"🎉 Zapisano: {args.out}")
+    try:
+        log_run(script="cascade",
+                n_rows=cfg["n_rows"],
+                models_used=",".join(cfg["order"]),
+                ensemble_used=True,
+                accuracy=cfg["accuracy_cascade"],
+                notes=json.dumps(cfg),
+                db_path=DB_PATH)
+    except Exception as e:
+        print(f"Błąd logowania: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -4,19 +4,22 @@ config_and_db.py
 
 Centralny plik konfiguracji i inicjalizacji bazy danych dla projektu:
 - Definiuje ścieżki do danych, modeli, logów
-- Tworzy bazy SQLite i potrzebne tabele (w tym flow_logs)
-- Automatycznie wykrywa aktywny interfejs sieciowy (fallback 'lo')
+- Tworzy bazy SQLite i potrzebne tabele (w tym flow_logs) — schemat wersjonowany
+  (PRAGMA user_version), DDL wykonywane tylko przy zmianie wersji
+- Automatycznie wykrywa aktywny interfejs sieciowy (fallback 'lo') — leniwie,
+  przy pierwszym odczycie DEFAULT_INTERFACE (import modułu nie woła psutil)
 """
 
 import os
-import sqlite3
-import psutil
-import socket
+import threading
+from functools import lru_cache
 
 # -------------------------------------------------------------
 # FUNKCJA AUTOMATYCZNEGO WYKRYWANIA INTERFEJSU
 # -------------------------------------------------------------
 def detect_active_interface():
+    import socket
+    import psutil
     ignore = {"lo", "docker0", "virbr0"}
     try:
         addrs = psutil.net_if_addrs()
@@ -43,6 +46,7 @@ DATA_DIR       = os.path.join(BASE_DIR, "data")
 RAW_DATA_DIR   = os.path.join(DATA_DIR, "CICIDS2017")
 CLEAN_DATA_DIR = os.path.join(DATA_DIR, "cleaned")
 NORMALIZED_DATA_DIR = os.path.join(DATA_DIR, "normalized")   # folder z chunkami
+DEDUP_DATA_DIR = os.path.join(DATA_DIR, "dedup")             # wynik dedup_dataset.py (kolumna Weight)
 
 MODEL_DIR      = os.path.join(BASE_DIR, "models")
 REPORTS_DIR    = os.path.join(BASE_DIR, "reports")
@@ -70,9 +74,17 @@ DB_PATH = os.path.join(LOGS_DIR, "project_logs.db")
 # -------------------------------------------------------------
 # AUTOMATYCZNIE WYKRYTY INTERFEJS (fallback 'lo')
 # -------------------------------------------------------------
-_detected_iface = detect_active_interface()
-DEFAULT_INTERFACE = detect_active_interface()
-print(f"Wykryty interfejs sieciowy: {DEFAULT_INTERFACE}")
+@lru_cache(maxsize=None)
+def default_interface():
+    """Wykrywany raz, przy pierwszym użyciu."""
+    return detect_active_interface() or "lo"
+
+def __getattr__(name):
+    # `from config_and_db import DEFAULT_INTERFACE` nadal działa, ale wykrywanie
+    # odbywa się dopiero przy pierwszym odwołaniu
+    if name == "DEFAULT_INTERFACE":
+        return default_interface()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # -------------------------------------------------------------
 # TWORZENIE KATALOGÓW
@@ -83,69 +95,112 @@ for path in [DATA_DIR, CLEAN_DATA_DIR, NORMALIZED_DATA_DIR, MODEL_DIR, LOGS_DIR,
 # -------------------------------------------------------------
 # INICJALIZACJA BAZY DANYCH
 # -------------------------------------------------------------
+# Migracje schematu: (wersja, [DDL]). Baza pamięta wersję w PRAGMA user_version,
+# więc kolejne init_db() (także w innych procesach) nie wykonują już DDL.
+MIGRATIONS = [
+    (1, [
+        """
+        CREATE TABLE IF NOT EXISTS logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            script TEXT,
+            n_rows INTEGER,
+            models_used TEXT,
+            ensemble_used INTEGER,
+            accuracy REAL,
+            f1_score REAL,
+            notes TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS packets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            src_ip TEXT,
+            dst_ip TEXT,
+            src_port INTEGER,
+            dst_port INTEGER,
+            protocol INTEGER,
+            length INTEGER
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS firewall_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            added_at TEXT,
+            src_ip TEXT,
+            dst_ip TEXT,
+            src_port INTEGER,
+            dst_port INTEGER,
+            protocol INTEGER,
+            action TEXT,
+            expiry TEXT,
+            reason TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS flow_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            src_ip TEXT,
+            dst_ip TEXT,
+            src_port INTEGER,
+            dst_port INTEGER,
+            protocol INTEGER,
+            prediction TEXT,
+            decision TEXT
+        )
+        """,
+    ]),
+    # v2: cechy flowa i etykieta (analityk / potwierdzony werdykt) — dane do online_update.py
+    (2, [
+        "ALTER TABLE flow_logs ADD COLUMN features BLOB",
+        "ALTER TABLE flow_logs ADD COLUMN label INTEGER",
+        "ALTER TABLE flow_logs ADD COLUMN label_source TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_flow_logs_labeled ON flow_logs(id) WHERE label IS NOT NULL",
+    ]),
+    # v3: numer kolejny nadania etykiety — online_update.py stronicuje po czasie oznaczenia,
+    # nie po id flowa (późne etykiety starszych flowów też trafiają do douczania).
+    # Istniejące etykiety dostają label_seq = id, więc stary kursor last_id dalej pasuje.
+    (3, [
+        "ALTER TABLE flow_logs ADD COLUMN label_seq INTEGER",
+        "UPDATE flow_logs SET label_seq = id WHERE label IS NOT NULL",
+        "CREATE INDEX IF NOT EXISTS idx_flow_logs_label_seq ON flow_logs(label_seq) WHERE label_seq IS NOT NULL",
+    ]),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
 def init_db(db_path=DB_PATH):
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS logs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT,
-        script TEXT,
-        n_rows INTEGER,
-        models_used TEXT,
-        ensemble_used INTEGER,
-        accuracy REAL,
-        f1_score REAL,
-        notes TEXT
-    )
-    """)
-
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS packets (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT,
-        src_ip TEXT,
-        dst_ip TEXT,
-        src_port INTEGER,
-        dst_port INTEGER,
-        protocol INTEGER,
-        length INTEGER
-    )
-    """)
-
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS firewall_rules (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        added_at TEXT,
-        src_ip TEXT,
-        dst_ip TEXT,
-        src_port INTEGER,
-        dst_port INTEGER,
-        protocol INTEGER,
-        action TEXT,
-        expiry TEXT,
-        reason TEXT
-    )
-    """)
-
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS flow_logs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT,
-        src_ip TEXT,
-        dst_ip TEXT,
-        src_port INTEGER,
-        dst_port INTEGER,
-        protocol INTEGER,
-        prediction TEXT,
-        decision TEXT
-    )
-    """)
-
-    conn.commit()
-    conn.close()
-    print(f"Baza danych utworzona lub zaktualizowana: {db_path}")
+    """Doprowadza schemat bazy do SCHEMA_VERSION (raz na proces i ścieżkę; DDL tylko przy migracji)."""
+    db_path = os.path.abspath(db_path)
+    if db_path in _schema_ready:
+        return db_path
+    import sqlite3
+    with _schema_lock:
+        if db_path in _schema_ready:
+            return db_path
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                conn.execute("BEGIN IMMEDIATE")   # równoległe procesy: migruje tylko jeden
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                for target, statements in MIGRATIONS:
+                    if target <= version:
+                        continue
+                    for sql in statements:
+                        conn.execute(sql)
+                    conn.execute(f"PRAGMA user_version = {int(target)}")
+                conn.commit()
+                if version < SCHEMA_VERSION:
+                    print(f"Baza danych utworzona lub zaktualizowana: {db_path} (schemat v{SCHEMA_VERSION})")
+        finally:
+            conn.close()
+        _schema_ready.add(db_path)
+    return db_path
 
 # -------------------------------------------------------------
 # URUCHOMIE PRZY IMPORT/EXEC
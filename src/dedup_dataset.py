@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+dedup_dataset.py
+
+Strumieniowa deduplikacja wierszy CICIDS2017 (cechy + etykieta) w ograniczonej pamięci.
+- przejście 1: każdy chunk CSV → hash 64-bit cech wiersza (pd.util.hash_pandas_object);
+  wiersze (cechy + kod oryginalnej etykiety) rozkładane do N_PARTITIONS plików partycji
+  wg hash % N (surowe float64 na dysku), więc identyczne wiersze trafiają do tej samej partycji
+- przejście 2: partycja po partycji dokładna deduplikacja po bajtach wiersza (np.unique),
+  liczba wystąpień zapisywana w kolumnie Weight — nic nie ginie, wagi odtwarzają rozkład
+- etykieta zostaje oryginalna (np. "DDoS", "PortScan"): różne typy ataków o tych samych
+  cechach nie są łączone; binaryzacja jak dotąd w normalize_dataset / build_dataset
+- pamięć ≈ jedna partycja (dane / N_PARTITIONS) zamiast zbioru hashy całego datasetu
+- te same cechy z różnymi etykietami (konflikty, także różne typy ataków) są liczone w statystykach
+- wynik: DEDUP_DATA_DIR/CICIDS2017_dedup.csv (kolumny jak w cleaned + Weight) oraz dedup_stats.json;
+  normalize_dataset.py / build_dataset.py czytają go przez --input-dir
+"""
+
+import os
+import glob
+import json
+import time
+import shutil
+import argparse
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from config_and_db import CLEAN_DATA_DIR, DEDUP_DATA_DIR, DB_PATH
+from log_db import log_run, create_db
+
+CHUNK_SIZE = 50_000
+N_PARTITIONS = 64
+WEIGHT_COL = "Weight"
+OUTPUT_NAME = "CICIDS2017_dedup.csv"
+DROP_COLS = ["Flow ID", "Src IP", "Dst IP", "Timestamp"]
+
+
+def prepare_chunk(chunk):
+    """(cechy float64, etykiety bez zmian) — czyszczenie cech jak w normalize_dataset, -0.0 → 0.0."""
+    chunk.columns = chunk.columns.str.strip()
+    chunk = chunk.drop(columns=[c for c in DROP_COLS if c in chunk.columns])
+    labels = chunk.pop("Label").astype(str)
+    X = chunk.apply(pd.to_numeric, errors="coerce").astype(np.float64)
+    X = X.replace([np.inf, -np.inf], np.nan).fillna(0.0) + 0.0
+    return X, labels
+
+def label_codes(labels, vocab):
+    """Kody float64 etykiet (słownik vocab rośnie w kolejności pierwszego wystąpienia)."""
+    for lbl in labels.unique():
+        vocab.setdefault(lbl, float(len(vocab)))
+    return labels.map(vocab).values.astype(np.float64)
+
+def row_hashes(X):
+    return pd.util.hash_pandas_object(X, index=False).values
+
+def partition_rows(files, tmp_dir, n_partitions=N_PARTITIONS, chunksize=CHUNK_SIZE):
+    """
+    Przejście 1: wiersze (cechy + kod etykiety) dopisywane do plików partycji.
+    Zwraca (kolumny, liczba wierszy, słownik etykieta → kod).
+    """
+    handles = [open(os.path.join(tmp_dir, f"part{i:03d}.bin"), "ab") for i in range(n_partitions)]
+    columns, n_rows, vocab = None, 0, {}
+    try:
+        for path in files:
+            for chunk in tqdm(pd.read_csv(path, chunksize=chunksize, low_memory=False),
+                              desc=os.path.basename(path), unit="chunk"):
+                X, labels = prepare_chunk(chunk)
+                y = label_codes(labels, vocab)
+                if columns is None:
+                    columns = list(X.columns)
+                elif list(X.columns) != columns:
+                    X = X.reindex(columns=columns, fill_value=0.0)
+                part = (row_hashes(X) % np.uint64(n_partitions)).astype(np.int64)
+                rows = np.column_stack([X.values, y])
+                order = np.argsort(part, kind="stable")
+                bounds = np.searchsorted(part[order], np.arange(n_partitions + 1))
+                for i in range(n_partitions):
+                    if bounds[i] < bounds[i + 1]:
+                        rows[order[bounds[i]:bounds[i + 1]]].tofile(handles[i])
+                n_rows += len(y)
+    finally:
+        for h in handles:
+            h.close()
+    return columns, n_rows, vocab
+
+def dedup_partition(path, width):
+    """Przejście 2 dla jednej partycji: unikalne wiersze w kolejności pierwszego wystąpienia + liczności."""
+    rows = np.fromfile(path, dtype=np.float64)
+    if rows.size == 0:
+        return rows.reshape(0, width), np.empty(0, dtype=np.int64), 0
+    rows = rows.reshape(-1, width)
+    as_bytes = np.ascontiguousarray(rows).view(np.dtype((np.void, rows.itemsize * width))).ravel()
+    _, first, counts = np.unique(as_bytes, return_index=True, return_counts=True)
+    keep = np.argsort(first)
+    unique_rows, counts = rows[first[keep]], counts[keep]
+    # konflikty: te same cechy, różne etykiety
+    features = np.ascontiguousarray(unique_rows[:, :-1]).view(
+        np.dtype((np.void, rows.itemsize * (width - 1)))).ravel()
+    conflicts = len(features) - len(np.unique(features))
+    return unique_rows, counts, conflicts
+
+def dedup_files(files, out_dir=DEDUP_DATA_DIR, n_partitions=N_PARTITIONS, chunksize=CHUNK_SIZE):
+    os.makedirs(out_dir, exist_ok=True)
+    tmp_dir = os.path.join(out_dir, "partitions")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    out_path = os.path.join(out_dir, OUTPUT_NAME)
+
+    t0 = time.perf_counter()
+    columns, n_in, vocab = partition_rows(files, tmp_dir, n_partitions, chunksize)
+    names = np.array(sorted(vocab, key=vocab.get), dtype=object)   # kod → oryginalna etykieta
+    if columns is None:
+        raise RuntimeError("Brak danych wejściowych")
+    width = len(columns) + 1
+
+    stats = {"rows_in": n_in, "rows_out": 0, "conflicts": 0, "max_weight": 0,
+             "per_class": {name: [0, 0] for name in names}}
+    if os.path.exists(out_path):
+        os.remove(out_path)
+    for i in tqdm(range(n_partitions), desc="Partycje", unit="part"):
+        part_path = os.path.join(tmp_dir, f"part{i:03d}.bin")
+        rows, counts, conflicts = dedup_partition(part_path, width)
+        os.remove(part_path)
+        if len(rows) == 0:
+            continue
+        codes = rows[:, -1].astype(np.int64)
+        df = pd.DataFrame(rows[:, :-1], columns=columns)
+        df["Label"] = names[codes]
+        df[WEIGHT_COL] = counts
+        df.to_csv(out_path, mode="a", header=not os.path.exists(out_path), index=False)
+
+        stats["rows_out"] += len(rows)
+        stats["conflicts"] += int(conflicts)
+        stats["max_weight"] = max(stats["max_weight"], int(counts.max()))
+        for code in np.unique(codes):
+            mask = codes == code
+            stats["per_class"][names[code]][0] += int(counts[mask].sum())
+            stats["per_class"][names[code]][1] += int(mask.sum())
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    stats["seconds"] = round(time.perf_counter() - t0, 1)
+    stats["reduction"] = round(1 - stats["rows_out"] / max(n_in, 1), 4)
+    stats["partitions"] = n_partitions
+    stats["output"] = out_path
+    with open(os.path.join(out_dir, "dedup_stats.json"), "w") as f:
+        json.dump(stats, f, indent=2)
+    return stats
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Deduplikacja wierszy CICIDS2017 (hash + partycje, wagi = liczności).")
+    p.add_argument("--input-dir", default=CLEAN_DATA_DIR)
+    p.add_argument("--out-dir", default=DEDUP_DATA_DIR)
+    p.add_argument("--partitions", type=int, default=N_PARTITIONS,
+                   help="Liczba partycji hashy (pamięć ≈ dane / partycje).")
+    p.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    files = sorted(glob.glob(os.path.join(args.input_dir, "*.csv")))
+    if not files:
+        print(f"❌ Brak plików CSV w {args.input_dir}")
+        return
+    print(f"Deduplikacja {len(files)} plików, {args.partitions} partycji")
+    stats = dedup_files(files, args.out_dir, args.partitions, args.chunksize)
+
+    print(f"\n✅ {stats['rows_in']} → {stats['rows_out']} wierszy "
+          f"(-{stats['reduction'] * 100:.1f}%) w {stats['seconds']}s")
+    for name, (n_in, n_out) in stats["per_class"].items():
+        print(f"   {name:<28} {n_in:>10} → {n_out:>10}")
+    if stats["conflicts"]:
+        print(f"⚠️ Te same cechy z różnymi etykietami: {stats['conflicts']} wektorów")
+    print(f"Zapisano: {stats['output']}")
+
+    try:
+        create_db(DB_PATH)
+        log_run(script="dedup_dataset",
+                n_rows=stats["rows_out"],
+                models_used="",
+                ensemble_used=False,
+                notes=json.dumps({k: stats[k] for k in ("rows_in", "reduction", "conflicts",
+                                                        "max_weight", "per_class", "seconds")}),
+                db_path=DB_PATH)
+    except Exception as e:
+        print(f"Błąd logowania: {e}")
+
+if __name__ == "__main__":
+    main()
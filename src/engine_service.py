@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+engine_service.py
+
+Silnik detekcji jako osobny proces (sniff + process_packet), GUI podłącza się jako cienki klient.
+- zdarzenia (werdykty) i liczniki idą gniazdem Unix jako NDJSON (jeden obiekt JSON na linię)
+- wątek przechwytywania tylko wkłada zdarzenie do ograniczonej kolejki (put_nowait);
+  rozsyłaniem do klientów zajmuje się osobny wątek — wolny/odłączony klient nie spowalnia sniff
+- obie strony restartują się niezależnie: silnik działa bez klientów, EngineClient
+  wznawia połączenie po zerwaniu
+
+- endpoint /metrics (metrics.py) startuje w procesie silnika, domyślnie na METRICS_PORT
+- --cascade: modele z rejestru opakowane w CascadeEnsemble z progami z models/cascade.json
+- --reduced: modele <Nazwa>Reduced i ekstrakcja tylko grup cech z feature_schema.json
+  (feature_pruning.py); wymaga zredukowanej wersji każdego modelu
+- --online-model: do głosowania dochodzi OnlineSGD douczany przez online_update.py
+
+Uruchomienie (root — sniff):
+    python src/engine_service.py --iface lo
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import signal
+import argparse
+import threading
+
+from config_and_db import LOGS_DIR
+from metrics import METRICS_PORT
+
+SOCKET_PATH = os.path.join(LOGS_DIR, "engine.sock")
+EVENT_QUEUE_MAX = 50_000       # zdarzenia czekające na rozesłanie (powyżej — odrzucane i liczone)
+EVENT_BATCH = 512              # zdarzenia wysyłane jednym sendall
+STATS_INTERVAL = 1.0           # co ile sekund silnik wysyła liczniki
+CLIENT_SEND_TIMEOUT = 2.0      # klient, który tyle nie odbiera, jest odłączany
+RECONNECT_DELAY = 1.0
+
+
+# -------------------------------------------------------------
+# SERWER ZDARZEŃ (proces silnika)
+# -------------------------------------------------------------
+class EventHub:
+    def __init__(self, path=SOCKET_PATH, queue_max=EVENT_QUEUE_MAX):
+        self.path = path
+        self.events = queue.Queue(maxsize=queue_max)
+        self.clients = []
+        self.dropped = 0
+        self.sent = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._server = None
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)        # pozostałość po poprzednim procesie
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen(8)
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        threading.Thread(target=self._broadcast_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        try:
+            self._server.close()
+        except OSError:
+            pass
+        with self._lock:
+            for conn in self.clients:
+                conn.close()
+            self.clients = []
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def publish(self, event):
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def publish_verdict(self, key, pkt_count, preds, decision):
+        """Zgodne z gui_callback z realtime_flow_predict.emit_verdict."""
+        self.publish({"type": "verdict", "ts": time.time(), "key": list(key),
+                      "pkt_count": pkt_count, "preds": preds, "decision": decision})
+
+    def _accept_loop(self):
+        while not self._stop.is_set():
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            conn.settimeout(CLIENT_SEND_TIMEOUT)
+            with self._lock:
+                self.clients.append(conn)
+            print(f"✅ Klient podłączony ({len(self.clients)})")
+
+    def _broadcast_loop(self):
+        while not self._stop.is_set():
+            try:
+                batch = [self.events.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            try:
+                while len(batch) < EVENT_BATCH:
+                    batch.append(self.events.get_nowait())
+            except queue.Empty:
+                pass
+            data = "".join(json.dumps(ev, separators=(",", ":"), default=str) + "\n"
+                           for ev in batch).encode()
+            with self._lock:
+                clients = list(self.clients)
+            for conn in clients:
+                try:
+                    conn.sendall(data)
+                except OSError:
+                    self._drop_client(conn)
+            self.sent += len(batch)
+
+    def _drop_client(self, conn):
+        with self._lock:
+            if conn in self.clients:
+                self.clients.remove(conn)
+        conn.close()
+        print(f"⚠️ Klient odłączony ({len(self.clients)})")
+
+
+def engine_stats(hub):
+    import realtime_flow_predict as engine
+    verdicts = {}
+    for (decision, _reason), value in engine.VERDICTS.items():
+        verdicts[decision] = verdicts.get(decision, 0) + value
+    return {
+        "type": "stats",
+        "ts": time.time(),
+        "pid": os.getpid(),
+        "packets": engine.PACKETS.value,
+        "live_flows": len(engine.flows),
+        "verdicts": verdicts,
+        "events_dropped": hub.dropped,
+        "clients": len(hub.clients),
+    }
+
+
+def _in_registry(registry, name):
+    try:
+        registry.resolve(name)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def run_engine(iface, path=SOCKET_PATH, early=True, prefilter=False, metrics_port=METRICS_PORT, online_update=None,
+               cascade=None, reduced=None, online_model=False, models=None):
+    """
+    Proces silnika: modele z rejestru (hot reload), AsyncSniffer, zdarzenia do hub; stop: SIGTERM/SIGINT.
+    /metrics działa tutaj — liczniki są aktualizowane tylko w procesie, który przetwarza pakiety.
+    cascade: ścieżka konfiguracji kaskady (cascade.py calibrate) albo None — głosowanie wszystkich modeli.
+    reduced: ścieżka feature_schema.json albo None — pełny wektor cech i pełne modele.
+    models: skróty modeli z DEFAULT_MODELS (np. ["rf", "lr"]) albo None — wszystkie.
+    online_model: dołącza OnlineSGD (online_update.py) do modeli na żywo — także zanim
+    pierwsza runda go opublikuje (hot reload załaduje go po publikacji).
+    """
+    from scapy.all import AsyncSniffer
+    import realtime_flow_predict as engine
+    from model_registry import ModelRegistry, DEFAULT_MODELS, reduced_model_name
+    from flood_prefilter import FloodPrefilter
+    from hotpath_profiler import PROFILER
+
+    registry = ModelRegistry()
+    names = {key: name for key, name in DEFAULT_MODELS.items() if models is None or key in models}
+    if reduced:
+        # pełne modele dostałyby wyzerowane kolumny spoza schematu — tylko wszystkie zredukowane albo żaden
+        if not os.path.exists(reduced):
+            print(f"❌ Brak schematu cech {reduced} (uruchom feature_pruning.py)")
+            return
+        full = names
+        names = {key: reduced_model_name(name) for key, name in full.items()}
+        # każdy model, który silnik załadowałby w pełnej wersji, musi mieć wersję zredukowaną
+        missing = [names[key] for key, name in full.items()
+                   if _in_registry(registry, name) and not _in_registry(registry, names[key])]
+        names = {key: name for key, name in names.items() if _in_registry(registry, name)}
+        if missing or not names:
+            print(f"❌ Brak modeli zredukowanych: {', '.join(missing) or 'wszystkich'} (uruchom feature_pruning.py)")
+            return
+        groups = engine.configure_features(reduced)
+        print(f"Schemat cech: {reduced} — grupy ekstraktora: {', '.join(sorted(groups))}")
+    if online_model:
+        from online_update import ONLINE_MODEL_NAME
+        names = {**names, "sgd": ONLINE_MODEL_NAME}
+    live = registry.live(names)
+    live.watch()
+    classifier = live
+    if cascade:
+        # kaskada czyta modele z LiveModels przy każdym flow — hot reload działa dalej
+        from cascade import CascadeEnsemble
+        if not os.path.exists(cascade):
+            print(f"⚠️ Brak konfiguracji kaskady {cascade} — progi domyślne (uruchom cascade.py)")
+        classifier = CascadeEnsemble.from_config(live, cascade)
+        print(f"Kaskada: {' → '.join(classifier.order)}, pasmo niepewności ({classifier.low:.2f}, {classifier.high:.2f})")
+    early_models = engine.load_early_models(registry) if early else None
+    if early_models is not None:
+        early_models.watch()
+    flood = FloodPrefilter() if prefilter else None
+
+    engine.start_db_writer()
+    if metrics_port:
+        from metrics import start_metrics_server
+        try:
+            start_metrics_server(port=metrics_port)
+        except OSError as e:
+            print(f"Endpoint metryk niedostępny: {e}")
+    PROFILER.install_signal_handlers()
+    if online_update:
+        # douczanie na oznaczonych flowach w tle; nowe wersje wracają przez hot reload rejestru
+        from online_update import start_background
+        start_background(online_update, registry=ModelRegistry(mmap_mode=None, prefer_compiled=False))
+
+    hub = EventHub(path).start()
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+
+    def stats_loop():
+        while not stop.wait(STATS_INTERVAL):
+            hub.publish(engine_stats(hub))
+
+    threading.Thread(target=stats_loop, daemon=True).start()
+
+    def packet_callback(pkt):
+        engine.process_packet(pkt, classifier, hub.publish_verdict, early_models=early_models, prefilter=flood)
+
+    sniffer = AsyncSniffer(iface=iface, prn=packet_callback, store=False)
+    sniffer.start()
+    print(f"Silnik nasłuchuje na {iface}, zdarzenia → {path}")
+    try:
+        stop.wait()
+    finally:
+        try:
+            sniffer.stop()
+        except Exception:
+            pass
+        engine.flush_db()
+        hub.stop()
+        print("Silnik zatrzymany.")
+
+
+# -------------------------------------------------------------
+# KLIENT (GUI)
+# -------------------------------------------------------------
+class EngineClient:
+    """
+    Czyta zdarzenia NDJSON z gniazda silnika w wątku w tle i przekazuje je do on_event.
+    Po zerwaniu połączenia (restart silnika) próbuje ponownie co RECONNECT_DELAY.
+    """
+    def __init__(self, on_event, path=SOCKET_PATH, reconnect_delay=RECONNECT_DELAY):
+        self.on_event = on_event
+        self.path = path
+        self.reconnect_delay = reconnect_delay
+        self.connected = threading.Event()
+        self._stop = threading.Event()
+        self._sock = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        sock = self._sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                self._stop.wait(self.reconnect_delay)
+                continue
+            self._sock = sock
+            self.connected.set()
+            try:
+                with sock.makefile("r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            self.on_event(json.loads(line))
+                        except ValueError:
+                            continue
+            except OSError:
+                pass
+            finally:
+                self.connected.clear()
+                self._sock = None
+                sock.close()
+            if not self._stop.is_set():
+                print("⚠️ Utracono połączenie z silnikiem — ponawiam...")
+                self._stop.wait(self.reconnect_delay)
+
+
+def engine_running(path=SOCKET_PATH):
+    """Czy pod gniazdem nasłuchuje silnik."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def spawn_engine(iface, path=SOCKET_PATH, extra_args=()):
+    """Startuje silnik jako osobny proces (własna sesja — przeżywa zamknięcie GUI)."""
+    import subprocess
+    cmd = [sys.executable, os.path.abspath(__file__), "--iface", iface, "--socket", path, *extra_args]
+    return subprocess.Popen(cmd, start_new_session=True)
+
+
+def parse_args():
+    from config_and_db import default_interface
+    from cascade import CASCADE_CONFIG
+    from model_registry import FEATURE_SCHEMA_PATH, DEFAULT_MODELS
+    p = argparse.ArgumentParser(description="Silnik detekcji jako osobny proces (zdarzenia przez gniazdo Unix).")
+    p.add_argument("--iface", default=default_interface())
+    p.add_argument("--socket", default=SOCKET_PATH)
+    p.add_argument("--models", nargs="+", choices=list(DEFAULT_MODELS), default=None,
+                   help="Modele głosujące (skróty z DEFAULT_MODELS); domyślnie wszystkie.")
+    p.add_argument("--no-early", action="store_true", help="Bez modeli wczesnej decyzji.")
+    p.add_argument("--prefilter", action="store_true",
+                   help="Prefiltr floodów (flood_prefilter.py): odrzuca źródła-heavy hittery, alarmuje o celach.")
+    p.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="Port endpointu /metrics.")
+    p.add_argument("--no-metrics", action="store_true", help="Bez endpointu /metrics.")
+    p.add_argument("--cascade", nargs="?", const=CASCADE_CONFIG, default=None, metavar="CASCADE_JSON",
+                   help="Kaskadowy ensemble z progami z kalibracji (domyślnie models/cascade.json).")
+    p.add_argument("--reduced", nargs="?", const=FEATURE_SCHEMA_PATH, default=None, metavar="SCHEMA_JSON",
+                   help="Modele <Nazwa>Reduced i przycięta ekstrakcja cech (domyślnie models/feature_schema.json).")
+    p.add_argument("--online-model", action="store_true",
+                   help="Dołącz OnlineSGD (online_update.py) do modeli głosujących.")
+    p.add_argument("--online-update", type=float, default=None, metavar="SEKUNDY",
+                   help="Douczanie modeli (online_update.py) w tle co podaną liczbę sekund.")
+    args = p.parse_args()
+    if args.reduced and args.online_update:
+        # flow_logs dostałyby wektory z wyzerowanymi kolumnami, a douczane są pełne modele
+        p.error("--reduced nie działa razem z --online-update")
+    if args.reduced and args.online_model:
+        p.error("--reduced nie działa razem z --online-model (OnlineSGD używa pełnego wektora cech)")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run_engine(args.iface, args.socket, early=not args.no_early, prefilter=args.prefilter,
+               metrics_port=None if args.no_metrics else args.metrics_port, online_update=args.online_update,
+               cascade=args.cascade, reduced=args.reduced, online_model=args.online_model,
+               models=args.models)
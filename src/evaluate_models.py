@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+evaluate_models.py
+
+Równoległa ewaluacja wszystkich modeli z MODEL_DIR na pełnych shardach testowych.
+- zadania (model × shard) w puli procesów; każdy worker ładuje model raz (mmap przez rejestr)
+  i liczy macierz pomyłek na całym shardzie — bez podzbiorów X[:2000]
+- shardy: float32 .npy z manifestu normalize_dataset.py (domyślnie, mmap — shard_loader.py),
+  stare chunki joblib wg wzorca glob albo X_test.pkl/y_test.pkl
+  z build_dataset_flow.py (--test-pkl); dla pipeline i modeli skompilowanych (własny scaler)
+  cechy są odskalowywane scalerem shardów, gołe estymatory dostają dane jak w shardzie
+- shard o innej liczbie cech niż model jest raportowany jako pominięty, nie znika po cichu
+- na model: macierz pomyłek, metryki per klasa, przepustowość (wiersze/s na 1 CPU),
+  percentyle latencji pojedynczego wiersza, rozmiar w pamięci i na dysku
+- wyniki do tabeli logs (po wierszu na model) i do reports/evaluate_models_report.json
+"""
+
+import os
+import sys
+import json
+import time
+import pickle
+import argparse
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from config_and_db import DATA_DIR, MODEL_DIR, DB_PATH, REPORTS_DIR, NORMALIZED_DATA_DIR, SCALER_NORM_PATH
+from log_db import log_run, create_db
+from model_registry import ModelRegistry, model_name, COMPILED_SUFFIX
+from predict_models import update_confusion, metrics_from_confusion
+from shard_loader import list_shard_files, load_shard_file
+
+PREDICT_BATCH = 50_000         # wiersze na jedno wywołanie predict w obrębie sharda
+LATENCY_ROWS = 1000            # pojedyncze wiersze do percentyli latencji
+LATENCY_PERCENTILES = (50, 95, 99)
+REPORT_PATH = os.path.join(REPORTS_DIR, "evaluate_models_report.json")
+
+
+# -------------------------------------------------------------
+# DANE
+# -------------------------------------------------------------
+def find_shards(source=NORMALIZED_DATA_DIR, test_pkl=False, data_dir=DATA_DIR):
+    if test_pkl:
+        return [os.path.join(data_dir, "X_test.pkl")]
+    return list_shard_files(source)
+
+def load_shard(path):
+    """(X float64, y int) z sharda (.npy / joblib) albo pary X_test.pkl / y_test.pkl."""
+    if os.path.basename(path).startswith("X_test"):
+        import pandas as pd
+        X = pd.read_pickle(path).values
+        y = pd.read_pickle(os.path.join(os.path.dirname(path), "y_test.pkl")).values.ravel()
+    else:
+        X, y, _ = load_shard_file(path)   # wagi z dedup_dataset.py nie wpływają na ewaluację
+    X = np.nan_to_num(np.asarray(X, dtype=np.float64), nan=0.0, posinf=0.0, neginf=0.0)
+    return X, np.asarray(y).astype(np.int64).ravel()
+
+def shard_scaler_path(shard_path):
+    """Scaler, którym zeskalowano shard: scaler.pkl obok sharda (normalize_dataset / build_dataset_flow)."""
+    local = os.path.join(os.path.dirname(shard_path), "scaler.pkl")
+    return local if os.path.exists(local) else SCALER_NORM_PATH
+
+def expects_raw(model):
+    """Pipeline (scaler w środku) i modele skompilowane oczekują surowych cech."""
+    return hasattr(model, "steps") or hasattr(model, "predict_one")
+
+def n_features(model):
+    n = getattr(model, "n_features_in_", None)
+    return int(n) if n is not None else None
+
+
+# -------------------------------------------------------------
+# WORKER
+# -------------------------------------------------------------
+_worker = {"registry": None, "models": {}, "scalers": {}}
+
+def _init_worker(model_dir):
+    # jeden wątek BLAS na proces — równoległość daje pula, nie biblioteki
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = "1"
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=1)
+    except ImportError:
+        pass
+    _worker["registry"] = ModelRegistry(model_dir)
+
+def _single_thread(model):
+    """n_jobs=1 w estymatorach (RF z n_jobs=-1 w każdym workerze = przeciążenie CPU)."""
+    steps = [s for _, s in model.steps] if hasattr(model, "steps") else [model]
+    for step in steps:
+        if getattr(step, "n_jobs", None) not in (None, 1):
+            step.n_jobs = 1
+    return model
+
+def _model(path):
+    model = _worker["models"].get(path)
+    if model is None:
+        model = _worker["models"][path] = _single_thread(_worker["registry"].load(path))
+    return model
+
+def _input_for(model, X, shard_path):
+    if not expects_raw(model):
+        return X
+    scaler_path = shard_scaler_path(shard_path)
+    if not os.path.exists(scaler_path):
+        return X
+    scaler = _worker["scalers"].get(scaler_path)
+    if scaler is None:
+        import joblib
+        scaler = _worker["scalers"][scaler_path] = joblib.load(scaler_path)
+    if getattr(scaler, "n_features_in_", X.shape[1]) != X.shape[1]:
+        return X
+    return scaler.inverse_transform(X)
+
+def _evaluate_shard(model_path, shard_path, batch=PREDICT_BATCH):
+    model = _model(model_path)
+    X, y = load_shard(shard_path)
+    expected = n_features(model)
+    if expected is not None and expected != X.shape[1]:
+        return {"model": model_path, "shard": shard_path, "skipped":
+                f"liczba cech {X.shape[1]} ≠ {expected} w modelu"}
+    X = _input_for(model, X, shard_path)
+    counts = {}
+    seconds = 0.0
+    for start in range(0, X.shape[0], batch):
+        t0 = time.perf_counter()
+        pred = model.predict(X[start:start + batch])
+        seconds += time.perf_counter() - t0
+        update_confusion(counts, y[start:start + batch], np.asarray(pred, dtype=np.float64))
+    return {"model": model_path, "shard": shard_path, "rows": int(X.shape[0]),
+            "predict_s": seconds, "confusion": counts}
+
+def _profile_model(model_path, shard_paths, n_rows=LATENCY_ROWS):
+    """Rozmiar modelu (pickle, dysk, szczyt alokacji przy pełnym odczycie) i latencja pojedynczego wiersza."""
+    import joblib
+    model = _model(model_path)          # importy modułów modelu poza pomiarem alokacji
+    tracemalloc.start()
+    if model_path.endswith(COMPILED_SUFFIX):
+        from fast_inference import load_compiled
+        loaded = load_compiled(model_path, mmap_mode=None)
+    else:
+        loaded = joblib.load(model_path)
+    _, load_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    try:
+        model_bytes = len(pickle.dumps(loaded, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        model_bytes = None
+    del loaded
+
+    out = {"model": model_path, "file_bytes": os.path.getsize(model_path),
+           "model_bytes": model_bytes, "load_peak_bytes": int(load_peak), "latency_us": None}
+    expected = n_features(model)
+    for shard_path in shard_paths:       # pierwszy shard o zgodnej liczbie cech
+        X, _ = load_shard(shard_path)
+        if expected is None or expected == X.shape[1]:
+            break
+    else:
+        return out
+    X = _input_for(model, X, shard_path)
+    rows = X[np.random.default_rng(0).integers(0, X.shape[0], min(n_rows, X.shape[0]))]
+    predict_row = model.predict_one if hasattr(model, "predict_one") else (lambda r: model.predict(r[None, :]))
+    times = np.empty(rows.shape[0])
+    for i in range(rows.shape[0]):
+        t0 = time.perf_counter_ns()
+        predict_row(rows[i])
+        times[i] = time.perf_counter_ns() - t0
+    out["latency_us"] = {f"p{q}": round(float(np.percentile(times, q)) / 1000, 1) for q in LATENCY_PERCENTILES}
+    return out
+
+
+# -------------------------------------------------------------
+# ORKIESTRACJA
+# -------------------------------------------------------------
+def list_model_paths(model_dir=MODEL_DIR, names=None):
+    paths = []
+    for entry in ModelRegistry(model_dir).list_models():
+        name = entry.get("name") or model_name(entry["file"])
+        if names and name not in names and entry["file"] not in names:
+            continue
+        paths.append(os.path.join(model_dir, entry["file"]))
+    return paths
+
+def aggregate(model_path, shard_results, profile):
+    confusion, rows, seconds, skipped = {}, 0, 0.0, []
+    for res in shard_results:
+        if "skipped" in res:
+            skipped.append({"shard": os.path.basename(res["shard"]), "reason": res["skipped"]})
+            continue
+        for key, c in res["confusion"].items():
+            confusion[key] = confusion.get(key, 0) + c
+        rows += res["rows"]
+        seconds += res["predict_s"]
+    accuracy, f1, per_class = metrics_from_confusion(confusion)
+    return {
+        "model": os.path.basename(model_path),
+        "rows": rows,
+        "shards": len(shard_results) - len(skipped),
+        "skipped_shards": skipped,
+        "accuracy": accuracy,
+        "f1": f1,
+        "per_class": {str(k): {m: round(v, 6) if isinstance(v, float) else v for m, v in d.items()}
+                      for k, d in per_class.items()},
+        "confusion": {f"{t}->{p}": c for (t, p), c in sorted(confusion.items())},
+        "throughput_rows_s": round(rows / seconds, 1) if seconds else None,
+        "predict_s": round(seconds, 3),
+        "latency_us": profile.get("latency_us") if profile else None,
+        "file_bytes": profile.get("file_bytes") if profile else None,
+        "model_bytes": profile.get("model_bytes") if profile else None,
+        "load_peak_bytes": profile.get("load_peak_bytes") if profile else None,
+    }
+
+def run_evaluation(model_paths, shards, workers, model_dir=MODEL_DIR):
+    per_model = {p: [] for p in model_paths}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_dir,)) as pool:
+        futures = {pool.submit(_evaluate_shard, mp, sp): (mp, sp) for mp in model_paths for sp in shards}
+        for done, fut in enumerate(as_completed(futures), 1):
+            mp, sp = futures[fut]
+            try:
+                per_model[mp].append(fut.result())
+            except Exception as e:
+                print(f"❌ {os.path.basename(mp)} / {os.path.basename(sp)}: {e}")
+            print(f"Shardy: {done}/{len(futures)}", end="\r")
+    print()
+
+    # latencja mierzona osobno, w jednym procesie bez konkurencji o CPU
+    profiles = {}
+    with ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=(model_dir,)) as pool:
+        for mp in model_paths:
+            try:
+                profiles[mp] = pool.submit(_profile_model, mp, shards).result()
+            except Exception as e:
+                print(f"❌ {os.path.basename(mp)} / profil: {e}")
+    return [aggregate(mp, per_model[mp], profiles.get(mp)) for mp in model_paths]
+
+def print_summary(results):
+    print(f"\n{'model':<36}{'wiersze':>10}{'acc':>8}{'F1':>8}{'wiersze/s':>12}"
+          f"{'p50 µs':>9}{'p99 µs':>9}{'pamięć MB':>11}")
+    for r in results:
+        lat = r["latency_us"] or {}
+        mem = (r["model_bytes"] or 0) / 1e6
+        acc = f"{r['accuracy']:.4f}" if r["accuracy"] is not None else "-"
+        f1 = f"{r['f1']:.4f}" if r["f1"] is not None else "-"
+        print(f"{r['model']:<36}{r['rows']:>10}{acc:>8}{f1:>8}{r['throughput_rows_s'] or 0:>12.0f}"
+              f"{lat.get('p50', 0):>9.1f}{lat.get('p99', 0):>9.1f}{mem:>11.3f}")
+        for s in r["skipped_shards"]:
+            print(f"   ⚠️ pominięty {s['shard']}: {s['reason']}")
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Równoległa ewaluacja modeli na pełnych shardach testowych.")
+    p.add_argument("--models", nargs="*", help="Nazwy modeli z rejestru (domyślnie wszystkie w MODEL_DIR).")
+    p.add_argument("--model-dir", default=MODEL_DIR)
+    p.add_argument("--shards", default=NORMALIZED_DATA_DIR,
+                   help="Katalog z manifest.json albo wzorzec glob starych chunków joblib (X, y).")
+    p.add_argument("--test-pkl", action="store_true", help="Zamiast shardów: X_test.pkl/y_test.pkl z --data-dir.")
+    p.add_argument("--data-dir", default=DATA_DIR)
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--report", default=REPORT_PATH)
+    p.add_argument("--db", default=DB_PATH)
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    shards = find_shards(args.shards, args.test_pkl, args.data_dir)
+    if not shards or not os.path.exists(shards[0]):
+        print("❌ Brak shardów testowych.")
+        sys.exit(1)
+    model_paths = list_model_paths(args.model_dir, args.models)
+    if not model_paths:
+        print("❌ Brak modeli do ewaluacji.")
+        sys.exit(1)
+    print(f"➡️ {len(model_paths)} modeli × {len(shards)} shardów, {args.workers} workerów")
+
+    t0 = time.perf_counter()
+    results = run_evaluation(model_paths, shards, args.workers, args.model_dir)
+    print_summary(results)
+    print(f"\nCzas ewaluacji: {time.perf_counter() - t0:.1f}s")
+
+    create_db(args.db)
+    for r in results:
+        notes = {k: r[k] for k in ("per_class", "confusion", "throughput_rows_s", "latency_us",
+                                   "file_bytes", "model_bytes", "load_peak_bytes", "shards", "skipped_shards")}
+        try:
+            log_run(script="evaluate_models",
+                    n_rows=r["rows"],
+                    models_used=model_name(r["model"]),
+                    ensemble_used=False,
+                    accuracy=r["accuracy"],
+                    f1_score=r["f1"],
+                    notes=json.dumps(notes, default=str),
+                    db_path=args.db)
+        except Exception as e:
+            print(f"Błąd logowania: {e}")
+
+    os.makedirs(os.path.dirname(args.report), exist_ok=True)
+    with open(args.report, "w") as f:
+        json.dump({"shards": [os.path.basename(s) for s in shards], "models": results}, f, indent=2, default=str)
+    print(f"✅ Raport: {args.report}")
+
+if __name__ == "__main__":
+    main()
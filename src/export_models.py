@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+export_models.py
+
+Kompiluje wytrenowane pipeline'y (models/*_pipeline.pkl) do lekkich artefaktów .npz
+wykonywanych przez fast_inference.py:
+- LogisticRegression / MLP: StandardScaler wbudowany w wagi pierwszej warstwy
+- RandomForest: drzewa spłaszczone do ciągłych tablic węzłów
+Po eksporcie werdykty są porównywane z sklearn; jeśli wbudowanie scalera zmienia
+choć jeden werdykt, model jest eksportowany ponownie z jawnym krokiem skalowania.
+Artefakt, który nadal daje inne werdykty niż sklearn, nie trafia do MODEL_DIR
+(stary artefakt jest usuwany), a skrypt kończy się kodem wyjścia 1.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from config_and_db import MODEL_DIR, DATA_DIR, DB_PATH
+from fast_inference import load_compiled
+from model_registry import write_metadata, meta_path, EARLY_CHECKPOINTS, early_model_name, reduced_model_name
+from log_db import log_run
+
+MODEL_FILES = {
+    "rf": os.path.join(MODEL_DIR, "RandomForest_pipeline.pkl"),
+    "lr": os.path.join(MODEL_DIR, "LogisticRegression_pipeline.pkl"),
+    "mlp": os.path.join(MODEL_DIR, "MLP_pipeline.pkl"),
+    # modele wczesnego werdyktu (train_early_models.py)
+    **{f"early_{n}": os.path.join(MODEL_DIR, f"{early_model_name(n)}_pipeline.pkl") for n in EARLY_CHECKPOINTS},
+    # modele na przyciętym schemacie cech (feature_pruning.py)
+    **{f"{short}_reduced": os.path.join(MODEL_DIR, f"{reduced_model_name(name)}_pipeline.pkl")
+       for short, name in (("rf", "RandomForest"), ("lr", "LogisticRegression"), ("mlp", "MLP"))},
+}
+VERIFY_ROWS = 2000    # liczba wierszy do sprawdzenia zgodności werdyktów
+LATENCY_ROWS = 500    # liczba pojedynczych predykcji do pomiaru latencji
+
+def compiled_path(pipeline_path):
+    base = os.path.basename(pipeline_path).replace("_pipeline.pkl", "").replace(".pkl", "")
+    return os.path.join(os.path.dirname(pipeline_path), f"{base}_compiled.npz")
+
+# -------------------------------------------------------------
+# ROZBIÓR PIPELINE
+# -------------------------------------------------------------
+def split_pipeline(model):
+    """Zwraca (columns, scaler, clf). Obsługuje też gołe estymatory bez Pipeline."""
+    if not isinstance(model, Pipeline):
+        return None, None, model
+    columns, scaler = None, None
+    for name, step in model.steps[:-1]:
+        if step is None or step == "passthrough":
+            continue
+        if isinstance(step, StandardScaler):
+            scaler = step
+        elif hasattr(step, "transformers_"):
+            columns = _passthrough_columns(step)
+        else:
+            raise ValueError(f"Nieobsługiwany krok pipeline: {name} ({step.__class__.__name__})")
+    return columns, scaler, model.steps[-1][1]
+
+def _passthrough_columns(transformer):
+    """ColumnTransformer z jednym krokiem 'passthrough' i remainder='drop' → indeksy kolumn."""
+    spec = transformer.transformers
+    if len(spec) != 1 or spec[0][1] != "passthrough" or transformer.remainder != "drop":
+        raise ValueError("Obsługiwana jest tylko selekcja kolumn (passthrough + remainder='drop')")
+    return np.asarray(spec[0][2], dtype=np.int64)
+
+def _scaler_params(scaler):
+    if scaler is None:
+        return None, None
+    mean = scaler.mean_ if scaler.with_mean else None
+    scale = scaler.scale_ if scaler.with_std else None
+    return mean, scale
+
+# -------------------------------------------------------------
+# KOMPILACJA
+# -------------------------------------------------------------
+def _fold_first_layer(W, b, mean, scale):
+    """((x - mean) / scale) @ W + b  ==  x @ W' + b'"""
+    if scale is not None:
+        W = W / scale[:, None]
+    if mean is not None:
+        b = b - mean @ W
+    return W, b
+
+def _flush_subnormals(W):
+    """Wagi subnormalne (|w| < tiny) spowalniają mnożenie macierzy kilkudziesięciokrotnie."""
+    W = np.array(W, dtype=np.float64)
+    W[np.abs(W) < np.finfo(np.float64).tiny] = 0.0
+    return W
+
+def _explicit_scaler(arrays, mean, scale):
+    if mean is not None:
+        arrays["mean"] = mean
+    if scale is not None:
+        arrays["scale"] = scale
+    return arrays
+
+def compile_linear(clf, scaler, fold=True):
+    mean, scale = _scaler_params(scaler)
+    coef = np.asarray(clf.coef_, dtype=np.float64)
+    intercept = np.asarray(clf.intercept_, dtype=np.float64)
+    arrays = {"kind": "linear",
+              "ovr": getattr(clf, "multi_class", "auto") == "ovr" or getattr(clf, "solver", "") == "liblinear"}
+    if fold:
+        W, intercept = _fold_first_layer(coef.T, intercept, mean, scale)
+        coef = W.T
+    else:
+        _explicit_scaler(arrays, mean, scale)
+    arrays.update(coef=_flush_subnormals(coef), intercept=intercept)
+    return arrays
+
+def compile_mlp(clf, scaler, fold=True):
+    mean, scale = _scaler_params(scaler)
+    weights = [np.asarray(W, dtype=np.float64) for W in clf.coefs_]
+    biases = [np.asarray(b, dtype=np.float64) for b in clf.intercepts_]
+    arrays = {"kind": "mlp", "n_layers": len(weights),
+              "activation": clf.activation, "out_activation": clf.out_activation_}
+    if fold:
+        weights[0], biases[0] = _fold_first_layer(weights[0], biases[0], mean, scale)
+    else:
+        _explicit_scaler(arrays, mean, scale)
+    for i, (W, b) in enumerate(zip(weights, biases)):
+        arrays[f"W{i}"] = _flush_subnormals(W)
+        arrays[f"b{i}"] = _flush_subnormals(b)
+    return arrays
+
+def compile_forest(clf, scaler):
+    mean, scale = _scaler_params(scaler)
+    trees = [est.tree_ for est in clf.estimators_] if hasattr(clf, "estimators_") else [clf.tree_]
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset = 0
+    for t in trees:
+        idx = np.arange(t.node_count)
+        leaf = t.children_left == -1
+        # Liść wskazuje sam na siebie: stała liczba kroków = max_depth, bez maskowania
+        feature.append(np.where(leaf, 0, t.feature))
+        threshold.append(np.where(leaf, 0.0, t.threshold))
+        left.append(np.where(leaf, idx, t.children_left) + offset)
+        right.append(np.where(leaf, idx, t.children_right) + offset)
+        v = t.value[:, 0, :].astype(np.float64)
+        norm = v.sum(axis=1, keepdims=True)
+        norm[norm == 0] = 1.0
+        value.append(v / norm)
+        roots.append(offset)
+        offset += t.node_count
+    arrays = _explicit_scaler({
+        "kind": "forest",
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold),
+        "left": np.concatenate(left).astype(np.int32),
+        "right": np.concatenate(right).astype(np.int32),
+        "value": np.concatenate(value),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "max_depth": max(t.max_depth for t in trees),
+    }, mean, scale)
+    return arrays
+
+def compile_model(model, fold=True):
+    columns, scaler, clf = split_pipeline(model)
+    if hasattr(clf, "estimators_") or hasattr(clf, "tree_"):
+        arrays = compile_forest(clf, scaler)
+    elif hasattr(clf, "coefs_"):
+        arrays = compile_mlp(clf, scaler, fold=fold)
+    elif hasattr(clf, "coef_"):
+        arrays = compile_linear(clf, scaler, fold=fold)
+    else:
+        raise ValueError(f"Nieobsługiwany model: {clf.__class__.__name__}")
+    arrays["classes"] = np.asarray(clf.classes_)
+    arrays["n_features"] = int(model.n_features_in_)
+    if columns is not None:
+        arrays["columns"] = columns
+    return arrays
+
+# -------------------------------------------------------------
+# WERYFIKACJA I POMIAR
+# -------------------------------------------------------------
+def count_mismatches(model, compiled, X):
+    expected = model.predict(X)
+    batch = compiled.predict(X)
+    single = np.array([compiled.predict_one(row) for row in X])
+    return int((expected != batch).sum() + (expected != single).sum())
+
+def latency_us(fn, X, n_rows=LATENCY_ROWS):
+    times = []
+    for i in range(min(n_rows, X.shape[0])):
+        row = X[i:i + 1]
+        t0 = time.perf_counter_ns()
+        fn(row)
+        times.append(time.perf_counter_ns() - t0)
+    times = np.asarray(times) / 1000.0
+    return float(np.percentile(times, 50)), float(np.percentile(times, 99))
+
+def load_verify_data(path=None, n_rows=VERIFY_ROWS):
+    """Dane do weryfikacji: wskazany plik, data/X_test.pkl albo syntetyczne flowy."""
+    path = path or os.path.join(DATA_DIR, "X_test.pkl")
+    if os.path.exists(path):
+        df = pd.read_pickle(path) if path.endswith(".pkl") else pd.read_csv(path, nrows=n_rows)
+        if "Label" in df.columns:
+            df = df.drop(columns=["Label"])
+        return np.ascontiguousarray(df.values[:n_rows], dtype=np.float64)
+    from synthetic_flow_generator import generate_synthetic_flows
+    X, _ = generate_synthetic_flows(n_rows, attack_ratio=0.5, seed=42)
+    return X
+
+def save_arrays(arrays, path):
+    """np.savez do wskazanego pliku (bez dopisywania rozszerzenia .npz)."""
+    with open(path, "wb") as f:
+        np.savez(f, **arrays)
+
+def export_model(pipeline_path, X):
+    model = joblib.load(pipeline_path)
+    out_path = compiled_path(pipeline_path)
+    # Silnik mapuje *.npz przez mmap — nadpisanie w miejscu grozi SIGBUS / rozdartym odczytem,
+    # więc artefakt powstaje obok i jest podmieniany przez os.replace (jak ModelRegistry.publish)
+    tmp = out_path + f".tmp-{os.getpid()}"
+    folded = True
+    try:
+        save_arrays(compile_model(model, fold=True), tmp)
+        compiled = load_compiled(tmp)
+        mismatches = count_mismatches(model, compiled, X)
+        if mismatches:
+            # Wbudowanie scalera zmieniło werdykt blisko granicy decyzji — jawne skalowanie
+            folded = False
+            save_arrays(compile_model(model, fold=False), tmp)
+            compiled = load_compiled(tmp)
+            mismatches = count_mismatches(model, compiled, X)
+        if not mismatches:
+            os.replace(tmp, out_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    if mismatches:
+        # werdykty muszą być identyczne z sklearn — rejestr ma wrócić do pipeline'u
+        for path in (out_path, meta_path(out_path)):
+            if os.path.exists(path):
+                os.remove(path)
+    else:
+        write_metadata(out_path, compiled, extra={"source": os.path.basename(pipeline_path),
+                                                  "scaler_folded": folded, "mismatches": mismatches})
+
+    sk_p50, sk_p99 = latency_us(model.predict, X)
+    fast_p50, fast_p99 = latency_us(compiled.predict_one, X)
+    return {
+        "model": os.path.basename(pipeline_path),
+        "artifact": os.path.basename(out_path) if not mismatches else None,
+        "kind": compiled.kind,
+        "scaler_folded": folded,
+        "rows_verified": int(X.shape[0]),
+        "mismatches": mismatches,
+        "sklearn_p50_us": round(sk_p50, 1),
+        "sklearn_p99_us": round(sk_p99, 1),
+        "compiled_p50_us": round(fast_p50, 1),
+        "compiled_p99_us": round(fast_p99, 1),
+        "artifact_bytes": os.path.getsize(out_path) if not mismatches else 0,
+    }
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Eksport pipeline'ów do lekkich artefaktów NumPy.")
+    p.add_argument("--models", nargs="*", choices=list(MODEL_FILES.keys()), default=list(MODEL_FILES.keys()))
+    p.add_argument("--verify-data", default=None, help="Plik .pkl/.csv z cechami do weryfikacji werdyktów.")
+    p.add_argument("--rows", type=int, default=VERIFY_ROWS, help="Liczba wierszy do weryfikacji.")
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    X = load_verify_data(args.verify_data, args.rows)
+    print(f"Dane weryfikacyjne: {X.shape[0]} wierszy\n")
+
+    failed = []
+    for short_name in args.models:
+        path = MODEL_FILES[short_name]
+        if not os.path.exists(path):
+            print(f"⚠️ Model nie znaleziony: {path}")
+            continue
+        try:
+            report = export_model(path, X)
+        except Exception as e:
+            print(f"❌ Eksport {short_name} nie powiódł się: {e}")
+            failed.append(short_name)
+            continue
+
+        if report["mismatches"]:
+            failed.append(short_name)
+            print(f"❌ {report['model']}: {report['mismatches']} niezgodnych werdyktów — artefakt odrzucony")
+        else:
+            print(f"✅ {report['model']} → {report['artifact']} "
+                  f"(scaler w wagach: {report['scaler_folded']})")
+        print(f"   latencja/wiersz p50: sklearn {report['sklearn_p50_us']} µs → "
+              f"compiled {report['compiled_p50_us']} µs")
+        try:
+            log_run(script="export_models",
+                    n_rows=report["rows_verified"],
+                    models_used=short_name,
+                    ensemble_used=False,
+                    notes=json.dumps(report),
+                    db_path=DB_PATH)
+        except Exception as e:
+            print(f"Błąd logowania: {e}")
+
+    if failed:
+        print(f"\n❌ Nie wyeksportowano: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
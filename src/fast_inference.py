@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+fast_inference.py
+
+Minimalny runtime NumPy dla modeli skompilowanych przez export_models.py.
+- Linear (LogisticRegression) i MLP: scaler wbudowany w wagi pierwszej warstwy
+- RandomForest: drzewa spłaszczone do ciągłych tablic węzłów
+- predict_one() działa na prealokowanych buforach (bez walidacji sklearn / DataFrame)
+- predict() / predict_proba() przyjmują macierz (n, n_features) jak sklearn
+"""
+
+import struct
+import zipfile
+
+import numpy as np
+
+
+def _sigmoid(z, out=None):
+    out = np.negative(z, out=out)
+    np.exp(out, out=out)
+    out += 1.0
+    np.reciprocal(out, out=out)
+    return out
+
+def _softmax(z):
+    z = z - z.max(axis=1, keepdims=True)
+    np.exp(z, out=z)
+    z /= z.sum(axis=1, keepdims=True)
+    return z
+
+_ACTIVATIONS = {
+    "identity": lambda z: z,
+    "relu": lambda z: np.maximum(z, 0, out=z),
+    "tanh": lambda z: np.tanh(z, out=z),
+    "logistic": lambda z: _sigmoid(z, out=z),
+}
+
+
+class CompiledModel:
+    """Wspólny interfejs: classes_, n_features_in_, predict, predict_proba, predict_one."""
+    kind = None
+
+    def __init__(self, arrays):
+        self.classes_ = arrays["classes"]
+        self.n_features_in_ = int(arrays["n_features"])
+        # Opcjonalna selekcja kolumn (pierwszy krok pipeline)
+        self.columns = arrays["columns"].astype(np.intp) if "columns" in arrays else None
+        self._width = len(self.columns) if self.columns is not None else self.n_features_in_
+        self._x = np.empty(self._width, dtype=np.float64)
+        # Opcjonalny jawny scaler (gdy wbudowanie w wagi zmieniłoby werdykt)
+        self.mean = arrays["mean"] if "mean" in arrays else None
+        self.scale = arrays["scale"] if "scale" in arrays else None
+
+    def _scale(self, X):
+        # Ta sama kolejność operacji co StandardScaler.transform
+        if self.mean is not None:
+            X = X - self.mean
+        if self.scale is not None:
+            X = X / self.scale
+        return X
+
+    def _prepare(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if self.columns is not None:
+            X = X[:, self.columns]
+        return X
+
+    def _prepare_one(self, x):
+        x = np.asarray(x, dtype=np.float64).ravel()
+        if self.columns is not None:
+            np.take(x, self.columns, out=self._x)
+        else:
+            self._x[:] = x
+        return self._x
+
+    def predict(self, X):
+        return self.classes_[self._predict_index(self._prepare(X))]
+
+    def predict_one(self, x):
+        """Werdykt dla pojedynczego wiersza (klasa z classes_)."""
+        return self.classes_[self._predict_index_one(self._prepare_one(x))]
+
+
+class CompiledLinear(CompiledModel):
+    kind = "linear"
+
+    def __init__(self, arrays):
+        super().__init__(arrays)
+        self.coef = np.ascontiguousarray(arrays["coef"], dtype=np.float64)          # (n_out, n_features)
+        self.intercept = np.ascontiguousarray(arrays["intercept"], dtype=np.float64)
+        self.ovr = bool(arrays["ovr"])
+        self._z = np.empty(self.coef.shape[0], dtype=np.float64)
+
+    def decision_function(self, X):
+        z = self._scale(X) @ self.coef.T + self.intercept
+        return z.ravel() if z.shape[1] == 1 else z
+
+    def _predict_index(self, X):
+        z = self.decision_function(X)
+        return (z > 0).astype(np.intp) if z.ndim == 1 else z.argmax(axis=1)
+
+    def _predict_index_one(self, x):
+        np.dot(self.coef, self._scale(x), out=self._z)
+        self._z += self.intercept
+        return int(self._z[0] > 0) if self._z.shape[0] == 1 else int(self._z.argmax())
+
+    def predict_proba(self, X):
+        z = self.decision_function(self._prepare(X))
+        if z.ndim == 1:
+            p = _sigmoid(z)
+            return np.column_stack([1.0 - p, p])
+        if self.ovr:
+            p = _sigmoid(z)
+            return p / p.sum(axis=1, keepdims=True)
+        return _softmax(z)
+
+
+class CompiledMLP(CompiledModel):
+    kind = "mlp"
+
+    def __init__(self, arrays):
+        super().__init__(arrays)
+        n_layers = int(arrays["n_layers"])
+        self.weights = [np.ascontiguousarray(arrays[f"W{i}"], dtype=np.float64) for i in range(n_layers)]
+        self.biases = [np.ascontiguousarray(arrays[f"b{i}"], dtype=np.float64) for i in range(n_layers)]
+        self.activation = _ACTIVATIONS[str(arrays["activation"])]
+        self.out_activation = str(arrays["out_activation"])
+        self._buffers = [np.empty(W.shape[1], dtype=np.float64) for W in self.weights]
+
+    def _logits(self, X):
+        h = self._scale(X)
+        last = len(self.weights) - 1
+        for i, (W, b) in enumerate(zip(self.weights, self.biases)):
+            h = h @ W
+            h += b
+            if i != last:
+                self.activation(h)
+        return h
+
+    def _predict_index(self, X):
+        z = self._logits(X)
+        return (z[:, 0] > 0).astype(np.intp) if z.shape[1] == 1 else z.argmax(axis=1)
+
+    def _predict_index_one(self, x):
+        h = self._scale(x)
+        last = len(self.weights) - 1
+        for i, (W, b, buf) in enumerate(zip(self.weights, self.biases, self._buffers)):
+            np.dot(h, W, out=buf)
+            buf += b
+            if i != last:
+                self.activation(buf)
+            h = buf
+        return int(h[0] > 0) if h.shape[0] == 1 else int(h.argmax())
+
+    def predict_proba(self, X):
+        z = self._logits(self._prepare(X))
+        if self.out_activation == "softmax":
+            return _softmax(z)
+        p = _sigmoid(z[:, 0])
+        return np.column_stack([1.0 - p, p])
+
+
+class CompiledForest(CompiledModel):
+    kind = "forest"
+
+    def __init__(self, arrays):
+        super().__init__(arrays)
+        # Indeksy w oryginalnym typie (int32) — brak kopii przy mapowaniu pliku (mmap)
+        self.feature = np.ascontiguousarray(arrays["feature"])
+        self.threshold = np.ascontiguousarray(arrays["threshold"], dtype=np.float64)
+        self.left = np.ascontiguousarray(arrays["left"])
+        self.right = np.ascontiguousarray(arrays["right"])
+        self.value = np.ascontiguousarray(arrays["value"], dtype=np.float64)       # (n_nodes, n_classes)
+        self.roots = np.ascontiguousarray(arrays["roots"])
+        self.max_depth = int(arrays["max_depth"])
+
+        n_trees = self.roots.shape[0]
+        self._nodes = np.empty(n_trees, dtype=self.left.dtype)
+        self._fidx = np.empty(n_trees, dtype=self.feature.dtype)
+        self._fval = np.empty(n_trees, dtype=np.float32)
+        self._thr = np.empty(n_trees, dtype=np.float64)
+        self._go_left = np.empty(n_trees, dtype=bool)
+        self._next = np.empty(n_trees, dtype=self.right.dtype)
+        self._x32 = np.empty(self._width, dtype=np.float32)
+        self._proba = np.empty(self.value.shape[1], dtype=np.float64)
+
+    def _scale32(self, X):
+        # Drzewa sklearn porównują cechy rzutowane na float32
+        return self._scale(X).astype(np.float32)
+
+    def _leaves(self, X32):
+        n_rows = X32.shape[0]
+        nodes = np.broadcast_to(self.roots, (n_rows, self.roots.shape[0])).copy()
+        rows = np.arange(n_rows)[:, None]
+        for _ in range(self.max_depth):
+            go_left = X32[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_proba(self, X):
+        leaves = self._leaves(self._scale32(self._prepare(X)))
+        return self.value[leaves].sum(axis=1) / self.roots.shape[0]
+
+    def _predict_index(self, X):
+        leaves = self._leaves(self._scale32(X))
+        return (self.value[leaves].sum(axis=1) / self.roots.shape[0]).argmax(axis=1)
+
+    def _predict_index_one(self, x):
+        self._x32[:] = self._scale(x)
+        nodes = self._nodes
+        nodes[:] = self.roots
+        for _ in range(self.max_depth):
+            np.take(self.feature, nodes, out=self._fidx)
+            np.take(self._x32, self._fidx, out=self._fval)
+            np.take(self.threshold, nodes, out=self._thr)
+            np.less_equal(self._fval, self._thr, out=self._go_left)
+            np.take(self.right, nodes, out=self._next)
+            np.take(self.left, nodes, out=nodes)
+            np.copyto(nodes, self._next, where=~self._go_left)
+        np.sum(self.value[nodes], axis=0, out=self._proba)
+        self._proba /= self.roots.shape[0]
+        return int(self._proba.argmax())
+
+
+_KINDS = {cls.kind: cls for cls in (CompiledLinear, CompiledMLP, CompiledForest)}
+
+def _npz_memmap(path, mmap_mode="r"):
+    """
+    Mapuje tablice z nieskompresowanego .npz (np.savez) bez kopiowania.
+    Strony pliku są współdzielone przez wszystkie procesy ładujące ten sam artefakt.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as fh:
+        for info in zf.infolist():
+            name = info.filename[:-len(".npy")]
+            if info.compress_type == zipfile.ZIP_STORED:
+                # nagłówek lokalny ZIP: 30 bajtów + nazwa + pole extra
+                fh.seek(info.header_offset)
+                name_len, extra_len = struct.unpack("<HH", fh.read(30)[26:30])
+                fh.seek(info.header_offset + 30 + name_len + extra_len)
+                version = np.lib.format.read_magic(fh)
+                if version == (1, 0):
+                    shape, fortran, dtype = np.lib.format.read_array_header_1_0(fh)
+                else:
+                    shape, fortran, dtype = np.lib.format.read_array_header_2_0(fh)
+                if shape and not dtype.hasobject and np.prod(shape) > 0:
+                    arrays[name] = np.memmap(path, dtype=dtype, mode=mmap_mode, offset=fh.tell(),
+                                             shape=shape, order="F" if fortran else "C")
+                    continue
+            with zf.open(info) as member:
+                arrays[name] = np.lib.format.read_array(member, allow_pickle=False)
+    return arrays
+
+def load_compiled(path, mmap_mode=None):
+    """Wczytuje artefakt .npz i zwraca odpowiedni CompiledModel (opcjonalnie przez mmap)."""
+    if mmap_mode:
+        arrays = _npz_memmap(path, mmap_mode)
+    else:
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {k: data[k] for k in data.files}
+    return _KINDS[str(arrays["kind"])](arrays)
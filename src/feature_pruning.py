@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+feature_pruning.py
+
+Analiza i przycinanie cech flowów (78-wymiarowy wektor z extract_flow_features).
+- kolumny stałe (np. indeksy 20–41 i 72–77, których ekstraktor nigdy nie wypełnia)
+- duplikaty: kolumny identyczne albo skorelowane powyżej CORR_THRESHOLD (np. blok 54–71
+  powtarza wcześniejsze statystyki) — zostaje pierwsza z grupy
+- niska istotność: ważność z lasu losowego; zostają cechy pokrywające IMPORTANCE_COVERAGE
+  sumy ważności (i nie mniej niż MIN_FEATURES)
+Wynik: models/feature_schema.json (wybrane indeksy + powody odrzucenia + grupy ekstraktora),
+modele <Nazwa>Reduced w rejestrze (ColumnTransformer passthrough → scaler → klasyfikator, więc
+przyjmują pełny wektor 78 cech; export_models.py kompiluje selekcję kolumn do fast_inference)
+oraz raport trafność vs opóźnienie (sklearn i skompilowany) w reports/.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.neural_network import MLPClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import StandardScaler
+from sklearn.metrics import accuracy_score, f1_score
+
+from config_and_db import DATA_DIR, REPORTS_DIR
+from model_registry import ModelRegistry, FEATURE_SCHEMA_PATH, reduced_model_name
+from realtime_flow_predict import FEATURE_GROUPS, groups_for_indices, extract_flow_features, new_flow_state
+from log_db import log_run
+from build_dataset_flow import FEATURE_LAYOUT, LAYOUT_FILE, read_feature_layout
+
+N_FEATURES = 78
+CORR_THRESHOLD = 0.999
+IMPORTANCE_COVERAGE = 0.99
+MIN_FEATURES = 8
+ANALYSIS_ROWS = 200_000        # próbka do korelacji i ważności
+LATENCY_ROUNDS = 2_000         # predykcje pojedynczego wiersza w pomiarze opóźnienia
+REPORT_PATH = os.path.join(REPORTS_DIR, "feature_pruning_report.json")
+
+MODEL_FACTORIES = {
+    "RandomForest": lambda: RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1),
+    "LogisticRegression": lambda: LogisticRegression(max_iter=1000),
+    "MLP": lambda: MLPClassifier(hidden_layer_sizes=(100, 50), max_iter=200, random_state=42),
+}
+
+
+# -------------------------------------------------------------
+# DANE
+# -------------------------------------------------------------
+def load_flow_dataset(data_dir=DATA_DIR):
+    """
+    X_train/X_test/y_* z build_dataset_flow.py. Zapisane cechy są przeskalowane —
+    odwracamy skalowanie scaler.pkl, bo modele Reduced mają własny scaler na wybranych kolumnach.
+    build_dataset.py zapisuje te same pliki w układzie kolumn CSV — bez znacznika
+    feature_layout.json z układem ekstraktora realtime indeksy cech wskazywałyby złe kolumny.
+    """
+    import joblib
+    layout = read_feature_layout(data_dir)
+    if layout is None or layout.get("layout") != FEATURE_LAYOUT or layout.get("n_features") != N_FEATURES:
+        found = layout.get("layout") if layout else f"brak {LAYOUT_FILE}"
+        raise ValueError(f"❌ {data_dir}: oczekiwano zbioru z build_dataset_flow.py "
+                         f"(układ {FEATURE_LAYOUT}, {N_FEATURES} cech), jest: {found}")
+    X_train = pd.read_pickle(os.path.join(data_dir, "X_train.pkl")).values
+    X_test = pd.read_pickle(os.path.join(data_dir, "X_test.pkl")).values
+    y_train = pd.read_pickle(os.path.join(data_dir, "y_train.pkl")).values.ravel()
+    y_test = pd.read_pickle(os.path.join(data_dir, "y_test.pkl")).values.ravel()
+    scaler_path = os.path.join(data_dir, "scaler.pkl")
+    if os.path.exists(scaler_path):
+        scaler = joblib.load(scaler_path)
+        X_train = scaler.inverse_transform(X_train)
+        X_test = scaler.inverse_transform(X_test)
+    return X_train, X_test, y_train, y_test
+
+
+# -------------------------------------------------------------
+# ANALIZA
+# -------------------------------------------------------------
+def constant_columns(X):
+    return [int(i) for i in np.flatnonzero(np.ptp(X, axis=0) == 0)]
+
+def duplicate_columns(X, candidates, corr_threshold=CORR_THRESHOLD):
+    """{indeks_odrzucony: indeks_zachowany} dla kolumn identycznych lub prawie idealnie skorelowanych."""
+    dup = {}
+    seen = {}
+    for i in candidates:                                  # identyczne: hash zawartości kolumny
+        h = hash(np.ascontiguousarray(X[:, i]).tobytes())
+        if h in seen and np.array_equal(X[:, i], X[:, seen[h]]):
+            dup[i] = seen[h]
+        else:
+            seen.setdefault(h, i)
+    rest = [i for i in candidates if i not in dup]
+    if len(rest) > 1 and corr_threshold < 1:
+        corr = np.abs(np.corrcoef(X[:, rest], rowvar=False))
+        for a in range(len(rest)):
+            if rest[a] in dup:
+                continue
+            for b in range(a + 1, len(rest)):
+                if rest[b] not in dup and corr[a, b] >= corr_threshold:
+                    dup[rest[b]] = rest[a]
+    return dup
+
+def importance_ranking(X, y, candidates, seed=42):
+    forest = RandomForestClassifier(n_estimators=100, max_depth=16, n_jobs=-1, random_state=seed)
+    forest.fit(X[:, candidates], y)
+    return dict(zip(candidates, (float(v) for v in forest.feature_importances_)))
+
+def analyze(X, y, corr_threshold=CORR_THRESHOLD, coverage=IMPORTANCE_COVERAGE,
+            min_features=MIN_FEATURES, sample_rows=ANALYSIS_ROWS, seed=42):
+    rng = np.random.default_rng(seed)
+    if len(X) > sample_rows:
+        idx = rng.choice(len(X), sample_rows, replace=False)
+        X, y = X[idx], y[idx]
+
+    constant = constant_columns(X)
+    candidates = [i for i in range(X.shape[1]) if i not in set(constant)]
+    duplicates = duplicate_columns(X, candidates, corr_threshold)
+    candidates = [i for i in candidates if i not in duplicates]
+
+    importances = importance_ranking(X, y, candidates, seed)
+    ranked = sorted(candidates, key=lambda i: -importances[i])
+    total = sum(importances.values()) or 1.0
+    selected, acc = [], 0.0
+    for i in ranked:
+        if acc >= coverage * total and len(selected) >= min_features:
+            break
+        selected.append(i)
+        acc += importances[i]
+    low = sorted(set(candidates) - set(selected))
+    selected = sorted(selected)
+
+    groups = groups_for_indices(selected)
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "n_features": int(X.shape[1]),
+        "selected": selected,
+        "dropped": {
+            "constant": constant,
+            "duplicate": {str(k): int(v) for k, v in sorted(duplicates.items())},
+            "low_importance": low,
+        },
+        "importances": {str(i): round(importances[i], 6) for i in ranked},
+        "extractor_groups": sorted(groups),
+        "params": {"corr_threshold": corr_threshold, "coverage": coverage,
+                   "min_features": min_features, "sample_rows": int(len(X))},
+    }
+
+
+# -------------------------------------------------------------
+# MODELE I RAPORT
+# -------------------------------------------------------------
+def build_reduced_pipeline(clf, selected):
+    # ta sama postać selekcji co rozpoznawana przez export_models.split_pipeline
+    return Pipeline([
+        ("select", ColumnTransformer([("keep", "passthrough", list(selected))], remainder="drop")),
+        ("scaler", StandardScaler()),
+        ("clf", clf),
+    ])
+
+def build_full_pipeline(clf):
+    return Pipeline([("scaler", StandardScaler()), ("clf", clf)])
+
+def single_thread_predict(model):
+    """Silnik przewiduje po jednym wierszu — pula wątków (n_jobs=-1) tylko dokłada opóźnienia."""
+    clf = model.steps[-1][1]
+    if "n_jobs" in clf.get_params():
+        clf.set_params(n_jobs=1)
+    return model
+
+def single_row_latency(model, X, rounds=LATENCY_ROUNDS):
+    """Opóźnienie predykcji jednego wiersza (tak jak w silniku): mediana i p99 w µs."""
+    rows = X[np.random.default_rng(0).integers(0, len(X), rounds)]
+    times = np.empty(rounds)
+    for k in range(rounds):
+        row = rows[k:k + 1]
+        t0 = time.perf_counter_ns()
+        model.predict(row)
+        times[k] = time.perf_counter_ns() - t0
+    return float(np.median(times) / 1000), float(np.percentile(times, 99) / 1000)
+
+def compiled_row_latency(model, X, rounds=LATENCY_ROUNDS):
+    """Jak single_row_latency, ale dla artefaktu fast_inference (predict_one) — ścieżka silnika."""
+    import tempfile
+    from export_models import compile_model
+    from fast_inference import load_compiled
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model_compiled.npz")
+        np.savez(path, **compile_model(model, fold=False))
+        compiled = load_compiled(path)
+    rows = X[np.random.default_rng(0).integers(0, len(X), rounds)]
+    times = np.empty(rounds)
+    for k in range(rounds):
+        t0 = time.perf_counter_ns()
+        compiled.predict_one(rows[k])
+        times[k] = time.perf_counter_ns() - t0
+    return float(np.median(times) / 1000), float(np.percentile(times, 99) / 1000)
+
+def extractor_latency(groups, rounds=LATENCY_ROUNDS, n_packets=20):
+    """Czas extract_flow_features dla pełnego wektora i dla wybranych grup (µs na flow)."""
+    rng = np.random.default_rng(0)
+    flow = new_flow_state()
+    t = 0.0
+    for _ in range(n_packets):
+        t += float(rng.random())
+        (flow["fwd_lengths"] if rng.random() < 0.6 else flow["bwd_lengths"]).append(int(rng.integers(40, 1500)))
+        flow["timestamps"].append(t)
+    flow["start_time"], flow["dst_port"] = flow["timestamps"][0], 80
+    result = {}
+    for label, g in (("full", None), ("reduced", groups)):
+        t0 = time.perf_counter_ns()
+        for _ in range(rounds):
+            extract_flow_features(None, flow, g)
+        result[label] = (time.perf_counter_ns() - t0) / rounds / 1000
+    return result
+
+def evaluate_pair(name, factory, schema, X_train, y_train, X_test, y_test):
+    out = {}
+    for variant, model in (("full", build_full_pipeline(factory())),
+                           ("reduced", build_reduced_pipeline(factory(), schema["selected"]))):
+        t0 = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_s = time.perf_counter() - t0
+        single_thread_predict(model)
+        t0 = time.perf_counter()
+        y_pred = model.predict(X_test)
+        batch_s = time.perf_counter() - t0
+        p50, p99 = single_row_latency(model, X_test)
+        try:
+            c50, c99 = compiled_row_latency(model, X_test)
+        except Exception as e:
+            print(f"⚠️ {name} {variant}: kompilacja nieudana ({e})")
+            c50 = c99 = None
+        out[variant] = {
+            "model": model,
+            "accuracy": float(accuracy_score(y_test, y_pred)),
+            "f1": float(f1_score(y_test, y_pred, average="weighted")),
+            "fit_s": round(fit_s, 3),
+            "batch_rows_per_s": round(len(X_test) / batch_s) if batch_s else None,
+            "row_p50_us": round(p50, 1),
+            "row_p99_us": round(p99, 1),
+            "compiled_p50_us": round(c50, 1) if c50 is not None else None,
+            "compiled_p99_us": round(c99, 1) if c99 is not None else None,
+        }
+        compiled_txt = f"{c50:.1f}µs" if c50 is not None else "-"
+        print(f"  {name:<20} {variant:<8} acc={out[variant]['accuracy']:.4f} f1={out[variant]['f1']:.4f} "
+              f"sklearn p50={p50:.0f}µs p99={p99:.0f}µs | compiled p50={compiled_txt} | fit={fit_s:.1f}s")
+    return out
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Analiza cech, schemat przycięty i modele Reduced.")
+    p.add_argument("--data-dir", default=DATA_DIR)
+    p.add_argument("--models", nargs="+", choices=list(MODEL_FACTORIES), default=list(MODEL_FACTORIES))
+    p.add_argument("--max-train-rows", type=int, default=ANALYSIS_ROWS)
+    p.add_argument("--corr", type=float, default=CORR_THRESHOLD)
+    p.add_argument("--coverage", type=float, default=IMPORTANCE_COVERAGE)
+    p.add_argument("--min-features", type=int, default=MIN_FEATURES)
+    p.add_argument("--schema", default=FEATURE_SCHEMA_PATH)
+    p.add_argument("--report", default=REPORT_PATH)
+    p.add_argument("--analyze-only", action="store_true", help="Tylko schemat, bez trenowania modeli.")
+    p.add_argument("--no-publish", action="store_true", help="Nie zapisuj modeli Reduced do rejestru.")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        X_train, X_test, y_train, y_test = load_flow_dataset(args.data_dir)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    if X_train.shape[1] != N_FEATURES:
+        raise ValueError(f"oczekiwano {N_FEATURES} cech, jest {X_train.shape[1]}")
+    if len(X_train) > args.max_train_rows:
+        idx = np.random.default_rng(42).choice(len(X_train), args.max_train_rows, replace=False)
+        X_train, y_train = X_train[idx], y_train[idx]
+    print(f"Dane: train {X_train.shape}, test {X_test.shape}")
+
+    schema = analyze(X_train, y_train, args.corr, args.coverage, args.min_features)
+    d = schema["dropped"]
+    print(f"Cechy: {len(schema['selected'])}/{N_FEATURES} zostaje | stałe {len(d['constant'])}, "
+          f"duplikaty {len(d['duplicate'])}, mało istotne {len(d['low_importance'])}")
+    print(f"Grupy ekstraktora: {', '.join(schema['extractor_groups'])} "
+          f"({len(schema['extractor_groups'])}/{len(FEATURE_GROUPS)})")
+    with open(args.schema, "w") as f:
+        json.dump(schema, f, indent=2)
+    print(f"✅ Zapisano schemat: {args.schema}")
+    if args.analyze_only:
+        return
+
+    registry = ModelRegistry()
+    report = {"schema": args.schema, "n_selected": len(schema["selected"]),
+              "extractor_us": extractor_latency(frozenset(schema["extractor_groups"])), "models": {}}
+    print(f"Ekstrakcja cech: pełna {report['extractor_us']['full']:.1f}µs, "
+          f"przycięta {report['extractor_us']['reduced']:.1f}µs na flow")
+
+    for name in args.models:
+        res = evaluate_pair(name, MODEL_FACTORIES[name], schema, X_train, y_train, X_test, y_test)
+        reduced_model = res["reduced"].pop("model")
+        res["full"].pop("model")
+        report["models"][name] = res
+        if not args.no_publish:
+            registry.publish(reduced_model, reduced_model_name(name), extra={
+                "feature_schema": os.path.basename(args.schema), "n_features": len(schema["selected"]),
+                "accuracy": res["reduced"]["accuracy"], "f1": res["reduced"]["f1"]})
+        log_run(script="feature_pruning",
+                n_rows=int(len(X_train)),
+                models_used=reduced_model_name(name),
+                ensemble_used=False,
+                accuracy=res["reduced"]["accuracy"],
+                f1_score=res["reduced"]["f1"],
+                notes=json.dumps({"n_features": len(schema["selected"]),
+                                  "full_f1": res["full"]["f1"],
+                                  "row_p50_us": [res["full"]["row_p50_us"], res["reduced"]["row_p50_us"]]}))
+
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Raport: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,9 +16,6 @@ import os
 from datetime import datetime, timedelta
 from config_and_db import DB_PATH, init_db
 
-# Upewnij się, że tabela istnieje
-init_db()
-
 def validate_ip(ip_str):
     try:
         return str(ipaddress.ip_address(ip_str))
@@ -55,6 +52,7 @@ def _nft_unblock_cmd(src_ip):
     return ["nft", "delete", "rule", "inet", "filter", "input", "ip", "saddr", src_ip, "drop"]
 
 def _insert_rule_db(src_ip, expiry, reason):
+    init_db()  # schemat raz na proces (nie przy imporcie)
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
     c.execute("""
@@ -65,6 +63,7 @@ def _insert_rule_db(src_ip, expiry, reason):
     conn.close()
 
 def _update_rule_expiry_db(src_ip):
+    init_db()
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
     c.execute("UPDATE firewall_rules SET expiry = ? WHERE src_ip = ? AND expiry IS NOT NULL", (datetime.utcnow().isoformat(), src_ip))
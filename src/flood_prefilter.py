@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+flood_prefilter.py
+
+Prefiltr floodów przed tablicą flowów (stała pamięć, bez stanu per-flow).
+- Zanikający count-min sketch: liczba pakietów i nowych flowów per źródło i per cel
+- Zanik wykładniczy z okresem półtrwania HALF_LIFE — licznik/λ to szacowana częstość (na sekundę)
+- Heavy hitter: częstość powyżej progu → flaga na FLAG_WINDOW sekund
+  * źródło: wszystkie jego pakiety odrzucane przed alokacją flowa (i blokada w firewall_rules)
+  * cel: tylko alert (raz na flagę) — nowe flowy do celu są dalej śledzone, bo odcięcie
+    celu ukrywałoby przed sensorem zwykłych klientów i połączenia atakującego
+- nowy flow = otwarcie połączenia przez inicjatora (process_packet: flow nieznany w obu
+  kierunkach, dla TCP sam SYN) — odpowiedzi serwera nie są liczone jako nowe flowy jego adresu
+- progi sprawdzone na strumieniu benign z bench_realtime.py: szczyt ~2 600 pkt/s na adres
+  (SRC_PKT_RATE ≈ 2× zapasu), 0 flag i 0 alertów
+"""
+
+import math
+import time
+from array import array
+from collections import namedtuple
+
+SKETCH_WIDTH = 4096
+SKETCH_DEPTH = 4
+HALF_LIFE = 0.5           # sekundy; okno, w którym liczona jest częstość
+FLAG_WINDOW = 10.0        # sekundy trwania flagi heavy hittera
+MAX_FLAGGED = 10_000      # limit pamięci słownika flag
+REBASE_EXPONENT = 50.0    # przeskalowanie liczników zanim wagi urosną poza zakres float
+
+# progi częstości (na sekundę)
+SRC_PKT_RATE = 5_000
+SRC_NEW_FLOW_RATE = 200
+DST_PKT_RATE = 20_000
+DST_NEW_FLOW_RATE = 1_000
+
+# shed=True: pakiet odrzucany przed tablicą flowów; False: tylko alert, pakiet przetwarzany dalej
+FloodHit = namedtuple("FloodHit", ["kind", "key", "rate", "new", "shed"])
+
+
+class DecayingCountMin:
+    """
+    Count-min sketch z zanikiem wykładniczym. Zamiast mnożyć wszystkie liczniki
+    przy każdym pakiecie, nowe zdarzenia dostają rosnącą wagę exp(λ·(t - t0)),
+    a odczyt dzieli przez tę samą wagę; co jakiś czas liczniki są przeskalowywane.
+    """
+    def __init__(self, width=SKETCH_WIDTH, depth=SKETCH_DEPTH, half_life=HALF_LIFE, now=None):
+        self.width = width
+        self.depth = depth
+        self.lam = math.log(2) / half_life
+        self.t0 = time.time() if now is None else now
+        self.rows = [array("d", bytes(8 * width)) for _ in range(depth)]
+
+    def _indexes(self, key):
+        # podwójne haszowanie (Kirsch–Mitzenmacher): depth indeksów z dwóch hashy
+        h1 = hash(key)
+        h2 = hash((key, 0x9E3779B9)) | 1
+        w = self.width
+        return [(h1 + i * h2) % w for i in range(self.depth)]
+
+    def _rebase(self, now):
+        factor = math.exp(-self.lam * (now - self.t0))
+        for row in self.rows:
+            for i, v in enumerate(row):
+                if v:
+                    row[i] = v * factor
+        self.t0 = now
+
+    def add(self, key, now, count=1.0):
+        """Dodaje zdarzenie i zwraca szacowaną częstość klucza (na sekundę)."""
+        exponent = self.lam * (now - self.t0)
+        if exponent > REBASE_EXPONENT:
+            self._rebase(now)
+            exponent = 0.0
+        scale = math.exp(exponent)
+        weight = count * scale
+        est = None
+        for row, i in zip(self.rows, self._indexes(key)):
+            v = row[i] + weight
+            row[i] = v
+            if est is None or v < est:
+                est = v
+        return est / scale * self.lam
+
+    def rate(self, key, now):
+        scale = math.exp(self.lam * (now - self.t0))
+        est = min(row[i] for row, i in zip(self.rows, self._indexes(key)))
+        return est / scale * self.lam
+
+    def nbytes(self):
+        return sum(row.itemsize * len(row) for row in self.rows)
+
+
+class FloodPrefilter:
+    def __init__(self, width=SKETCH_WIDTH, depth=SKETCH_DEPTH, half_life=HALF_LIFE,
+                 src_pkt_rate=SRC_PKT_RATE, src_new_flow_rate=SRC_NEW_FLOW_RATE,
+                 dst_pkt_rate=DST_PKT_RATE, dst_new_flow_rate=DST_NEW_FLOW_RATE,
+                 flag_window=FLAG_WINDOW, now=None):
+        now = time.time() if now is None else now
+        self.src_pkts = DecayingCountMin(width, depth, half_life, now)
+        self.src_new = DecayingCountMin(width, depth, half_life, now)
+        self.dst_pkts = DecayingCountMin(width, depth, half_life, now)
+        self.dst_new = DecayingCountMin(width, depth, half_life, now)
+        self.thresholds = {
+            "src_pkts": src_pkt_rate, "src_new": src_new_flow_rate,
+            "dst_pkts": dst_pkt_rate, "dst_new": dst_new_flow_rate,
+        }
+        self.flag_window = flag_window
+        self.flagged = {}          # ("src"|"dst", ip) -> (flaga ważna do, częstość)
+        self.flagged_total = 0
+        self.shed_packets = 0
+        self.alerts = 0
+
+    def _flag(self, kind, key, rate, now):
+        if len(self.flagged) >= MAX_FLAGGED:
+            self.expire(now)
+            if len(self.flagged) >= MAX_FLAGGED:
+                return
+        self.flagged[(kind, key)] = (now + self.flag_window, rate)
+        self.flagged_total += 1
+
+    def _active(self, kind, key, now):
+        entry = self.flagged.get((kind, key))
+        if entry is None:
+            return None
+        if entry[0] < now:
+            del self.flagged[(kind, key)]
+            return None
+        return entry[1]
+
+    def observe(self, src_ip, dst_ip, new_flow, now=None):
+        """
+        Rejestruje pakiet. Zwraca None (pakiet idzie do tablicy flowów) albo FloodHit:
+        shed=True — pakiet ma zostać odrzucony bez alokacji flowa (new=True przy pierwszym
+        oznaczeniu źródła); shed=False — alert o celu pod floodem, pakiet przetwarzany dalej.
+        new_flow: pakiet otwiera nowe połączenie (inicjator, flow nieznany w obu kierunkach).
+        """
+        now = time.time() if now is None else now
+        src_rate = self.src_pkts.add(src_ip, now)
+        dst_rate = self.dst_pkts.add(dst_ip, now)
+        src_new_rate = self.src_new.add(src_ip, now) if new_flow else 0.0
+        dst_new_rate = self.dst_new.add(dst_ip, now) if new_flow else 0.0
+
+        # źródło: odrzucane wszystkie pakiety
+        rate = self._active("src", src_ip, now)
+        if rate is not None:
+            self.shed_packets += 1
+            return FloodHit("src", src_ip, rate, False, True)
+        if src_rate > self.thresholds["src_pkts"] or src_new_rate > self.thresholds["src_new"]:
+            rate = max(src_rate, src_new_rate)
+            self._flag("src", src_ip, rate, now)
+            self.shed_packets += 1
+            return FloodHit("src", src_ip, rate, True, True)
+
+        # cel: alert raz na flagę, bez odrzucania — flowy do celu są dalej klasyfikowane
+        if not new_flow or self._active("dst", dst_ip, now) is not None:
+            return None
+        if dst_rate > self.thresholds["dst_pkts"] or dst_new_rate > self.thresholds["dst_new"]:
+            rate = max(dst_rate, dst_new_rate)
+            self._flag("dst", dst_ip, rate, now)
+            self.alerts += 1
+            return FloodHit("dst", dst_ip, rate, True, False)
+        return None
+
+    def expire(self, now=None):
+        now = time.time() if now is None else now
+        for k in [k for k, (until, _) in self.flagged.items() if until < now]:
+            del self.flagged[k]
+
+    def heavy_hitters(self, now=None):
+        """Aktywne flagi: {(kind, ip): częstość}."""
+        self.expire(now)
+        return {k: rate for k, (_, rate) in self.flagged.items()}
+
+    def stats(self):
+        return {
+            "flagged_total": self.flagged_total,
+            "flagged_active": len(self.flagged),
+            "shed_packets": self.shed_packets,
+            "dst_alerts": self.alerts,
+            "sketch_bytes": sum(s.nbytes() for s in (self.src_pkts, self.src_new, self.dst_pkts, self.dst_new)),
+        }
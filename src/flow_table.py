@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+flow_table.py
+
+Tablica aktywnych flowów z limitem liczby wpisów i budżetem pamięci.
+Po przekroczeniu limitu działa polityka przeciążenia:
+- "lru"              — usuwany najdawniej aktualizowany flow
+- "smallest"         — usuwany flow z najmniejszą liczbą pakietów (próbka najstarszych wpisów)
+- "classify-oldest"  — najstarszy flow jest klasyfikowany wcześniej (callback) i usuwany
+- "shed-new"         — nowe flowy nie są przyjmowane, istniejące działają dalej
+Liczniki evicted/shed pokazują, kiedy sensor jest nasycony.
+"""
+
+import time
+from collections import OrderedDict
+
+MAX_FLOWS = 100_000
+MEMORY_BUDGET = 256 * 1024 * 1024   # bajty
+FLOW_BASE_BYTES = 1_100             # szacunek: słownik flowa + listy + słowniki flag (tracemalloc)
+PACKET_BYTES = 72                   # szacunek: znacznik czasu + długość pakietu w listach
+SMALLEST_SAMPLE = 32                # ile najstarszych flowów przeglądać w polityce "smallest"
+SATURATION_REPORT_INTERVAL = 10.0   # sekundy między komunikatami o nasyceniu
+POLICIES = ("lru", "smallest", "classify-oldest", "shed-new")
+
+
+class FlowTable:
+    def __init__(self, factory, max_flows=MAX_FLOWS, memory_budget=MEMORY_BUDGET, policy="lru"):
+        if policy not in POLICIES:
+            raise ValueError(f"Nieznana polityka: {policy} (dostępne: {', '.join(POLICIES)})")
+        self.factory = factory
+        self.max_flows = max_flows
+        self.memory_budget = memory_budget
+        self.policy = policy
+        self._flows = OrderedDict()
+        self.packets = 0
+        self.evicted = 0
+        self.classified_early = 0
+        self.shed = 0
+        self.peak_flows = 0
+        self._last_report = 0.0
+
+    # --- słownikowe API (jak wcześniejszy defaultdict) ---
+    def __contains__(self, key):
+        return key in self._flows
+
+    def __len__(self):
+        return len(self._flows)
+
+    def __getitem__(self, key):
+        return self._flows[key]
+
+    def items(self):
+        return self._flows.items()
+
+    def pop(self, key, default=None):
+        flow = self._flows.pop(key, None)
+        if flow is None:
+            return default
+        self.packets -= len(flow["timestamps"])
+        return flow
+
+    # --- pamięć ---
+    def memory_estimate(self):
+        return len(self._flows) * FLOW_BASE_BYTES + self.packets * PACKET_BYTES
+
+    def over_budget(self, extra_flows=0):
+        if len(self._flows) + extra_flows > self.max_flows:
+            return True
+        return self.memory_estimate() + extra_flows * FLOW_BASE_BYTES > self.memory_budget
+
+    def note_packet(self):
+        """Wywoływane po dopisaniu pakietu do flowa (budżet pamięci)."""
+        self.packets += 1
+
+    # --- dostęp / ewikcja ---
+    def acquire(self, key, on_evict=None):
+        """
+        Zwraca flow dla klucza (tworzy nowy w razie potrzeby) albo None, gdy nowy flow
+        został odrzucony. on_evict(key, flow) dostaje flowy usuwane w polityce classify-oldest.
+        """
+        flow = self._flows.get(key)
+        if flow is not None:
+            if self.policy == "lru":
+                self._flows.move_to_end(key)
+            return flow
+
+        while self._flows and self.over_budget(extra_flows=1):
+            if self.policy == "shed-new":
+                self.shed += 1
+                self._report_saturation()
+                return None
+            self._evict_one(on_evict)
+            self._report_saturation()
+
+        flow = self._flows[key] = self.factory()
+        if len(self._flows) > self.peak_flows:
+            self.peak_flows = len(self._flows)
+        return flow
+
+    def _evict_one(self, on_evict):
+        if self.policy == "smallest":
+            victim, smallest = None, None
+            for i, (key, flow) in enumerate(self._flows.items()):
+                n = len(flow["timestamps"])
+                if smallest is None or n < smallest:
+                    victim, smallest = key, n
+                if i + 1 >= SMALLEST_SAMPLE:
+                    break
+        else:
+            victim = next(iter(self._flows))
+        flow = self.pop(victim)
+        self.evicted += 1
+        if self.policy == "classify-oldest" and on_evict is not None and not flow.get("decided"):
+            self.classified_early += 1
+            try:
+                on_evict(victim, flow)
+            except Exception as e:
+                print("Błąd klasyfikacji usuwanego flowa:", e)
+
+    def _report_saturation(self):
+        now = time.time()
+        if now - self._last_report >= SATURATION_REPORT_INTERVAL:
+            self._last_report = now
+            print(f"⚠️ Tablica flowów nasycona ({self.policy}): {self.stats()}")
+
+    def stats(self):
+        return {
+            "flows": len(self._flows),
+            "peak_flows": self.peak_flows,
+            "packets": self.packets,
+            "memory_estimate_bytes": self.memory_estimate(),
+            "evicted": self.evicted,
+            "classified_early": self.classified_early,
+            "shed": self.shed,
+        }
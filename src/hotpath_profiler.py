@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+hotpath_profiler.py
+
+Wbudowane profilowanie etapów process_packet (bez zewnętrznego profilera).
+- lap("etap"): czas od poprzedniego punktu (perf_counter_ns) trafia do histogramu
+  log2 danego etapu (64 kubełki: stały koszt zapisu, percentyle z dokładnością do x2)
+- włączanie/wyłączanie w trakcie działania: enable()/disable()/toggle(),
+  zmienna środowiskowa FW_PROFILE=1 albo sygnały (install_signal_handlers)
+- próbkowane śledzenie: co N-ty flow (po haszu klucza) zapisuje czasy etapów każdego
+  pakietu do bufora cyklicznego; dump_trace() zapisuje go do pliku JSON lines
+"""
+
+import os
+import json
+import time
+import signal
+import threading
+from collections import deque
+
+from config_and_db import LOGS_DIR
+
+N_BUCKETS = 64
+TRACE_SAMPLE_EVERY = 100       # śledzony co N-ty flow
+TRACE_CAPACITY = 10_000        # pakiety w buforze cyklicznym
+TRACE_PATH = os.path.join(LOGS_DIR, "hotpath_trace.jsonl")
+
+
+class _ThreadState(threading.local):
+    """Stan pomiaru wątku — pola istnieją od początku, także gdy start() jeszcze nie działał
+    (enable()/SIGUSR1 w trakcie _process_packet)."""
+    def __init__(self):
+        self.t_start = None
+        self.last = None
+        self.events = None
+        self.key = None
+
+
+class HotPathProfiler:
+    def __init__(self, enabled=False, sample_every=TRACE_SAMPLE_EVERY, trace_capacity=TRACE_CAPACITY):
+        self.enabled = enabled
+        self.sample_every = sample_every
+        self.hist = {}                         # etap -> [liczniki kubełków log2]
+        self.totals = {}                       # etap -> suma ns
+        self.trace = deque(maxlen=trace_capacity)
+        self._local = _ThreadState()
+
+    # --- przełączanie ---
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        print(f"Profilowanie hot path: {'włączone' if self.enabled else 'wyłączone'}")
+
+    def reset(self):
+        self.hist = {}
+        self.totals = {}
+        self.trace.clear()
+
+    # --- pomiar ---
+    def start(self):
+        local = self._local
+        local.t_start = local.last = time.perf_counter_ns()
+        local.events = None
+
+    def sample(self, key):
+        """Flow śledzony, jeśli jego hasz trafia w 1 na sample_every."""
+        if self.sample_every and hash(key) % self.sample_every == 0:
+            self._local.events = []
+            self._local.key = key
+
+    def _record(self, stage, ns):
+        counts = self.hist.get(stage)
+        if counts is None:
+            counts = self.hist[stage] = [0] * N_BUCKETS
+            self.totals[stage] = 0
+        counts[min(ns.bit_length(), N_BUCKETS - 1)] += 1
+        self.totals[stage] += ns
+
+    def lap(self, stage):
+        """Czas od poprzedniego punktu pomiaru przypisany do etapu."""
+        local = self._local
+        last = local.last
+        now = time.perf_counter_ns()
+        if last is None:
+            local.last = now
+            return
+        ns = now - last
+        local.last = now
+        self._record(stage, ns)
+        if local.events is not None:
+            local.events.append((stage, ns))
+
+    def finish(self):
+        local = self._local
+        t_start = local.t_start
+        if t_start is None:
+            return
+        total = time.perf_counter_ns() - t_start
+        self._record("total", total)
+        if local.events is not None:
+            self.trace.append({"ts": time.time(), "flow": list(local.key),
+                               "stages": local.events, "total_ns": total})
+        local.t_start = local.last = None
+        local.events = None
+
+    # --- raport ---
+    @staticmethod
+    def _percentile(counts, q):
+        n = sum(counts)
+        if not n:
+            return None
+        target = q * n
+        cum = 0
+        for b, c in enumerate(counts):
+            cum += c
+            if cum >= target:
+                return 1 << b       # górna granica kubełka log2 (ns)
+        return 1 << (len(counts) - 1)
+
+    def report(self):
+        """{etap: {count, mean_ns, p50_ns, p99_ns, share}} — share względem etapu total."""
+        total_ns = self.totals.get("total") or 0
+        out = {}
+        for stage, counts in self.hist.items():
+            n = sum(counts)
+            out[stage] = {
+                "count": n,
+                "mean_ns": self.totals[stage] / n if n else None,
+                "p50_ns": self._percentile(counts, 0.50),
+                "p99_ns": self._percentile(counts, 0.99),
+                "share": self.totals[stage] / total_ns if total_ns and stage != "total" else None,
+            }
+        return out
+
+    def print_report(self):
+        rows = sorted(self.report().items(), key=lambda kv: -(kv[1]["mean_ns"] or 0) * kv[1]["count"])
+        print(f"{'etap':<14}{'n':>10}{'średnio µs':>12}{'p50 µs':>10}{'p99 µs':>10}{'udział':>9}")
+        for stage, r in rows:
+            share = f"{r['share'] * 100:.1f}%" if r["share"] is not None else "-"
+            print(f"{stage:<14}{r['count']:>10}{r['mean_ns'] / 1e3:>12.2f}"
+                  f"{r['p50_ns'] / 1e3:>10.2f}{r['p99_ns'] / 1e3:>10.2f}{share:>9}")
+
+    def dump_trace(self, path=TRACE_PATH):
+        """Zapisuje bufor śledzenia (JSON lines). Zwraca liczbę zapisanych pakietów."""
+        events = list(self.trace)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            for e in events:
+                f.write(json.dumps(e) + "\n")
+        os.replace(tmp, path)
+        return len(events)
+
+    def install_signal_handlers(self, toggle_sig=signal.SIGUSR1, dump_sig=signal.SIGUSR2, path=TRACE_PATH):
+        """SIGUSR1 — włącz/wyłącz, SIGUSR2 — raport + zapis śledzenia (tylko wątek główny)."""
+        signal.signal(toggle_sig, lambda *_: self.toggle())
+
+        def _dump(*_):
+            self.print_report()
+            print(f"Śledzenie: {self.dump_trace(path)} pakietów → {path}")
+
+        signal.signal(dump_sig, _dump)
+
+
+PROFILER = HotPathProfiler(enabled=os.environ.get("FW_PROFILE") == "1")
@@ -4,14 +4,26 @@ log_db.py
 
 Zarządzanie logami eksperymentów oraz helper do zapisu flow_logs (jeśli potrzebne).
 Uwaga: flowy są zapisywane do tabeli flow_logs (created in config_and_db.init_db).
+
+Połączenia: jedno trwałe połączenie na wątek i plik bazy (get_connection), WAL,
+synchronous=NORMAL, mmap, cache przygotowanych zapytań; schemat sprawdzany raz na proces.
 """
 
+import os
+import atexit
 import sqlite3
+import threading
 from datetime import datetime
 from typing import Optional, List, Dict
 from config_and_db import DB_PATH, init_db
 
-init_db()
+BUSY_TIMEOUT_MS = 30_000
+MMAP_SIZE = 256 * 1024 * 1024
+CACHED_STATEMENTS = 256
+
+_local = threading.local()
+_all_connections = []
+_all_lock = threading.Lock()
 
 CREATE_TABLE_SQL = """
 CREATE TABLE IF NOT EXISTS logs (
@@ -29,9 +41,65 @@ CREATE TABLE IF NOT EXISTS logs (
 
 def create_db(db_path: Optional[str] = None) -> str:
     db_path = db_path or DB_PATH
-    init_db()  # upewniamy się, że baza jest gotowa
+    init_db(db_path)  # raz na proces; kolejne wywołania bez DDL
     return db_path
 
+def get_connection(db_path: Optional[str] = None) -> sqlite3.Connection:
+    """
+    Trwałe połączenie bieżącego wątku do db_path (tworzone przy pierwszym użyciu).
+    WAL: czytelnicy (GUI, raporty) nie blokują zapisu silnika; NORMAL: fsync tylko przy checkpointach.
+    """
+    db_path = os.path.abspath(db_path or DB_PATH)
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(db_path)
+    if conn is None:
+        init_db(db_path)
+        conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000,
+                               cached_statements=CACHED_STATEMENTS, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conns[db_path] = conn
+        with _all_lock:
+            _all_connections.append(conn)
+    return conn
+
+@atexit.register
+def close_connections() -> None:
+    """Zamyka wszystkie połączenia (ostatnie zamknięcie robi checkpoint WAL)."""
+    with _all_lock:
+        conns, _all_connections[:] = list(_all_connections), []
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    _local.__dict__.pop("conns", None)
+
+INSERT_LOG_SQL = """
+    INSERT INTO logs (timestamp, script, n_rows, models_used, ensemble_used, accuracy, f1_score, notes)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_FLOW_SQL = """
+    INSERT INTO flow_logs(timestamp, src_ip, dst_ip, src_port, dst_port, protocol, prediction, decision, features)
+    VALUES(?,?,?,?,?,?,?,?,?)
+"""
+
+def encode_features(features):
+    """Wektor cech → BLOB float32 (None bez zmian)."""
+    if features is None:
+        return None
+    import numpy as np
+    return np.asarray(features, dtype=np.float32).tobytes()
+
+def decode_features(blob):
+    import numpy as np
+    return np.frombuffer(blob, dtype=np.float32)
+
 def log_run(script: str,
             n_rows: Optional[int],
             models_used: str,
@@ -40,42 +108,29 @@ def log_run(script: str,
             f1_score: Optional[float] = None,
             notes: Optional[str] = None,
             db_path: Optional[str] = None) -> None:
-    db_path = db_path or DB_PATH
-    create_db(db_path)
-    conn = sqlite3.connect(db_path)
-    try:
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO logs (timestamp, script, n_rows, models_used, ensemble_used, accuracy, f1_score, notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (datetime.now().isoformat(), script, n_rows, models_used, int(bool(ensemble_used)), accuracy, f1_score, notes))
-        conn.commit()
-    finally:
-        conn.close()
-
-def fetch_logs(limit: int = 100, db_path: Optional[str] = None) -> List[Dict]:
-    db_path = db_path or DB_PATH
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    try:
-        c = conn.cursor()
+    conn = get_connection(db_path)
+    with conn:
+        conn.execute(INSERT_LOG_SQL, (datetime.now().isoformat(), script, n_rows, models_used,
+                                      int(bool(ensemble_used)), accuracy, f1_score, notes))
+
+def fetch_logs(limit: int = 100, db_path: Optional[str] = None, before_id: Optional[int] = None) -> List[Dict]:
+    """
+    Najnowsze wpisy (malejąco po id). Kolejna strona: before_id = id ostatniego wpisu
+    poprzedniej strony (stronicowanie po kluczu — bez OFFSET, koszt nie rośnie z numerem strony).
+    """
+    conn = get_connection(db_path)
+    c = conn.cursor()
+    c.row_factory = sqlite3.Row
+    if before_id is None:
         c.execute("SELECT * FROM logs ORDER BY id DESC LIMIT ?", (limit,))
-        rows = c.fetchall()
-        return [dict(r) for r in rows]
-    finally:
-        conn.close()
+    else:
+        c.execute("SELECT * FROM logs WHERE id < ? ORDER BY id DESC LIMIT ?", (before_id, limit))
+    return [dict(r) for r in c.fetchall()]
 
 # helper do zapisu flow (opcjonalne - przydatne przy testach)
-def log_flow(src_ip: str, dst_ip: str, src_port: int, dst_port: int, proto:int, prediction: str, decision: str, db_path: Optional[str] = None):
-    db_path = db_path or DB_PATH
-    init_db()
-    conn = sqlite3.connect(db_path)
-    try:
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO flow_logs(timestamp, src_ip, dst_ip, src_port, dst_port, protocol, prediction, decision)
-            VALUES(?,?,?,?,?,?,?,?)
-        """, (datetime.now().isoformat(), src_ip, dst_ip, src_port, dst_port, proto, prediction, decision))
-        conn.commit()
-    finally:
-        conn.close()
+def log_flow(src_ip: str, dst_ip: str, src_port: int, dst_port: int, proto:int, prediction: str, decision: str, db_path: Optional[str] = None,
+             features=None):
+    conn = get_connection(db_path)
+    with conn:
+        conn.execute(INSERT_FLOW_SQL, (datetime.now().isoformat(), src_ip, dst_ip, src_port, dst_port,
+                                       proto, prediction, decision, encode_features(features)))
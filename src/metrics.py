@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+metrics.py
+
+Lekkie metryki silnika w formacie tekstowym Prometheusa (bez zależności zewnętrznych).
+- Counter / Histogram: każdy wątek aktualizuje własną komórkę (słownik po id wątku),
+  więc gorąca ścieżka nie bierze locka; suma liczona dopiero przy odczycie (scrape)
+- Gauge: wartość ustawiana albo funkcja wywoływana przy odczycie (np. len(flows))
+- start_metrics_server(): endpoint /metrics z wątku w tle (ThreadingHTTPServer)
+"""
+
+import threading
+from bisect import bisect_left
+
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                   0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)  # sekundy
+
+_registry = []
+_registry_lock = threading.Lock()
+
+def _fmt_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+def _fmt_value(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=(), register=True):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if register:
+            with _registry_lock:
+                _registry.append(self)
+
+    def labels(self, *values, **kw):
+        """Metryka potomna dla wartości etykiet (tworzona raz, potem tylko odczyt słownika)."""
+        key = tuple(str(kw[n]) for n in self.labelnames) if kw else tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._new_child()
+        return child
+
+    def _series(self):
+        if self.labelnames:
+            return sorted(self._children.items())
+        return [((), self)]
+
+    def items(self):
+        """[(wartości_etykiet, wartość)] — odczyt liczników poza endpointem /metrics."""
+        return [(values, child.value) for values, child in self._series()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._series():
+            lines.extend(child._render_samples(self.name, self.labelnames, values))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=(), register=True):
+        super().__init__(name, help_text, labelnames, register)
+        self._cells = {}
+
+    def _new_child(self):
+        return Counter(self.name, self.help, register=False)
+
+    def inc(self, n=1):
+        tid = threading.get_ident()
+        cells = self._cells
+        cells[tid] = cells.get(tid, 0) + n
+
+    @property
+    def value(self):
+        return sum(list(self._cells.values()))
+
+    def _render_samples(self, name, labelnames, values):
+        return [f"{name}{_fmt_labels(labelnames, values)} {_fmt_value(self.value)}"]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, fn=None, labelnames=(), register=True):
+        super().__init__(name, help_text, labelnames, register)
+        self.fn = fn
+        self._value = 0
+
+    def _new_child(self):
+        return Gauge(self.name, self.help, register=False)
+
+    def set(self, v):
+        self._value = v
+
+    def set_function(self, fn):
+        self.fn = fn
+
+    @property
+    def value(self):
+        if self.fn is not None:
+            try:
+                return self.fn()
+            except Exception:
+                return float("nan")
+        return self._value
+
+    def _render_samples(self, name, labelnames, values):
+        return [f"{name}{_fmt_labels(labelnames, values)} {_fmt_value(self.value)}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, labelnames=(), register=True):
+        super().__init__(name, help_text, labelnames, register)
+        self.buckets = tuple(sorted(buckets))
+        self._cells = {}
+
+    def _new_child(self):
+        return Histogram(self.name, self.help, self.buckets, register=False)
+
+    def observe(self, v):
+        tid = threading.get_ident()
+        cell = self._cells.get(tid)
+        if cell is None:
+            # [licznik na kubełek..., +Inf, suma]
+            cell = self._cells[tid] = [0] * (len(self.buckets) + 1) + [0.0]
+        cell[bisect_left(self.buckets, v)] += 1
+        cell[-1] += v
+
+    def observe_ns(self, ns):
+        self.observe(ns * 1e-9)
+
+    def snapshot(self):
+        """(liczniki per kubełek (nie skumulowane, ostatni = +Inf), suma)."""
+        counts = [0] * (len(self.buckets) + 1)
+        total = 0.0
+        for cell in list(self._cells.values()):
+            for i in range(len(counts)):
+                counts[i] += cell[i]
+            total += cell[-1]
+        return counts, total
+
+    def _render_samples(self, name, labelnames, values):
+        counts, total = self.snapshot()
+        lines = []
+        cumulative = 0
+        for bound, c in zip(self.buckets + (float("inf"),), counts):
+            cumulative += c
+            le = ("le", _fmt_value(bound) if bound == float("inf") else repr(bound))
+            lines.append(f"{name}_bucket{_fmt_labels(labelnames, values, le)} {cumulative}")
+        lines.append(f"{name}_sum{_fmt_labels(labelnames, values)} {_fmt_value(total)}")
+        lines.append(f"{name}_count{_fmt_labels(labelnames, values)} {cumulative}")
+        return lines
+
+
+def render():
+    """Wszystkie zarejestrowane metryki w formacie tekstowym Prometheusa."""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for m in metrics:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+# -------------------------------------------------------------
+# ENDPOINT HTTP
+# -------------------------------------------------------------
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Uruchamia endpoint /metrics w wątku w tle. Zwraca serwer (shutdown() zatrzymuje)."""
+    # http.server importowany dopiero tutaj — import metrics (i silnika) bez kosztu serwera HTTP
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Metryki: http://{host}:{server.server_address[1]}/metrics")
+    return server
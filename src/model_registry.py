@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+model_registry.py
+
+Rejestr modeli w MODEL_DIR:
+- ładowanie przez mmap (joblib mmap_mode / artefakty *_compiled.npz) — tablice modeli
+  są współdzielone przez procesy zamiast kopiowane do każdego workera
+- plik metadanych <model>.meta.json obok modelu: listowanie bez odpiklowania
+- publish(): atomowa podmiana pliku modelu (tmp + os.replace) z numerem wersji
+- LiveModels: słownik modeli dla działającego silnika, podmieniany atomowo
+  po wykryciu nowej wersji (hot reload bez restartu przechwytywania)
+"""
+
+import os
+import json
+import hashlib
+import threading
+import argparse
+from collections.abc import Mapping
+from datetime import datetime
+
+from config_and_db import MODEL_DIR
+from fast_inference import load_compiled
+
+META_SUFFIX = ".meta.json"
+PIPELINE_SUFFIX = "_pipeline.pkl"
+COMPILED_SUFFIX = "_compiled.npz"
+DEFAULT_MODELS = {"rf": "RandomForest", "lr": "LogisticRegression", "mlp": "MLP"}
+POLL_INTERVAL = 2.0  # sekundy między sprawdzeniami nowych wersji
+EARLY_CHECKPOINTS = (4, 16, 64)  # liczba pakietów, po której flow oceniany jest wcześnie
+EARLY_DROP_THRESHOLD = 0.95      # P(atak) z modelu wczesnego wymagane do natychmiastowej blokady
+FEATURE_SCHEMA_PATH = os.path.join(MODEL_DIR, "feature_schema.json")  # wynik feature_pruning.py
+
+# -------------------------------------------------------------
+# METADANE
+# -------------------------------------------------------------
+def _sha256(path, block=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def describe_model(model):
+    """Opis modelu do metadanych (klasa, liczba cech, klasy)."""
+    steps = getattr(model, "steps", None)
+    cls = "+".join(s.__class__.__name__ for _, s in steps) if steps else model.__class__.__name__
+    classes = getattr(model, "classes_", None)
+    n_features = getattr(model, "n_features_in_", None)
+    return {
+        "class": cls,
+        "n_features": int(n_features) if n_features is not None else None,
+        "classes": [c.item() if hasattr(c, "item") else c for c in classes] if classes is not None else None,
+    }
+
+def meta_path(path):
+    return path + META_SUFFIX
+
+def read_metadata(path):
+    try:
+        with open(meta_path(path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_metadata(path, model, version=None, extra=None):
+    """Zapisuje metadane obok pliku modelu (atomowo)."""
+    previous = read_metadata(path) or {}
+    meta = {
+        "name": model_name(path),
+        "file": os.path.basename(path),
+        "format": "compiled" if path.endswith(COMPILED_SUFFIX) else "joblib",
+        "version": version if version is not None else previous.get("version", 0) + 1,
+        "size_bytes": os.path.getsize(path),
+        "sha256": _sha256(path),
+        "created_at": datetime.now().isoformat(),
+    }
+    meta.update(describe_model(model))
+    if extra:
+        meta.update(extra)
+    tmp = meta_path(path) + f".tmp-{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, meta_path(path))
+    return meta
+
+def early_model_name(checkpoint):
+    """Nazwa modelu trenowanego na cechach flowów uciętych po `checkpoint` pakietach."""
+    return f"Early{int(checkpoint)}"
+
+def reduced_model_name(name):
+    """Nazwa modelu trenowanego na przyciętym schemacie cech (feature_schema.json)."""
+    return f"{name}Reduced"
+
+def model_name(path):
+    base = os.path.basename(path)
+    for suffix in (PIPELINE_SUFFIX, COMPILED_SUFFIX, ".pkl"):
+        if base.endswith(suffix):
+            return base[:-len(suffix)]
+    return base
+
+# -------------------------------------------------------------
+# REJESTR
+# -------------------------------------------------------------
+class ModelRegistry:
+    def __init__(self, model_dir=MODEL_DIR, mmap_mode="r", prefer_compiled=True):
+        self.model_dir = model_dir
+        self.mmap_mode = mmap_mode
+        self.prefer_compiled = prefer_compiled
+
+    def resolve(self, name):
+        """
+        Ścieżka pliku dla nazwy logicznej ('RandomForest') lub nazwy pliku.
+        Artefakt *_compiled.npz wygrywa tylko, jeśli nie jest starszy od pipeline'u
+        (pipeline zapisany bez publish(), np. przez train_model.py, unieważnia eksport).
+        """
+        pipelines = [os.path.join(self.model_dir, name + PIPELINE_SUFFIX),
+                     os.path.join(self.model_dir, name + ".pkl")]
+        candidates = [os.path.join(self.model_dir, name)]
+        if self.prefer_compiled:
+            compiled = os.path.join(self.model_dir, name + COMPILED_SUFFIX)
+            if os.path.isfile(compiled) and not self._stale(compiled, pipelines):
+                candidates.insert(0, compiled)
+        for path in candidates + pipelines:
+            if os.path.isfile(path):
+                return path
+        raise FileNotFoundError(f"Model nie znaleziony w rejestrze: {name}")
+
+    @staticmethod
+    def _stale(compiled, pipelines):
+        try:
+            built = os.stat(compiled).st_mtime_ns
+            return any(os.path.isfile(p) and os.stat(p).st_mtime_ns > built for p in pipelines)
+        except OSError:
+            return True
+
+    def list_models(self):
+        """Lista modeli z metadanych — bez odpiklowania plików."""
+        entries = []
+        for f in sorted(os.listdir(self.model_dir)):
+            if not (f.endswith(".pkl") or f.endswith(COMPILED_SUFFIX)):
+                continue
+            path = os.path.join(self.model_dir, f)
+            meta = read_metadata(path)
+            if meta is None:
+                st = os.stat(path)
+                meta = {"name": model_name(path), "file": f, "version": None,
+                        "size_bytes": st.st_size,
+                        "created_at": datetime.fromtimestamp(st.st_mtime).isoformat()}
+            entries.append(meta)
+        return entries
+
+    def load(self, name_or_path):
+        path = name_or_path if os.path.isfile(name_or_path) else self.resolve(name_or_path)
+        if path.endswith(COMPILED_SUFFIX):
+            return load_compiled(path, mmap_mode=self.mmap_mode)
+        import joblib
+        return joblib.load(path, mmap_mode=self.mmap_mode)
+
+    def publish(self, model, name, extra=None):
+        """
+        Zapisuje model jako <name>_pipeline.pkl: zapis do pliku tymczasowego i os.replace,
+        więc czytelnicy widzą starą albo nową wersję, nigdy częściowy plik.
+        Artefakt <name>_compiled.npz poprzedniej wersji jest usuwany — inaczej resolve()
+        serwowałby go dalej; nowy eksport robi export_models.py.
+        """
+        path = os.path.join(self.model_dir, name + PIPELINE_SUFFIX)
+        tmp = path + f".tmp-{os.getpid()}"
+        import joblib
+        joblib.dump(model, tmp)   # bez kompresji — wymagane dla mmap_mode
+        version = (read_metadata(path) or {}).get("version", 0) + 1
+        os.replace(tmp, path)
+        write_metadata(path, model, version=version, extra=extra)
+        self.invalidate_compiled(name)
+        return path
+
+    def invalidate_compiled(self, name):
+        """Usuwa nieaktualny *_compiled.npz (silnik z mmapem trzyma inode do czasu przeładowania)."""
+        compiled = os.path.join(self.model_dir, name + COMPILED_SUFFIX)
+        removed = False
+        for path in (compiled, meta_path(compiled)):
+            try:
+                os.remove(path)
+                removed = True
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def index(self):
+        """Tworzy brakujące metadane (jednorazowo odpikla modele bez pliku .meta.json)."""
+        created = []
+        for entry in self.list_models():
+            path = os.path.join(self.model_dir, entry["file"])
+            if read_metadata(path) is None:
+                try:
+                    write_metadata(path, self.load(path))
+                    created.append(entry["file"])
+                except Exception as e:
+                    print(f"⚠️ Nie udało się opisać {entry['file']}: {e}")
+        return created
+
+    def live(self, names=None):
+        return LiveModels(self, names or DEFAULT_MODELS)
+
+    @staticmethod
+    def stamp(path):
+        st = os.stat(path)
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+# -------------------------------------------------------------
+# MODELE "NA ŻYWO" DLA SILNIKA
+# -------------------------------------------------------------
+class LiveModels(Mapping):
+    """
+    Słownik {skrót: model} dla process_packet. Nowa wersja jest ładowana w tle,
+    a następnie cały słownik podmieniany jednym przypisaniem referencji.
+    """
+    def __init__(self, registry, names):
+        self.registry = registry
+        self.names = dict(names)
+        self._models = {}
+        self._stamps = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.refresh()
+
+    def refresh(self):
+        """Ładuje modele, których plik się zmienił. Zwraca listę podmienionych skrótów."""
+        updated = dict(self._models)
+        swapped = []
+        for key, name in self.names.items():
+            try:
+                path = self.registry.resolve(name)
+                stamp = (path,) + self.registry.stamp(path)
+            except (FileNotFoundError, OSError):
+                continue
+            if self._stamps.get(key) == stamp:
+                continue
+            try:
+                updated[key] = self.registry.load(path)
+            except Exception as e:
+                # stara wersja zostaje w użyciu
+                print(f"Nie udało się załadować modelu {key} ({path}): {e}")
+                continue
+            self._stamps[key] = stamp
+            swapped.append(key)
+            print(f"Załadowano model: {key} ({path})")
+        if swapped:
+            self._models = updated
+        return swapped
+
+    def watch(self, interval=POLL_INTERVAL):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def _loop():
+            while not self._stop.wait(interval):
+                self.refresh()
+
+        self._thread = threading.Thread(target=_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    # Mapping — każdy dostęp widzi spójną migawkę słownika
+    def __getitem__(self, key):
+        return self._models[key]
+
+    def __iter__(self):
+        return iter(self._models)
+
+    def __len__(self):
+        return len(self._models)
+
+    def items(self):
+        return self._models.items()
+
+    def keys(self):
+        return self._models.keys()
+
+    def values(self):
+        return self._models.values()
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Rejestr modeli w MODEL_DIR.")
+    p.add_argument("--index", action="store_true", help="Utwórz brakujące pliki metadanych.")
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    registry = ModelRegistry()
+    if args.index:
+        for f in registry.index():
+            print(f"✅ Metadane utworzone: {f}")
+    for meta in registry.list_models():
+        print(f"{meta['name']:<30} v{meta.get('version')}  {meta.get('class', '?'):<45} "
+              f"{meta['size_bytes']:>10} B  {meta.get('created_at', '')}")
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,69 @@
 #!/usr/bin/env python3
 """
 normalize_dataset.py - Normalizacja danych CICIDS2017 po chunkach.
-Obsługuje duże pliki CSV i zapisuje znormalizowane dane do joblib.
+Obsługuje duże pliki CSV i zapisuje znormalizowane dane jako shardy float32 .npy
++ manifest.json (shard_loader.py — odczyt przez mmap, bez odpiklowania).
+Wejście po dedup_dataset.py (--input-dir data/dedup) ma kolumnę Weight: scaler jest
+fitowany z wagami (statystyki jak dla pełnych danych), a shardy dostają plik wag _w.npy.
 """
 
 import os
+import argparse
 import pandas as pd
 import joblib
 from sklearn.preprocessing import StandardScaler
 from tqdm import tqdm
 from config_and_db import DATA_DIR, CLEAN_DATA_DIR
+from shard_loader import write_shard, write_manifest, remove_shards
 
 CHUNK_SIZE = 50000  # liczba wierszy na chunk
 NORMALIZED_DIR = os.path.join(DATA_DIR, "normalized")
+WEIGHT_COL = "Weight"
 os.makedirs(NORMALIZED_DIR, exist_ok=True)
 
-def normalize_csv_files():
+def split_chunk(chunk):
+    """(X, wagi albo None) — bez Label i Weight."""
+    w = chunk[WEIGHT_COL].values if WEIGHT_COL in chunk.columns else None
+    X = chunk.drop(columns=["Label", WEIGHT_COL], errors="ignore")
+    X = X.replace([float('inf'), -float('inf')], float('nan')).fillna(0)
+    return X, w
+
+def normalize_csv_files(input_dir=CLEAN_DATA_DIR):
     scaler = StandardScaler()
-    all_files = [os.path.join(CLEAN_DATA_DIR, f) for f in os.listdir(CLEAN_DATA_DIR) if f.endswith(".csv")]
+    all_files = [os.path.join(input_dir, f) for f in os.listdir(input_dir) if f.endswith(".csv")]
 
     # --- FIT scaler ---
     print("Fitowanie Scalera po wszystkich chunkach...")
     for file_path in all_files:
         print(f"Przetwarzanie: {os.path.basename(file_path)}")
         for chunk in tqdm(pd.read_csv(file_path, chunksize=CHUNK_SIZE), desc="Chunks FIT", unit="chunk"):
-            X = chunk.drop(columns=["Label"]).replace([float('inf'), -float('inf')], float('nan')).fillna(0)
-            scaler.partial_fit(X)
+            X, w = split_chunk(chunk)
+            scaler.partial_fit(X, sample_weight=w)
 
     # Zapisz fitowany scaler do jednego pliku
     scaler_path = os.path.join(NORMALIZED_DIR, "scaler.pkl")
     joblib.dump(scaler, scaler_path)
     print(f"Zapisano fitowany scaler: {scaler_path}")
 
-    # --- TRANSFORM i zapis do joblib ---
-    print("Transformacja danych i zapis znormalizowanych chunków...")
+    # --- TRANSFORM i zapis shardów float32 ---
+    print("Transformacja danych i zapis znormalizowanych shardów...")
+    remove_shards(NORMALIZED_DIR)
+    entries, columns = [], None
     for file_path in all_files:
         basename = os.path.splitext(os.path.basename(file_path))[0]
         for i, chunk in enumerate(tqdm(pd.read_csv(file_path, chunksize=CHUNK_SIZE), desc=f"{basename}", unit="chunk")):
-            X = chunk.drop(columns=["Label"]).replace([float('inf'), -float('inf')], float('nan')).fillna(0)
+            X, w = split_chunk(chunk)
+            columns = columns or list(X.columns)
             X_scaled = scaler.transform(X)
             y = chunk["Label"].apply(lambda x: 0 if x == "BENIGN" else 1).values
-            chunk_path = os.path.join(NORMALIZED_DIR, f"{basename}_chunk{i}.pkl")
-            joblib.dump((X_scaled, y), chunk_path)
-        print(f"Zapisano {i+1} chunków dla {basename}")
+            entries.append(write_shard(NORMALIZED_DIR, f"{basename}_shard{i:04d}", X_scaled, y, w,
+                                       source=os.path.basename(file_path)))
+        print(f"Zapisano {i+1} shardów dla {basename}")
+    manifest = write_manifest(NORMALIZED_DIR, entries, columns=columns, scaler_path=scaler_path)
+    print(f"Zapisano manifest: {manifest}")
 
 if __name__ == "__main__":
-    normalize_csv_files()
+    p = argparse.ArgumentParser(description="Normalizacja CSV do shardów float32 (.npy + manifest).")
+    p.add_argument("--input-dir", default=CLEAN_DATA_DIR,
+                   help="Katalog CSV (np. data/dedup po dedup_dataset.py).")
+    normalize_csv_files(p.parse_args().input_dir)
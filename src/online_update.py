@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+online_update.py
+
+Przyrostowe douczanie modeli na oznaczonych flowach z flow_logs (bez pełnego retreningu).
+- etykiety: analityk (--label ID... --as 0/1) albo potwierdzone werdykty (--confirm-unanimous:
+  wszystkie modele zgodne z decyzją silnika)
+- każda runda bierze tylko nowo oznaczone flowy (stan: ostatni przetworzony label_seq —
+  kolejność nadania etykiet, więc późna etykieta starego flowa też jest użyta);
+  najnowsze HOLDOUT_FRACTION z nich to okno kontrolne, reszta idzie do partial_fit
+- douczane są modele z partial_fit (MLP, SGD); w pipeline scaler zostaje zamrożony,
+  douczany jest tylko klasyfikator — poza własnym modelem OnlineSGD, którego scaler też się adaptuje
+- OnlineSGD nie należy do DEFAULT_MODELS: silnik głosuje nim tylko z opcją
+  engine_service.py --online-model (bez niej model jest tylko w rejestrze)
+- kandydat trafia do rejestru (registry.publish → hot reload w silniku) tylko, gdy na oknie
+  kontrolnym ma F1 nie gorsze niż aktualny model (+ PROMOTE_MARGIN)
+- wyniki rund zapisywane do tabeli logs
+"""
+
+import os
+import ast
+import copy
+import json
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+
+from config_and_db import DB_PATH, MODEL_DIR
+from log_db import get_connection, decode_features, log_run
+from model_registry import ModelRegistry
+from predict_models import metrics_from_confusion
+
+ONLINE_MODEL_NAME = "OnlineSGD"
+UPDATE_MODELS = {"mlp": "MLP", "sgd": ONLINE_MODEL_NAME}
+CLASSES = np.array([0, 1])
+HOLDOUT_FRACTION = 0.2
+MIN_NEW_ROWS = 200          # mniej nowych oznaczonych flowów → runda pominięta
+PROMOTE_MARGIN = 0.0        # wymagana przewaga F1 kandydata nad aktualnym modelem
+UPDATE_INTERVAL = 300       # sekundy między rundami w trybie ciągłym
+STATE_PATH = os.path.join(MODEL_DIR, "online_update_state.json")
+
+
+# -------------------------------------------------------------
+# ETYKIETY
+# -------------------------------------------------------------
+# każde nadanie (także zmiana) etykiety dostaje kolejny label_seq w transakcji zapisu
+LABEL_SQL = ("UPDATE flow_logs SET label = ?, label_source = ?, label_seq = "
+             "(SELECT COALESCE(MAX(label_seq), 0) + 1 FROM flow_logs WHERE label_seq IS NOT NULL) "
+             "WHERE id = ?")
+
+def label_flows(ids, label, source="analyst", db_path=None):
+    conn = get_connection(db_path or DB_PATH)
+    with conn:
+        cur = conn.executemany(LABEL_SQL, [(int(label), source, int(i)) for i in ids])
+    return cur.rowcount
+
+def confirm_unanimous(after_id=0, min_models=2, db_path=None):
+    """
+    Oznacza flowy (id > after_id), w których wszystkie modele (≥ min_models) zgodziły się
+    z decyzją silnika. Zwraca (liczba oznaczonych, największe sprawdzone id).
+    """
+    conn = get_connection(db_path or DB_PATH)
+    rows = conn.execute(
+        "SELECT id, prediction, decision FROM flow_logs "
+        "WHERE id > ? AND label IS NULL AND features IS NOT NULL", (after_id,)).fetchall()
+    updates = []
+    last_id = max((r[0] for r in rows), default=after_id)
+    for flow_id, prediction, decision in rows:
+        try:
+            preds = ast.literal_eval(prediction) if prediction else {}
+        except (ValueError, SyntaxError):
+            continue
+        votes = [v for v in preds.values() if v in (0, 1)]
+        expected = 1 if decision == "DROP" else 0
+        if len(votes) >= min_models and all(v == expected for v in votes):
+            updates.append((expected, "confirmed-unanimous", flow_id))
+    with conn:
+        conn.executemany(LABEL_SQL, updates)
+    return len(updates), last_id
+
+def fetch_labeled(after_seq=0, db_path=None):
+    """(ids, seqs, X float32, y) flowów oznaczonych po label_seq = after_seq, w kolejności oznaczania."""
+    conn = get_connection(db_path or DB_PATH)
+    rows = conn.execute(
+        "SELECT id, label_seq, features, label FROM flow_logs "
+        "WHERE label_seq > ? AND label IS NOT NULL AND features IS NOT NULL ORDER BY label_seq",
+        (after_seq,)).fetchall()
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.int8)
+    ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    seqs = np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows))
+    X = np.vstack([decode_features(r[2]) for r in rows])
+    y = np.fromiter((r[3] for r in rows), dtype=np.int8, count=len(rows))
+    return ids, seqs, X, y
+
+
+# -------------------------------------------------------------
+# MODELE
+# -------------------------------------------------------------
+def build_online_model():
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.linear_model import SGDClassifier
+    return Pipeline([
+        ("scaler", StandardScaler()),
+        ("clf", SGDClassifier(loss="log_loss", alpha=1e-4, random_state=42)),
+    ])
+
+def _final_step(model):
+    return model.steps[-1][1] if hasattr(model, "steps") else model
+
+def supports_partial_fit(model):
+    return hasattr(_final_step(model), "partial_fit")
+
+def partial_fit(model, X, y, update_preprocessing=False):
+    """Douczenie modelu (albo klasyfikatora na końcu pipeline) jedną porcją danych."""
+    if not hasattr(model, "steps"):
+        model.partial_fit(X, y, classes=CLASSES)
+        return model
+    Xt = X
+    for _, step in model.steps[:-1]:
+        if update_preprocessing or not hasattr(step, "n_features_in_"):
+            if hasattr(step, "partial_fit"):
+                step.partial_fit(Xt)
+            else:
+                step.fit(Xt)
+        Xt = step.transform(Xt)
+    _final_step(model).partial_fit(Xt, y, classes=CLASSES)
+    return model
+
+def evaluate(model, X, y):
+    pred = np.asarray(model.predict(X)).astype(int)
+    acc, f1, _ = metrics_from_confusion(Counter(zip(y.tolist(), pred.tolist())))
+    return {"accuracy": acc, "f1": f1, "n": int(len(y))}
+
+
+# -------------------------------------------------------------
+# RUNDA DOUCZANIA
+# -------------------------------------------------------------
+def load_state(path=STATE_PATH):
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    # stan sprzed schematu v3: migracja nadała istniejącym etykietom label_seq = id
+    state.setdefault("last_label_seq", state.get("last_id", 0))
+    state.setdefault("confirmed_id", state.get("last_id", 0))
+    state.pop("last_id", None)
+    return state
+
+def save_state(state, path=STATE_PATH):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+def run_once(registry=None, models=None, db_path=None, state_path=STATE_PATH, confirm=False,
+             holdout_fraction=HOLDOUT_FRACTION, min_rows=MIN_NEW_ROWS, margin=PROMOTE_MARGIN):
+    """Jedna runda: nowe oznaczone flowy → partial_fit kandydatów → ocena na oknie → ewentualna promocja."""
+    # bez mmap: partial_fit modyfikuje wagi; bez *_compiled.npz: skompilowany model nie ma partial_fit
+    # (publish() usuwa nieaktualny artefakt, silnik wraca do nowego pipeline'u do czasu ponownego eksportu)
+    registry = registry or ModelRegistry(mmap_mode=None, prefer_compiled=False)
+    models = models or UPDATE_MODELS
+    state = load_state(state_path)
+
+    if confirm:
+        n, state["confirmed_id"] = confirm_unanimous(state["confirmed_id"], db_path=db_path)
+        save_state(state, state_path)
+        print(f"Potwierdzone werdykty: {n}")
+
+    ids, seqs, X, y = fetch_labeled(state["last_label_seq"], db_path)
+    if len(ids) < min_rows:
+        print(f"⚠️ Za mało nowych oznaczonych flowów ({len(ids)} < {min_rows}) — pomijam rundę")
+        return []
+
+    cut = int(len(ids) * (1 - holdout_fraction))
+    X_train, y_train = X[:cut], y[:cut]
+    X_hold, y_hold = X[cut:], y[cut:]
+    print(f"Runda: {cut} flowów do douczenia, {len(y_hold)} w oknie kontrolnym "
+          f"(label_seq {seqs[0]}–{seqs[-1]}, ataki {int(y.sum())})")
+
+    results = []
+    for short, name in models.items():
+        try:
+            live = registry.load(name)
+        except FileNotFoundError:
+            live = None
+
+        if live is None:
+            if name != ONLINE_MODEL_NAME:
+                print(f"⚠️ {name}: brak modelu w rejestrze — pomijam")
+                continue
+            candidate = build_online_model()
+        elif not supports_partial_fit(live):
+            print(f"⚠️ {name}: model nie obsługuje partial_fit — pomijam")
+            continue
+        else:
+            candidate = copy.deepcopy(live)
+
+        try:
+            partial_fit(candidate, X_train, y_train, update_preprocessing=(name == ONLINE_MODEL_NAME))
+        except Exception as e:
+            print(f"❌ {name}: błąd partial_fit: {e}")
+            continue
+
+        cand = evaluate(candidate, X_hold, y_hold)
+        base = evaluate(live, X_hold, y_hold) if live is not None else None
+        promote = base is None or cand["f1"] >= base["f1"] + margin
+        result = {"model": name, "candidate": cand, "live": base, "promoted": promote,
+                  "trained_rows": int(cut), "last_label_seq": int(seqs[-1])}
+        results.append(result)
+
+        base_txt = f"{base['f1']:.4f}" if base else "-"
+        if promote:
+            registry.publish(candidate, name, extra={"online_update": {
+                "at": datetime.now().isoformat(timespec="seconds"),
+                "trained_rows": int(cut), "holdout": cand, "previous_holdout": base,
+                "label_seq": [int(seqs[0]), int(seqs[cut - 1])],
+            }})
+            print(f"✅ {name}: F1 {base_txt} → {cand['f1']:.4f} — opublikowano nową wersję")
+            if name == ONLINE_MODEL_NAME:
+                print(f"   {name} głosuje w silniku tylko z engine_service.py --online-model")
+        else:
+            print(f"❌ {name}: F1 kandydata {cand['f1']:.4f} < {base_txt} — bez promocji")
+
+        log_run(script="online_update",
+                n_rows=int(len(ids)),
+                models_used=name,
+                ensemble_used=False,
+                accuracy=cand["accuracy"],
+                f1_score=cand["f1"],
+                notes=json.dumps({"promoted": promote, "live_f1": base["f1"] if base else None,
+                                  "trained_rows": int(cut), "holdout_rows": int(len(y_hold))}),
+                db_path=db_path)
+
+    # okno kontrolne zostaje na następną rundę (wtedy trafi do douczania)
+    state["last_label_seq"] = int(seqs[cut - 1]) if cut else state["last_label_seq"]
+    state["updated_at"] = datetime.now().isoformat(timespec="seconds")
+    save_state(state, state_path)
+    return results
+
+def run_forever(interval=UPDATE_INTERVAL, stop=None, **kwargs):
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        try:
+            run_once(**kwargs)
+        except Exception as e:
+            print(f"❌ Błąd rundy douczania: {e}")
+        stop.wait(interval)
+
+def start_background(interval=UPDATE_INTERVAL, **kwargs):
+    """Douczanie w wątku w tle (np. w procesie silnika). Zwraca Event zatrzymujący pętlę."""
+    stop = threading.Event()
+    threading.Thread(target=run_forever, args=(interval, stop), kwargs=kwargs,
+                     name="online-update", daemon=True).start()
+    return stop
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Przyrostowe douczanie modeli na oznaczonych flowach.")
+    p.add_argument("--once", action="store_true", help="Jedna runda i koniec.")
+    p.add_argument("--interval", type=float, default=UPDATE_INTERVAL)
+    p.add_argument("--confirm-unanimous", action="store_true",
+                   help="Oznacz flowy, w których wszystkie modele zgodziły się z decyzją.")
+    p.add_argument("--label", type=int, nargs="+", metavar="ID", help="Oznacz flowy o podanych id.")
+    p.add_argument("--as", dest="label_value", type=int, choices=[0, 1], help="Etykieta dla --label.")
+    p.add_argument("--models", nargs="+", default=list(UPDATE_MODELS.values()),
+                   help=f"Modele w rejestrze do douczania ({ONLINE_MODEL_NAME} serwowany tylko "
+                        f"z engine_service.py --online-model).")
+    p.add_argument("--min-rows", type=int, default=MIN_NEW_ROWS)
+    p.add_argument("--holdout", type=float, default=HOLDOUT_FRACTION)
+    p.add_argument("--margin", type=float, default=PROMOTE_MARGIN)
+    p.add_argument("--db", default=DB_PATH)
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.label:
+        if args.label_value is None:
+            raise SystemExit("--label wymaga --as 0/1")
+        print(f"Oznaczono {label_flows(args.label, args.label_value, db_path=args.db)} flowów")
+        if not args.once:
+            raise SystemExit(0)
+
+    opts = dict(models={name: name for name in args.models}, db_path=args.db, confirm=args.confirm_unanimous,
+                holdout_fraction=args.holdout, min_rows=args.min_rows, margin=args.margin)
+    if args.once:
+        run_once(**opts)
+    else:
+        print(f"Douczanie co {args.interval:.0f}s (Ctrl+C kończy)")
+        try:
+            run_forever(args.interval, **opts)
+        except KeyboardInterrupt:
+            pass
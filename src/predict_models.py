@@ -2,28 +2,28 @@
 """
 predict_models.py
 Predykcja przy użyciu RandomForest, LogisticRegression, MLP.
+Wejście czytane strumieniowo (chunkami), jedno przejście predict_proba na model,
+wyniki dopisywane do CSV na bieżąco — pamięć nie rośnie z rozmiarem wejścia.
 Po wykonaniu zapisuje log do sqlite3 (logs/project_logs.db) przez log_db.log_run().
 """
 
 import os
 import argparse
-import joblib
 import pandas as pd
 import numpy as np
 import sys
 
 from log_db import log_run, create_db
+from model_registry import ModelRegistry, DEFAULT_MODELS
 
 MODEL_DIR = "../models/"
-MODEL_FILES = {
-    "rf": os.path.join(MODEL_DIR, "RandomForest_pipeline.pkl"),
-    "lr": os.path.join(MODEL_DIR, "LogisticRegression_pipeline.pkl"),
-    "mlp": os.path.join(MODEL_DIR, "MLP_pipeline.pkl")
-}
+MODEL_FILES = DEFAULT_MODELS
+registry = ModelRegistry(MODEL_DIR)
 
 TRAIN_FEATURES_CSV = "../data/X_train.csv"
 DEFAULT_Y_TEST = "../data/y_test.csv"
 DEFAULT_DB = os.path.join(os.path.dirname(__file__), "..", "logs", "project_logs.db")
+CHUNK_SIZE = 50_000
 
 def parse_args():
     p = argparse.ArgumentParser(description="Predict with RF / LR / MLP models and optionally ensemble.")
@@ -33,30 +33,30 @@ def parse_args():
     p.add_argument("--lr", action="store_true", help="Włącz LogisticRegression")
     p.add_argument("--mlp", action="store_true", help="Włącz MLP")
     p.add_argument("--ensemble", action="store_true", help="Majority-vote ensemble")
+    p.add_argument("--cascade", action="store_true",
+                   help="Kaskada: tani model najpierw, cięższe tylko dla niepewnych wierszy (progi z models/cascade.json)")
     p.add_argument("--features-from", default=TRAIN_FEATURES_CSV, help="CSV z listą cech (X_train.csv)")
     p.add_argument("--ytest", default=DEFAULT_Y_TEST, help="(Opcjonalnie) CSV z prawdziwymi etykietami do policzenia metryk")
+    p.add_argument("--chunksize", type=int, default=CHUNK_SIZE, help="Liczba wierszy wczytywanych naraz.")
     return p.parse_args()
 
-def ensure_features(input_df, features_csv):
-    feat_df = pd.read_csv(features_csv, nrows=0)
-    required_cols = list(feat_df.columns)
-    if "Label" in input_df.columns:
-        input_df = input_df.drop(columns=["Label"])
-    for c in required_cols:
-        if c not in input_df.columns:
-            input_df[c] = 0
-    extra = [c for c in input_df.columns if c not in required_cols]
-    if extra:
-        input_df = input_df.drop(columns=extra)
-    input_df = input_df[required_cols]
-    return input_df
-
-def safe_load_model(path):
-    if not os.path.exists(path):
-        print(f"⚠️ Model nie znaleziony: {path}")
+def read_required_columns(features_csv):
+    return list(pd.read_csv(features_csv, nrows=0).columns)
+
+def ensure_features(input_df, features_csv=None, required_cols=None):
+    """Kolumny w kolejności modelu: brakujące = 0, nadmiarowe (i Label) usuwane."""
+    if required_cols is None:
+        required_cols = read_required_columns(features_csv)
+    return input_df.reindex(columns=required_cols, fill_value=0)
+
+def safe_load_model(name):
+    try:
+        path = registry.resolve(name)
+    except FileNotFoundError:
+        print(f"⚠️ Model nie znaleziony: {name}")
         return None
     try:
-        m = joblib.load(path)
+        m = registry.load(path)
         print(f"✅ Załadowano model: {os.path.basename(path)}")
         return m
     except Exception as e:
@@ -64,53 +64,112 @@ def safe_load_model(path):
         return None
 
 def predict_with_model(model, X, batch_size=5000):
+    """
+    Jedno przejście inferencji na batch: etykieta = classes_[argmax(predict_proba)],
+    pewność = max(predict_proba). Modele bez predict_proba → predict, conf = NaN.
+    Wiersze, dla których predykcja się nie powiodła, mają pred = NaN.
+    """
+    X = np.asarray(X, dtype=np.float64)
     n = X.shape[0]
-    preds = []
-    confs = []
+    preds = np.full(n, np.nan)
+    confs = np.full(n, np.nan)
+    has_proba = hasattr(model, "predict_proba")
     for start in range(0, n, batch_size):
         end = min(start + batch_size, n)
-        X_batch = X.iloc[start:end]
-        try:
-            p = model.predict(X_batch)
-            preds.extend(p)
-        except Exception:
-            preds.extend([None] * len(X_batch))
+        X_batch = X[start:end]
         try:
-            if hasattr(model, "predict_proba"):
-                c = model.predict_proba(X_batch).max(axis=1)
-                confs.extend(c)
+            if has_proba:
+                proba = model.predict_proba(X_batch)
+                idx = proba.argmax(axis=1)
+                preds[start:end] = model.classes_[idx]
+                confs[start:end] = proba[np.arange(end - start), idx]
             else:
-                confs.extend([np.nan] * len(X_batch))
+                preds[start:end] = model.predict(X_batch)
         except Exception:
-            confs.extend([np.nan] * len(X_batch))
-        print(f"Predykcja {model.__class__.__name__}: {start}/{n} wierszy", end="\r")
-    print("")
-    return {"pred": np.array(preds), "conf": np.array(confs)}
+            pass
+    return {"pred": preds, "conf": confs}
 
 def majority_vote(preds_list):
-    preds_stack = np.vstack(preds_list).T
-    final = []
-    for row in preds_stack:
-        vals, counts = np.unique(row, return_counts=True)
-        maxcount = counts.max()
-        candidates = vals[counts == maxcount]
-        if len(candidates) == 1:
-            final.append(candidates[0])
-        else:
-            final.append(np.min(candidates))
-    return np.array(final)
+    """Głosowanie większościowe (wektorowo); remis → najmniejsza etykieta, brak głosów → NaN."""
+    stack = np.vstack(preds_list)                    # (n_models, n_rows)
+    labels = np.unique(stack[~np.isnan(stack)])
+    if labels.size == 0:
+        return np.full(stack.shape[1], np.nan)
+    counts = (stack[None, :, :] == labels[:, None, None]).sum(axis=1)   # (n_labels, n_rows)
+    final = labels[counts.argmax(axis=0)]            # argmax → pierwsza (najmniejsza) przy remisie
+    final[counts.max(axis=0) == 0] = np.nan
+    return final
+
+# -------------------------------------------------------------
+# METRYKI PRZYROSTOWE
+# -------------------------------------------------------------
+def update_confusion(counts, y_true, y_pred):
+    """Dodaje pary (prawda, predykcja) do słownika zliczeń; pomija predykcje NaN."""
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    mask = ~np.isnan(y_pred)
+    if not mask.any():
+        return counts
+    pairs = np.column_stack([np.asarray(y_true)[mask].astype(np.int64), y_pred[mask].astype(np.int64)])
+    uniq, cnt = np.unique(pairs, axis=0, return_counts=True)
+    for (t, p), c in zip(uniq, cnt):
+        counts[(int(t), int(p))] = counts.get((int(t), int(p)), 0) + int(c)
+    return counts
+
+def metrics_from_confusion(counts):
+    """Accuracy, ważone F1 i metryki per klasa ze zliczeń macierzy pomyłek."""
+    total = sum(counts.values())
+    if total == 0:
+        return None, None, {}
+    labels = sorted({t for t, _ in counts} | {p for _, p in counts})
+    correct = sum(c for (t, p), c in counts.items() if t == p)
+    per_class = {}
+    f1_weighted = 0.0
+    for lbl in labels:
+        tp = counts.get((lbl, lbl), 0)
+        support = sum(c for (t, _), c in counts.items() if t == lbl)
+        predicted = sum(c for (_, p), c in counts.items() if p == lbl)
+        precision = tp / predicted if predicted else 0.0
+        recall = tp / support if support else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        per_class[lbl] = {"precision": precision, "recall": recall, "f1": f1, "support": support}
+        f1_weighted += f1 * support
+    return correct / total, f1_weighted / total, per_class
 
-def safe_read_ytest(ytest_path, expected_len):
+def iter_labels(ytest_path, chunksize):
     if not os.path.exists(ytest_path):
         return None
     try:
-        y = pd.read_csv(ytest_path).values.ravel()
-        if len(y) != expected_len:
-            return None
-        return y
+        return (chunk.values.ravel() for chunk in pd.read_csv(ytest_path, chunksize=chunksize))
     except Exception:
         return None
 
+def score_chunk(models_loaded, X, ensemble):
+    """Predykcje wszystkich modeli + ensemble dla jednego chunka → DataFrame wyników."""
+    results = {}
+    preds_for_ensemble = []
+    confs_for_ensemble = []
+    for short_name, model in models_loaded.items():
+        out = predict_with_model(model, X)
+        results[f"pred_{short_name}"] = out["pred"]
+        results[f"conf_{short_name}"] = out["conf"]
+        preds_for_ensemble.append(out["pred"])
+        confs_for_ensemble.append(out["conf"])
+
+    if ensemble and len(preds_for_ensemble) >= 1:
+        results["pred_ensemble"] = majority_vote(preds_for_ensemble)
+        with np.errstate(invalid='ignore'):
+            results["conf_ensemble"] = np.nanmean(np.vstack(confs_for_ensemble), axis=0)
+    else:
+        results["pred_ensemble"] = np.full(X.shape[0], np.nan)
+        results["conf_ensemble"] = np.full(X.shape[0], np.nan)
+    return pd.DataFrame(results)
+
+def score_cascade_chunk(cascade, X):
+    """Wynik kaskady dla chunka: etykieta, P(atak) z pierwszego modelu, flaga eskalacji."""
+    pred, p_attack, escalated = cascade.predict_batch(X)
+    return pd.DataFrame({"pred_ensemble": pred, "conf_ensemble": np.maximum(p_attack, 1.0 - p_attack),
+                         "p_attack_first": p_attack, "escalated": escalated.astype(np.int8)})
+
 def main():
     args = parse_args()
     create_db(DEFAULT_DB)
@@ -125,15 +184,12 @@ def main():
     print(f"  RandomForest: {use_rf}")
     print(f"  LogisticRegression: {use_lr}")
     print(f"  MLP: {use_mlp}")
-    print(f"  Ensemble majority-vote: {args.ensemble}\n")
+    print(f"  Ensemble majority-vote: {args.ensemble}")
+    print(f"  Kaskada: {args.cascade}\n")
 
     if not os.path.exists(args.input):
         print(f"Plik wejściowy nie istnieje: {args.input}")
         sys.exit(1)
-    in_df = pd.read_csv(args.input, low_memory=False)
-    print(f"✅ Wczytano dane: {in_df.shape[0]} wierszy, {in_df.shape[1]} kolumn")
-
-    X = ensure_features(in_df, args.features_from)
 
     models_loaded = {}
     if use_rf:
@@ -148,54 +204,68 @@ def main():
         print("❌ Brak załadowanych modeli.")
         sys.exit(1)
 
-    results = pd.DataFrame(index=range(X.shape[0]))
-    preds_for_ensemble = []
-    confs_for_ensemble = []
+    cascade = None
+    if args.cascade:
+        from cascade import CascadeEnsemble
+        cascade = CascadeEnsemble.from_config(models_loaded)
+        print(f"Kaskada: {' → '.join(n for n, _ in cascade.stages())} "
+              f"(pasmo niepewności {cascade.low:.2f}–{cascade.high:.2f})")
+    use_ensemble = bool(args.ensemble or cascade)
+    n_escalated = 0
 
-    for short_name, model in models_loaded.items():
-        print(f"Rozpoczynam predykcję dla {short_name}...")
-        out = predict_with_model(model, X)
-        results[f"pred_{short_name}"] = out["pred"]
-        results[f"conf_{short_name}"] = out["conf"]
-        preds_for_ensemble.append(out["pred"])
-        confs_for_ensemble.append(out["conf"])
+    # Strumieniowo: chunk → predykcje → dopisanie do CSV; pamięć stała względem rozmiaru wejścia
+    required_cols = read_required_columns(args.features_from)
+    labels_iter = iter_labels(args.ytest, args.chunksize)
+    confusion = {}
+    labels_ok = labels_iter is not None
+    n_rows = 0
+    out_path = args.out
+    if os.path.exists(out_path):
+        os.remove(out_path)
 
-    if args.ensemble and len(preds_for_ensemble) >= 1:
-        results["pred_ensemble"] = majority_vote(preds_for_ensemble)
-        conf_array = np.array(confs_for_ensemble)
-        with np.errstate(invalid='ignore'):
-            results["conf_ensemble"] = np.nanmean(conf_array, axis=0)
-    else:
-        results["pred_ensemble"] = np.nan
-        results["conf_ensemble"] = np.nan
+    for i, chunk in enumerate(pd.read_csv(args.input, chunksize=args.chunksize, low_memory=False)):
+        X = ensure_features(chunk, required_cols=required_cols)
+        if cascade is not None:
+            results = score_cascade_chunk(cascade, X.values)
+            n_escalated += int(results["escalated"].sum())
+        else:
+            results = score_chunk(models_loaded, X.values, args.ensemble)
+        results.to_csv(out_path, mode="a", header=(i == 0), index=False)
+        if i == 0:
+            print(results.head(10))
+
+        if labels_ok and use_ensemble:
+            y_chunk = next(labels_iter, None)
+            if y_chunk is None or len(y_chunk) != len(results):
+                labels_ok = False          # etykiety nie pasują długością do danych
+            else:
+                update_confusion(confusion, y_chunk, results["pred_ensemble"].values)
+        n_rows += len(results)
+        print(f"Predykcja: {n_rows} wierszy", end="\r")
 
-    # Zapis wyników
-    out_path = args.out
-    results.to_csv(out_path, index=False)
     print(f"\n🎉 Zapisano predykcje do: {out_path}")
-    print(results.head(10))
 
-    # Metryki
-    y_test = safe_read_ytest(args.ytest, len(results))
+    # Metryki (tylko jeśli etykiet jest dokładnie tyle co wierszy)
     accuracy = None
     f1 = None
     notes = None
-    if y_test is not None and "pred_ensemble" in results.columns and not results["pred_ensemble"].isna().all():
-        try:
-            from sklearn.metrics import accuracy_score, f1_score
-            mask = ~pd.isna(results["pred_ensemble"].values)
-            y_true_valid = y_test[mask]
-            y_pred_valid = results.loc[mask, "pred_ensemble"].astype(int).values
-            accuracy = float(accuracy_score(y_true_valid, y_pred_valid))
-            f1 = float(f1_score(y_true_valid, y_pred_valid, average="weighted"))
-        except Exception as e:
-            notes = f"Error computing metrics: {e}"
+    if labels_ok and use_ensemble and next(labels_iter, None) is not None:
+        labels_ok = False
+    if labels_iter is not None and use_ensemble and not labels_ok:
+        notes = "y_test nie pasuje długością do danych wejściowych — metryki pominięte"
+    elif confusion:
+        accuracy, f1, _ = metrics_from_confusion(confusion)
 
     models_used = ",".join(list(models_loaded.keys()))
+    if cascade is not None:
+        escalated_pct = 100.0 * n_escalated / max(n_rows, 1)
+        print(f"Kaskada: eskalowano {n_escalated}/{n_rows} wierszy ({escalated_pct:.1f}%)")
+        models_used = "cascade:" + ",".join(n for n, _ in cascade.stages())
+        notes = "; ".join(filter(None, [notes, f"eskalowane: {escalated_pct:.2f}%"]))
     log_run(script="predict_models",
-            n_rows=int(X.shape[0]),
+            n_rows=int(n_rows),
             models_used=models_used,
-            ensemble_used=bool(args.ensemble),
+            ensemble_used=use_ensemble,
             accuracy=accuracy,
             f1_score=f1,
             notes=notes,
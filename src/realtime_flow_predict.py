@@ -1,29 +1,69 @@
 #!/usr/bin/env python3
 import time
+import queue
+import threading
 from collections import defaultdict
 from datetime import datetime
-import sqlite3
 import numpy as np
-from scapy.layers.inet import IP, TCP, UDP
 from config_and_db import DB_PATH
+from log_db import get_connection, INSERT_FLOW_SQL, encode_features
 from firewall_rules import take_mitigation_action
+from model_registry import EARLY_DROP_THRESHOLD
+from flow_table import FlowTable, MAX_FLOWS, MEMORY_BUDGET
+from metrics import Counter, Gauge, Histogram
+from hotpath_profiler import PROFILER
 
 FLOW_TIMEOUT = 5  # sekundy, po których flow jest przetwarzany
+MITIGATION_TTL = 600  # sekundy blokady źródła
+DB_QUEUE_MAX = 10_000  # wpisy flow_logs czekające na zapis (powyżej — odrzucane)
+DB_BATCH = 256         # wpisy zapisywane jedną transakcją
+
+# warstwy scapy ładowane przy pierwszym pakiecie (import scapy to ~0.3 s, zbędne np. dla CLI/benchmarków)
+IP = TCP = UDP = None
+
+def _load_scapy():
+    global IP, TCP, UDP
+    from scapy.layers.inet import IP, TCP, UDP
+
+# źródła już zablokowane: src_ip -> czas wygaśnięcia (bez ponownego wywołania firewall_rules)
+_blocked_until = {}
+
+# --- Metryki (metrics.start_metrics_server wystawia je pod /metrics) ---
+PACKETS = Counter("fw_packets_total", "Pakiety przetworzone przez silnik")
+PACKETS_DROPPED = Counter("fw_packets_dropped_total", "Pakiety odrzucone przed tablicą flowów", ["reason"])
+VERDICTS = Counter("fw_verdicts_total", "Sklasyfikowane flowy według decyzji i ścieżki", ["decision", "reason"])
+MODEL_LATENCY = Histogram("fw_model_inference_seconds", "Czas predykcji jednego flowa", labelnames=["model"])
+FIREWALL_LATENCY = Histogram("fw_firewall_install_seconds", "Czas instalacji reguły firewall")
+DB_ROWS_DROPPED = Counter("fw_db_rows_dropped_total", "Wpisy flow_logs odrzucone przy pełnej kolejce")
+Gauge("fw_live_flows", "Aktywne flowy w tablicy", fn=lambda: len(flows))
+Gauge("fw_flow_table_evicted", "Flowy usunięte z pełnej tablicy", fn=lambda: flows.evicted)
+Gauge("fw_flow_table_shed", "Nowe flowy odrzucone przy pełnej tablicy", fn=lambda: flows.shed)
+Gauge("fw_flow_table_memory_bytes", "Szacowana pamięć tablicy flowów", fn=lambda: flows.memory_estimate())
+Gauge("fw_db_queue_depth", "Wpisy czekające na zapis do flow_logs", fn=lambda: _db_queue.qsize())
 
 # --- Globalny buffer flow ---
-flows = defaultdict(lambda: {
-    "timestamps": [],
-    "fwd_lengths": [],
-    "bwd_lengths": [],
-    "fwd_flags": defaultdict(int),
-    "bwd_flags": defaultdict(int),
-    "start_time": None,
-    "src_ip": None,
-    "dst_ip": None,
-    "src_port": None,
-    "dst_port": None,
-    "proto": None
-})
+def new_flow_state():
+    return {
+        "timestamps": [],
+        "fwd_lengths": [],
+        "bwd_lengths": [],
+        "fwd_flags": defaultdict(int),
+        "bwd_flags": defaultdict(int),
+        "start_time": None,
+        "src_ip": None,
+        "dst_ip": None,
+        "src_port": None,
+        "dst_port": None,
+        "proto": None
+    }
+
+flows = FlowTable(new_flow_state)
+
+def configure_flow_table(max_flows=MAX_FLOWS, memory_budget=MEMORY_BUDGET, policy="lru"):
+    """Nowa (pusta) tablica flowów z limitem i polityką przeciążenia (flow_table.POLICIES)."""
+    global flows
+    flows = FlowTable(new_flow_state, max_flows=max_flows, memory_budget=memory_budget, policy=policy)
+    return flows
 
 # --- Funkcje statystyczne ---
 def calc_iat(timestamps):
@@ -40,92 +80,272 @@ def safe_stats(arr):
     return mean, std, min(arr), max(arr)
 
 # --- Ekstrakcja cech ---
-def extract_flow_features(flow_key, flow_data):
+# Grupy cech wektora 78-wymiarowego: {grupa: indeksy}. Grupa liczona jest w całości albo wcale —
+# po przycinaniu cech (feature_pruning.py) silnik liczy tylko grupy potrzebne modelom.
+FEATURE_GROUPS = {
+    "dst_port":      [0],
+    "duration":      [1],
+    "counts":        [2, 3, 15, 65, 66, 67],
+    "bytes":         [4, 5, 14, 62, 63, 64],
+    "fwd_len_stats": [6, 7, 8, 9, 54, 55, 56, 57],
+    "bwd_len_stats": [10, 11, 12, 13, 58, 59, 60, 61],
+    "iat":           [16, 17, 18, 19, 68, 69, 70, 71],
+    "fwd_flags":     [42, 43, 44, 45, 46, 47],
+    "bwd_flags":     [48, 49, 50, 51, 52, 53],
+}
+ALL_GROUPS = frozenset(FEATURE_GROUPS)
+FLAG_NAMES = ("FIN", "SYN", "RST", "PSH", "ACK", "URG")
+
+# grupy liczone w finalize_flow (None = wszystkie); ustawiane przez configure_features
+active_feature_groups = None
+
+def groups_for_indices(indices):
+    """Najmniejszy zbiór grup pokrywający podane indeksy cech."""
+    indices = set(int(i) for i in indices)
+    return frozenset(g for g, idx in FEATURE_GROUPS.items() if indices & set(idx))
+
+def configure_features(schema=None):
+    """
+    Ogranicza ekstrakcję w finalize_flow do grup z feature_schema.json (albo słownika schematu).
+    None — pełny wektor. Zwraca aktywne grupy.
+    """
+    global active_feature_groups
+    if schema is None:
+        active_feature_groups = None
+        return None
+    if isinstance(schema, str):
+        import json
+        with open(schema) as f:
+            schema = json.load(f)
+    active_feature_groups = groups_for_indices(schema["selected"])
+    return active_feature_groups
+
+def extract_flow_features(flow_key, flow_data, groups=None):
+    groups = ALL_GROUPS if groups is None else groups
     fwd = flow_data["fwd_lengths"]
     bwd = flow_data["bwd_lengths"]
     ts  = flow_data["timestamps"]
     start_time = flow_data["start_time"]
     end_time   = ts[-1] if ts else start_time
 
-    total_fwd_pkts = len(fwd)
-    total_bwd_pkts = len(bwd)
-    total_len_fwd  = sum(fwd)
-    total_len_bwd  = sum(bwd)
+    features = [0]*78
+    if "dst_port" in groups:
+        features[0] = flow_data["dst_port"]
+    if "duration" in groups:
+        features[1] = end_time - start_time
+    if "counts" in groups:
+        total_fwd_pkts = len(fwd)
+        total_bwd_pkts = len(bwd)
+        features[2]  = total_fwd_pkts
+        features[3]  = total_bwd_pkts
+        features[15] = total_fwd_pkts + total_bwd_pkts
+        features[65:68] = [total_fwd_pkts, total_bwd_pkts, total_fwd_pkts + total_bwd_pkts]
+    if "bytes" in groups:
+        total_len_fwd = sum(fwd)
+        total_len_bwd = sum(bwd)
+        features[4]  = total_len_fwd
+        features[5]  = total_len_bwd
+        features[14] = total_len_fwd + total_len_bwd
+        features[62:65] = [total_len_fwd, total_len_bwd, total_len_fwd + total_len_bwd]
+    if "fwd_len_stats" in groups:
+        fwd_mean, fwd_std, fwd_min, fwd_max = safe_stats(fwd)
+        features[6:10]  = [fwd_max, fwd_min, fwd_mean, fwd_std]
+        features[54:58] = [fwd_min, fwd_max, fwd_mean, fwd_std]
+    if "bwd_len_stats" in groups:
+        bwd_mean, bwd_std, bwd_min, bwd_max = safe_stats(bwd)
+        features[10:14] = [bwd_max, bwd_min, bwd_mean, bwd_std]
+        features[58:62] = [bwd_min, bwd_max, bwd_mean, bwd_std]
+    if "iat" in groups:
+        iat_mean, iat_std, iat_min, iat_max = safe_stats(calc_iat(ts))
+        features[16:20] = [iat_mean, iat_std, iat_max, iat_min]
+        features[68:72] = [iat_min, iat_max, iat_mean, iat_std]
+    if "fwd_flags" in groups:
+        fwd_flags = flow_data["fwd_flags"]
+        features[42:48] = [fwd_flags.get(f, 0) for f in FLAG_NAMES]
+    if "bwd_flags" in groups:
+        bwd_flags = flow_data["bwd_flags"]
+        features[48:54] = [bwd_flags.get(f, 0) for f in FLAG_NAMES]
+    return features
 
-    fwd_mean, fwd_std, fwd_min, fwd_max = safe_stats(fwd)
-    bwd_mean, bwd_std, bwd_min, bwd_max = safe_stats(bwd)
-    iat = calc_iat(ts)
-    iat_mean, iat_std, iat_min, iat_max = safe_stats(iat)
+# --- Logowanie do bazy (wątek w tle, zapis wsadowy) ---
+_db_queue = queue.Queue(maxsize=DB_QUEUE_MAX)
+_db_writer = None
+_db_writer_lock = threading.Lock()
 
-    fwd_flags = flow_data["fwd_flags"]
-    bwd_flags = flow_data["bwd_flags"]
+def _db_writer_loop():
+    conn = get_connection(DB_PATH)   # trwałe połączenie wątku zapisu (WAL, synchronous=NORMAL)
+    while True:
+        rows = [_db_queue.get()]
+        try:
+            while len(rows) < DB_BATCH:
+                rows.append(_db_queue.get_nowait())
+        except queue.Empty:
+            pass
+        try:
+            conn.executemany(INSERT_FLOW_SQL, rows)
+            conn.commit()
+        except Exception as e:
+            print("Błąd przy zapisie do DB:", e)
+        finally:
+            for _ in rows:
+                _db_queue.task_done()
 
-    features = [0]*78
-    features[0]  = flow_data["dst_port"]
-    features[1]  = end_time - start_time
-    features[2]  = total_fwd_pkts
-    features[3]  = total_bwd_pkts
-    features[4]  = total_len_fwd
-    features[5]  = total_len_bwd
-    features[6]  = fwd_max
-    features[7]  = fwd_min
-    features[8]  = fwd_mean
-    features[9]  = fwd_std
-    features[10] = bwd_max
-    features[11] = bwd_min
-    features[12] = bwd_mean
-    features[13] = bwd_std
-    features[14] = total_len_fwd + total_len_bwd
-    features[15] = total_fwd_pkts + total_bwd_pkts
-    features[16] = iat_mean
-    features[17] = iat_std
-    features[18] = iat_max
-    features[19] = iat_min
-    features[42] = fwd_flags.get("FIN",0)
-    features[43] = fwd_flags.get("SYN",0)
-    features[44] = fwd_flags.get("RST",0)
-    features[45] = fwd_flags.get("PSH",0)
-    features[46] = fwd_flags.get("ACK",0)
-    features[47] = fwd_flags.get("URG",0)
-    features[48] = bwd_flags.get("FIN",0)
-    features[49] = bwd_flags.get("SYN",0)
-    features[50] = bwd_flags.get("RST",0)
-    features[51] = bwd_flags.get("PSH",0)
-    features[52] = bwd_flags.get("ACK",0)
-    features[53] = bwd_flags.get("URG",0)
-    features[54:78] = [fwd_min, fwd_max, fwd_mean, fwd_std,
-                       bwd_min, bwd_max, bwd_mean, bwd_std,
-                       total_len_fwd, total_len_bwd, total_len_fwd+total_len_bwd,
-                       total_fwd_pkts, total_bwd_pkts, total_fwd_pkts+total_bwd_pkts,
-                       iat_min, iat_max, iat_mean, iat_std, 0,0,0,0,0,0]
-    return features
+def start_db_writer():
+    global _db_writer
+    if _db_writer is not None:
+        return
+    with _db_writer_lock:
+        if _db_writer is None:
+            _db_writer = threading.Thread(target=_db_writer_loop, name="flow-log-writer", daemon=True)
+            _db_writer.start()
+
+def flush_db():
+    """Czeka, aż wątek zapisu opróżni kolejkę."""
+    if _db_writer is not None:
+        _db_queue.join()
+
+def log_flow_to_db(flow_key, pkt_count, preds, decision, features=None):
+    start_db_writer()
+    row = (datetime.now().isoformat(), flow_key[0], flow_key[1], flow_key[2], flow_key[3], flow_key[4],
+           str(preds), decision, encode_features(features))
+    try:
+        _db_queue.put_nowait(row)
+    except queue.Full:
+        DB_ROWS_DROPPED.inc()
+
+# --- Klasyfikacja flow ---
+def classify_features(features, models):
+    """
+    Zwraca (preds, decision). models to słownik {nazwa: model} (głosowanie większościowe)
+    albo CascadeEnsemble (tani model najpierw, cięższe tylko dla niepewnych flowów).
+    """
+    X = np.array(features).reshape(1, -1)
+    if hasattr(models, "classify_one"):
+        t0 = time.perf_counter_ns()
+        result = models.classify_one(X)
+        MODEL_LATENCY.labels("cascade").observe_ns(time.perf_counter_ns() - t0)
+        return result
+
+    preds = {}
+    votes = []
+    for name, model in models.items():
+        t0 = time.perf_counter_ns()
+        pred = int(model.predict(X)[0])
+        MODEL_LATENCY.labels(name).observe_ns(time.perf_counter_ns() - t0)
+        preds[name] = pred
+        votes.append(pred)
+
+    # decyzja na podstawie większości głosów
+    if votes.count(1) > len(votes) // 2:
+        return preds, "DROP"
+    return preds, "ACCEPT"
+
+# --- Wczesna klasyfikacja ---
+def load_early_models(registry=None, checkpoints=None):
+    """
+    Modele wczesne {liczba_pakietów: model} z rejestru (Early<N>), z hot reloadem.
+    Checkpointy bez wytrenowanego modelu są pomijane.
+    """
+    from model_registry import ModelRegistry, EARLY_CHECKPOINTS, early_model_name
+    registry = registry or ModelRegistry()
+    return registry.live({n: early_model_name(n) for n in (checkpoints or EARLY_CHECKPOINTS)})
 
-# --- Logowanie do bazy ---
-def log_flow_to_db(flow_key, pkt_count, preds, decision):
+def early_verdict(features, model, threshold=EARLY_DROP_THRESHOLD):
+    """Zwraca (p_atak, decision); poniżej progu flow zbiera pakiety dalej (decision=None)."""
+    from cascade import attack_probability
+    X = np.array(features).reshape(1, -1)
+    t0 = time.perf_counter_ns()
+    p = float(attack_probability(model, X)[0])
+    MODEL_LATENCY.labels("early").observe_ns(time.perf_counter_ns() - t0)
+    return p, ("DROP" if p >= threshold else None)
+
+# --- Reakcja na werdykt ---
+def mitigate(src_ip, reason="auto-detect", ttl_seconds=MITIGATION_TTL):
+    now = time.time()
+    if _blocked_until.get(src_ip, 0) > now:
+        return
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        ts = datetime.now().isoformat()
-        c.execute("""
-            INSERT INTO flow_logs(timestamp, src_ip, dst_ip, src_port, dst_port, protocol, prediction, decision)
-            VALUES(?,?,?,?,?,?,?,?)
-        """, (
-            ts,
-            flow_key[0],
-            flow_key[1],
-            flow_key[2],
-            flow_key[3],
-            flow_key[4],
-            str(preds),
-            decision
-        ))
-        conn.commit()
-        conn.close()
+        t0 = time.perf_counter_ns()
+        take_mitigation_action(src_ip, ttl_seconds=ttl_seconds, reason=reason)
+        FIREWALL_LATENCY.observe_ns(time.perf_counter_ns() - t0)
+        _blocked_until[src_ip] = now + ttl_seconds
     except Exception as e:
-        print("Błąd przy zapisie do DB:", e)
+        print("Błąd firewall_rules:", e)
+
+def emit_verdict(key, pkt_count, preds, decision, gui_callback=None, reason="auto-detect", block=True,
+                 features=None):
+    VERDICTS.labels(decision, reason.split("@")[0]).inc()
+
+    # log do DB (cechy pełnego flowa — do późniejszego etykietowania i online_update)
+    log_flow_to_db(key, pkt_count, preds, decision, features)
+    if PROFILER.enabled:
+        PROFILER.lap("db")
+
+    # firewall reaction
+    if decision == "DROP" and block:
+        mitigate(key[0], reason=reason)
+        if PROFILER.enabled:
+            PROFILER.lap("firewall")
+
+    # callback do GUI
+    if gui_callback:
+        gui_callback_safe = lambda k=key, pc=pkt_count, p=preds, d=decision: gui_callback(k, pc, p, d)
+        try:
+            from tkinter import _default_root
+            if _default_root:
+                _default_root.after(0, gui_callback_safe)
+            else:
+                gui_callback_safe()
+        except Exception:
+            gui_callback_safe()
+        if PROFILER.enabled:
+            PROFILER.lap("gui")
+
+    return key, pkt_count, preds, decision
+
+def finalize_flow(key, flow, models=None, gui_callback=None, reason="auto-detect"):
+    """Klasyfikacja pełnego (lub wymuszonego przez przeciążenie) flowa i reakcja."""
+    features = extract_flow_features(key, flow, active_feature_groups)
+    pkt_count = len(flow["timestamps"])
+    preds = {}
+    decision = "ACCEPT"
+    if PROFILER.enabled:
+        PROFILER.lap("features")
+
+    # --- MAJORITY VOTE / KASKADA ---
+    if models:
+        try:
+            preds, decision = classify_features(features, models)
+        except Exception as e:
+            preds = {k: -1 for k in getattr(models, "models", models).keys()}
+            decision = "ACCEPT"
+            print("Błąd predykcji:", e)
+        if PROFILER.enabled:
+            PROFILER.lap("model")
+
+    return emit_verdict(key, pkt_count, preds, decision, gui_callback, reason=reason, features=features)
 
 # --- Proces pakietu ---
-def process_packet(pkt, models=None, gui_callback=None):
+def process_packet(pkt, models=None, gui_callback=None, early_models=None, prefilter=None, now=None):
+    """
+    early_models: {liczba_pakietów: model} (np. load_early_models()). Po osiągnięciu
+    checkpointu flow jest oceniany od razu; pewny atak jest blokowany bez czekania
+    na FLOW_TIMEOUT, a niejednoznaczny flow zbiera pakiety dalej.
+    prefilter: FloodPrefilter — pakiety heavy hitterów odrzucane przed alokacją flowa.
+    Przy włączonym PROFILER (hotpath_profiler) czas każdego etapu trafia do histogramów.
+    now: znacznik czasu pakietu (np. odtwarzanie strumienia w benchmarku); domyślnie time.time().
+    """
+    if not PROFILER.enabled:
+        return _process_packet(pkt, models, gui_callback, early_models, prefilter, now)
+    PROFILER.start()
+    try:
+        return _process_packet(pkt, models, gui_callback, early_models, prefilter, now)
+    finally:
+        PROFILER.finish()
+
+def _process_packet(pkt, models, gui_callback, early_models, prefilter, now):
+    if IP is None:
+        _load_scapy()
     if not (IP in pkt):
         return None
 
@@ -136,17 +356,55 @@ def process_packet(pkt, models=None, gui_callback=None):
     dst_port = pkt[TCP].dport if TCP in pkt else (pkt[UDP].dport if UDP in pkt else 0)
 
     key = (src_ip, dst_ip, src_port, dst_port, proto)
+    PACKETS.inc()
+    if PROFILER.enabled:
+        PROFILER.lap("parse")
+        PROFILER.sample(key)
+
+    # --- prefiltr floodów (bez stanu per-flow) ---
+    if prefilter is not None:
+        # nowe połączenie otwiera tylko inicjator: flow nieznany w obu kierunkach, a dla TCP
+        # sam SYN (bez ACK) — odpowiedzi serwera nie liczą się jako nowe flowy jego adresu
+        new_flow = (key not in flows and (dst_ip, src_ip, dst_port, src_port, proto) not in flows
+                    and (TCP not in pkt or int(pkt[TCP].flags) & 0x12 == 0x02))
+        hit = prefilter.observe(src_ip, dst_ip, new_flow, now=now)
+        if hit is not None and hit.shed:
+            PACKETS_DROPPED.labels("flood").inc()
+            if not hit.new:
+                return None
+            return emit_verdict(key, 1, {f"flood_{hit.kind}": round(hit.rate)}, "DROP", gui_callback,
+                                reason="flood-prefilter")
+        if hit is not None:
+            # flood na cel z wielu źródeł — alert bez blokady; pakiet idzie dalej do tablicy flowów
+            emit_verdict(key, 1, {f"flood_{hit.kind}": round(hit.rate)}, "ALERT", gui_callback,
+                         reason="flood-prefilter", block=False)
+        if PROFILER.enabled:
+            PROFILER.lap("prefilter")
 
-    flow = flows[key]
+    on_evict = None
+    if flows.policy == "classify-oldest":
+        on_evict = lambda k, f: finalize_flow(k, f, models, gui_callback, reason="overload-classify")
+    flow = flows.acquire(key, on_evict)
+    if flow is None:
+        # tablica flowów pełna (polityka shed-new)
+        PACKETS_DROPPED.labels("shed").inc()
+        return None
+    ts = time.time() if now is None else now
     if flow["start_time"] is None:
-        flow["start_time"] = time.time()
+        flow["start_time"] = ts
         flow["src_ip"] = src_ip
         flow["dst_ip"] = dst_ip
         flow["src_port"] = src_port
         flow["dst_port"] = dst_port
         flow["proto"] = proto
 
-    ts = time.time()
+    # flow zablokowany wcześnie — nie liczymy już cech, tylko czekamy na timeout
+    if flow.get("decided"):
+        PACKETS_DROPPED.labels("decided").inc()
+        if ts - flow["start_time"] > FLOW_TIMEOUT:
+            flows.pop(key, None)
+        return None
+
     # --- kierunek pakietu ---
     if (src_ip, src_port) == (flow["src_ip"], flow["src_port"]):
         flow["fwd_lengths"].append(len(pkt))
@@ -162,56 +420,26 @@ def process_packet(pkt, models=None, gui_callback=None):
                     flow["bwd_flags"][flag] += 1
 
     flow["timestamps"].append(ts)
+    flows.note_packet()
+    pkt_count = len(flow["timestamps"])
+    if PROFILER.enabled:
+        PROFILER.lap("flow_update")
 
-    # --- timeout flowa ---
-    if ts - flow["start_time"] > FLOW_TIMEOUT:
-        features = extract_flow_features(key, flow)
-        pkt_count = len(flow["timestamps"])
-        preds = {}
-        decision = "ACCEPT"
-
-        # --- MAJORITY VOTE ---
-        if models:
-            try:
-                X = np.array(features).reshape(1, -1)
-                votes = []
-                for name, model in models.items():
-                    pred = int(model.predict(X)[0])
-                    preds[name] = pred
-                    votes.append(pred)
-
-                # decyzja na podstawie większości głosów
-                if votes.count(1) > len(votes) // 2:
-                    decision = "DROP"
-                else:
-                    decision = "ACCEPT"
-
-            except Exception as e:
-                preds = {k: -1 for k in models.keys()}
-                print("Błąd predykcji:", e)
-
-        # log do DB
-        log_flow_to_db(key, pkt_count, preds, decision)
-
-        # firewall reaction
+    # --- wczesny werdykt po N pakietach ---
+    if early_models and pkt_count in early_models:
+        try:
+            p, decision = early_verdict(extract_flow_features(key, flow), early_models[pkt_count])
+        except Exception as e:
+            p, decision = None, None
+            print("Błąd predykcji (early):", e)
+        if PROFILER.enabled:
+            PROFILER.lap("early")
         if decision == "DROP":
-            try:
-                take_mitigation_action(src_ip, ttl_seconds=600, reason="auto-detect")
-            except Exception as e:
-                print("Błąd firewall_rules:", e)
-
-        # callback do GUI
-        if gui_callback:
-            try:
-                from tkinter import _default_root
-                gui_callback_safe = lambda k=key, pc=pkt_count, p=preds, d=decision: gui_callback(k, pc, p, d)
-                if _default_root:
-                    _default_root.after(0, gui_callback_safe)
-                else:
-                    gui_callback_safe()
-            except Exception:
-                gui_callback_safe()
+            flow["decided"] = True
+            return emit_verdict(key, pkt_count, {f"early_{pkt_count}": round(p, 4)}, decision,
+                                gui_callback, reason=f"early-detect@{pkt_count}")
 
+    # --- timeout flowa ---
+    if ts - flow["start_time"] > FLOW_TIMEOUT:
         flows.pop(key, None)
-
-        return key, pkt_count, preds, decision
+        return finalize_flow(key, flow, models, gui_callback)
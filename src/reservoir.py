@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+reservoir.py
+
+Próbkowanie rezerwuarowe strumienia wierszy (jedno przejście, stała pamięć).
+- Reservoir: każdy wiersz dostaje losowy klucz, zostaje k wierszy o najmniejszych kluczach
+  — równomierna próbka k z dotychczasowego strumienia; dodawanie całymi chunkami (NumPy)
+- StratifiedReservoir: osobny rezerwuar na klasę (np. BENIGN / ATTACK)
+- class_sampler: próbka zbioru uczącego w jednym przejściu po chunkach — proporcje ze strumienia
+  albo zadane kwoty klas (build_dataset.py, build_dataset_flow.py)
+"""
+
+import numpy as np
+
+
+class Reservoir:
+    def __init__(self, k, seed=None, dtype=None):
+        self.k = int(k)
+        self.rng = seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+        self.dtype = dtype
+        self.rows = None
+        self.keys = np.empty(0)
+        self.seen = 0
+
+    def add(self, rows):
+        """Dodaje chunk wierszy (ndarray: pierwszy wymiar = wiersze)."""
+        rows = np.asarray(rows, dtype=self.dtype)
+        n = rows.shape[0]
+        if n == 0:
+            return
+        self.seen += n
+        keys = self.rng.random(n)
+        if self.rows is not None and self.keys.size >= self.k:
+            # rezerwuar pełny: kandydaci tylko z kluczem mniejszym od obecnego maksimum
+            keep = keys < self.keys.max()
+            if not keep.any():
+                return
+            rows, keys = rows[keep], keys[keep]
+        if self.rows is None:
+            all_rows, all_keys = rows, keys
+        else:
+            all_rows = np.concatenate([self.rows, rows])
+            all_keys = np.concatenate([self.keys, keys])
+        if all_keys.size > self.k:
+            idx = np.argpartition(all_keys, self.k - 1)[:self.k]
+            all_rows, all_keys = all_rows[idx], all_keys[idx]
+        self.rows = np.ascontiguousarray(all_rows)
+        self.keys = all_keys
+
+    def __len__(self):
+        return 0 if self.rows is None else self.rows.shape[0]
+
+    def values(self):
+        """Próbka w kolejności kluczy (losowej) — gotowa do użycia bez dodatkowego tasowania."""
+        if self.rows is None:
+            return np.empty((0,))
+        return self.rows[np.argsort(self.keys, kind="stable")]
+
+
+class StratifiedReservoir:
+    """Rezerwuar per klasa; k może być liczbą albo słownikiem {klasa: k}."""
+    def __init__(self, k, seed=None, dtype=None):
+        self.k = k
+        self.rng = np.random.default_rng(seed)
+        self.dtype = dtype
+        self.reservoirs = {}
+
+    def _get(self, label):
+        res = self.reservoirs.get(label)
+        if res is None:
+            k = self.k.get(label, 0) if isinstance(self.k, dict) else self.k
+            res = self.reservoirs[label] = Reservoir(k, seed=self.rng, dtype=self.dtype)
+        return res
+
+    def add(self, X, y):
+        y = np.asarray(y)
+        for label in np.unique(y):
+            res = self._get(label.item() if hasattr(label, "item") else label)
+            if res.k > 0:
+                res.add(X[y == label])
+
+    def seen(self):
+        return {label: r.seen for label, r in self.reservoirs.items()}
+
+    def values(self):
+        """{klasa: próbka}"""
+        return {label: r.values() for label, r in self.reservoirs.items()}
+
+    def stacked(self, seed=None):
+        """(X, y) ze wszystkich klas, wiersze przemieszane."""
+        parts = [(v, label) for label, v in sorted(self.values().items()) if len(v)]
+        if not parts:
+            return np.empty((0,)), np.empty(0, dtype=np.int64)
+        X = np.concatenate([v for v, _ in parts])
+        y = np.concatenate([np.full(len(v), label) for v, label in parts])
+        order = np.random.default_rng(seed).permutation(len(y))
+        return X[order], y[order]
+
+
+class LabeledReservoir(Reservoir):
+    """Jeden rezerwuar dla (X, y) — klasy w proporcjach strumienia."""
+    def add(self, X, y):
+        X = np.asarray(X, dtype=self.dtype)
+        super().add(np.column_stack([X, np.asarray(y, dtype=X.dtype)]))
+
+    def stacked(self, seed=None):
+        rows = self.values()
+        if rows.ndim < 2:
+            return np.empty((0,)), np.empty(0, dtype=np.int64)
+        return rows[:, :-1], rows[:, -1].astype(np.int64)
+
+
+def class_sampler(n, attack_ratio=None, seed=None, dtype=None):
+    """
+    Próbnik n wierszy: attack_ratio=None → proporcje jak w danych (jeden rezerwuar),
+    inaczej osobne kwoty BENIGN (0) / ATTACK (1). Obie klasy: add(X, y), stacked() → (X, y).
+    """
+    if attack_ratio is None:
+        return LabeledReservoir(n, seed=seed, dtype=dtype)
+    n_attack = int(round(n * attack_ratio))
+    return StratifiedReservoir({0: n - n_attack, 1: n_attack}, seed=seed, dtype=dtype)
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+shard_loader.py
+
+Format shardów znormalizowanych danych: float32 .npy + manifest JSON, odczyt przez mmap.
+- shard = <nazwa>_X.npy (float32, C-order), <nazwa>_y.npy (int8), opcjonalnie <nazwa>_w.npy
+  (wagi po dedup_dataset.py); np.load(mmap_mode="r") — bez odpiklowania i bez kopii
+- manifest.json: kolumny, liczby wierszy i klas per shard i łącznie, sha256 scalera,
+  którym zeskalowano dane (weryfikacja zgodności przed treningiem)
+- ShardSet: iteracja po shardach, minibatche jako widoki ciągłych fragmentów memmap
+  (zero kopii; przemieszana kolejność shardów i batchy), rows(indices) do losowego dostępu,
+  load_all() gdy estymator potrzebuje jednej macierzy
+- load_shard_file(): wspólny odczyt shardu .npy albo starego chunku joblib (X, y[, w])
+- --convert-legacy: przepisanie starych chunków *.pkl do shardów bez ponownej normalizacji
+"""
+
+import os
+import glob
+import json
+import hashlib
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+from config_and_db import NORMALIZED_DATA_DIR
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+X_DTYPE = np.float32
+Y_DTYPE = np.int8
+W_DTYPE = np.float32
+LEGACY_PATTERN = "*_chunk*.pkl"
+
+
+def file_sha256(path, block=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(block), b""):
+            h.update(data)
+    return h.hexdigest()
+
+def _save_npy(path, arr):
+    tmp = path + ".tmp.npy"
+    np.save(tmp, arr)
+    os.replace(tmp, path)
+
+
+# -------------------------------------------------------------
+# ZAPIS
+# -------------------------------------------------------------
+def write_shard(out_dir, name, X, y, w=None, source=None):
+    """Zapisuje jeden shard i zwraca jego wpis do manifestu."""
+    X = np.ascontiguousarray(X, dtype=X_DTYPE)
+    y = np.ascontiguousarray(y, dtype=Y_DTYPE).ravel()
+    if X.shape[0] != y.shape[0]:
+        raise ValueError(f"Shard {name}: {X.shape[0]} wierszy X, {y.shape[0]} etykiet")
+    entry = {"name": name, "X": f"{name}_X.npy", "y": f"{name}_y.npy", "rows": int(X.shape[0]),
+             "classes": {str(int(k)): int(c) for k, c in zip(*np.unique(y, return_counts=True))}}
+    _save_npy(os.path.join(out_dir, entry["X"]), X)
+    _save_npy(os.path.join(out_dir, entry["y"]), y)
+    if w is not None:
+        entry["w"] = f"{name}_w.npy"
+        _save_npy(os.path.join(out_dir, entry["w"]), np.ascontiguousarray(w, dtype=W_DTYPE).ravel())
+    if source:
+        entry["source"] = source
+    return entry
+
+def write_manifest(out_dir, entries, columns=None, scaler_path=None, extra=None):
+    """manifest.json (zapis atomowy) z sumami wierszy/klas i hashem scalera."""
+    classes = {}
+    for e in entries:
+        for k, c in e["classes"].items():
+            classes[k] = classes.get(k, 0) + c
+    n_features = None
+    if entries:
+        n_features = int(np.load(os.path.join(out_dir, entries[0]["X"]), mmap_mode="r").shape[1])
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "dtype": np.dtype(X_DTYPE).name,
+        "n_features": n_features,
+        "columns": list(columns) if columns is not None else None,
+        "rows": sum(e["rows"] for e in entries),
+        "classes": classes,
+        "weighted": any("w" in e for e in entries),
+        "scaler": os.path.basename(scaler_path) if scaler_path else None,
+        "scaler_sha256": file_sha256(scaler_path) if scaler_path and os.path.exists(scaler_path) else None,
+        "shards": entries,
+    }
+    if extra:
+        manifest.update(extra)
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+    return path
+
+def remove_shards(out_dir):
+    """Usuwa shardy wymienione w istniejącym manifeście (przed zapisem nowego zestawu)."""
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        entries = json.load(f).get("shards", [])
+    for e in entries:
+        for key in ("X", "y", "w"):
+            if key in e and os.path.exists(os.path.join(out_dir, e[key])):
+                os.remove(os.path.join(out_dir, e[key]))
+    os.remove(path)
+    return len(entries)
+
+
+# -------------------------------------------------------------
+# ODCZYT
+# -------------------------------------------------------------
+class ShardSet:
+    def __init__(self, path=NORMALIZED_DATA_DIR, mmap_mode="r"):
+        manifest_path = path if path.endswith(".json") else os.path.join(path, MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"Brak {manifest_path} — uruchom normalize_dataset.py "
+                                    f"albo shard_loader.py --convert-legacy")
+        with open(manifest_path) as f:
+            self.manifest = json.load(f)
+        self.dir = os.path.dirname(os.path.abspath(manifest_path))
+        self.mmap_mode = mmap_mode
+        self.shards = self.manifest["shards"]
+        self.offsets = np.cumsum([0] + [e["rows"] for e in self.shards])
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.shards)
+
+    @property
+    def n_rows(self):
+        return int(self.offsets[-1])
+
+    @property
+    def n_features(self):
+        return self.manifest.get("n_features")
+
+    @property
+    def weighted(self):
+        return bool(self.manifest.get("weighted"))
+
+    @property
+    def scaler_path(self):
+        name = self.manifest.get("scaler")
+        return os.path.join(self.dir, name) if name else None
+
+    def verify_scaler(self, path=None):
+        """Czy scaler (domyślnie ten z manifestu) jest tym, którym zeskalowano shardy."""
+        path = path or self.scaler_path
+        expected = self.manifest.get("scaler_sha256")
+        return bool(expected and path and os.path.exists(path) and file_sha256(path) == expected)
+
+    def paths(self, i):
+        e = self.shards[i]
+        return {k: os.path.join(self.dir, e[k]) for k in ("X", "y", "w") if k in e}
+
+    def load(self, i):
+        """(X, y, w|None) shardu i — memmap, bez kopii."""
+        arrays = self._cache.get(i)
+        if arrays is None:
+            p = self.paths(i)
+            arrays = (np.load(p["X"], mmap_mode=self.mmap_mode),
+                      np.load(p["y"], mmap_mode=self.mmap_mode),
+                      np.load(p["w"], mmap_mode=self.mmap_mode) if "w" in p else None)
+            self._cache[i] = arrays
+        return arrays
+
+    def __iter__(self):
+        for i in range(len(self.shards)):
+            yield self.load(i)
+
+    def minibatches(self, batch_size, shuffle=True, seed=None, epochs=1):
+        """
+        (X, y, w|None) po batch_size wierszy — ciągłe wycinki memmap (widoki, zero kopii).
+        shuffle miesza kolejność shardów i batchy w obrębie epoki, nie wierszy w batchu.
+        """
+        rng = np.random.default_rng(seed)
+        blocks = [(i, s) for i, e in enumerate(self.shards) for s in range(0, e["rows"], batch_size)]
+        for _ in range(epochs):
+            order = rng.permutation(len(blocks)) if shuffle else range(len(blocks))
+            for b in order:
+                i, start = blocks[b]
+                X, y, w = self.load(i)
+                end = start + batch_size
+                yield X[start:end], y[start:end], (w[start:end] if w is not None else None)
+
+    def rows(self, indices):
+        """Losowy dostęp po globalnych indeksach wierszy (kopiowane są tylko wybrane wiersze)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        shard_idx = np.searchsorted(self.offsets, indices, side="right") - 1
+        X = np.empty((len(indices), self.n_features), dtype=X_DTYPE)
+        y = np.empty(len(indices), dtype=Y_DTYPE)
+        for i in np.unique(shard_idx):
+            mask = shard_idx == i
+            Xs, ys, _ = self.load(int(i))
+            local = indices[mask] - self.offsets[i]
+            X[mask] = Xs[local]
+            y[mask] = ys[local]
+        return X, y
+
+    def load_all(self, max_rows=None):
+        """(X float32, y, w|None) w jednej macierzy — jedna kopia, połowa pamięci float64."""
+        n = self.n_rows if max_rows is None else min(max_rows, self.n_rows)
+        X = np.empty((n, self.n_features), dtype=X_DTYPE)
+        y = np.empty(n, dtype=Y_DTYPE)
+        w = np.empty(n, dtype=W_DTYPE) if self.weighted else None
+        pos = 0
+        for Xs, ys, ws in self:
+            take = min(len(ys), n - pos)
+            if take <= 0:
+                break
+            X[pos:pos + take] = Xs[:take]
+            y[pos:pos + take] = ys[:take]
+            if w is not None:
+                w[pos:pos + take] = ws[:take] if ws is not None else 1.0
+            pos += take
+        return X, y, w
+
+
+def list_shard_files(source=NORMALIZED_DATA_DIR, pattern=LEGACY_PATTERN):
+    """Ścieżki X shardów z manifestu w katalogu; bez manifestu — stare chunki wg wzorca glob."""
+    if os.path.isdir(source) and os.path.exists(os.path.join(source, MANIFEST_NAME)):
+        shards = ShardSet(source)
+        return [shards.paths(i)["X"] for i in range(len(shards))]
+    base = os.path.join(source, pattern) if os.path.isdir(source) else source
+    return sorted(p for p in glob.glob(base) if os.path.basename(p) != "scaler.pkl")
+
+def load_shard_file(path, mmap_mode="r"):
+    """(X, y, w|None) z shardu <nazwa>_X.npy (memmap) albo starego chunku joblib."""
+    if path.endswith("_X.npy"):
+        stem = path[:-len("_X.npy")]
+        w_path = stem + "_w.npy"
+        return (np.load(path, mmap_mode=mmap_mode), np.load(stem + "_y.npy", mmap_mode=mmap_mode),
+                np.load(w_path, mmap_mode=mmap_mode) if os.path.exists(w_path) else None)
+    import joblib
+    data = joblib.load(path)
+    return data[0], data[1], data[2] if len(data) > 2 else None
+
+
+def convert_legacy(data_dir=NORMALIZED_DATA_DIR, pattern=LEGACY_PATTERN, remove=False):
+    """Chunki joblib (X, y[, w]) float64 → shardy float32 + manifest (ten sam katalog)."""
+    paths = sorted(p for p in glob.glob(os.path.join(data_dir, pattern)) if os.path.basename(p) != "scaler.pkl")
+    entries = []
+    for path in paths:
+        X, y, w = load_shard_file(path)
+        name = os.path.splitext(os.path.basename(path))[0]
+        entries.append(write_shard(data_dir, name, X, y, w, source=os.path.basename(path)))
+        if remove:
+            os.remove(path)
+        print(f"✅ {os.path.basename(path)} → {name}_X.npy ({len(y)} wierszy)")
+    scaler = os.path.join(data_dir, "scaler.pkl")
+    return write_manifest(data_dir, entries, scaler_path=scaler if os.path.exists(scaler) else None)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Shardy float32 .npy + manifest: informacje i konwersja.")
+    p.add_argument("--data-dir", default=NORMALIZED_DATA_DIR)
+    p.add_argument("--convert-legacy", action="store_true", help="Przepisz chunki *.pkl do shardów .npy.")
+    p.add_argument("--remove-legacy", action="store_true", help="Usuń chunki *.pkl po konwersji.")
+    args = p.parse_args()
+
+    if args.convert_legacy:
+        print(f"Zapisano manifest: {convert_legacy(args.data_dir, remove=args.remove_legacy)}")
+
+    shards = ShardSet(args.data_dir)
+    m = shards.manifest
+    size = sum(os.path.getsize(path) for i in range(len(shards)) for path in shards.paths(i).values())
+    print(f"Shardy: {len(shards)}, wiersze: {shards.n_rows}, cechy: {shards.n_features}, "
+          f"klasy: {m['classes']}, wagi: {'tak' if shards.weighted else 'nie'}, "
+          f"{size / 1e6:.1f} MB na dysku")
+    if m.get("scaler"):
+        print(f"Scaler {m['scaler']}: {'✅ zgodny' if shards.verify_scaler() else '⚠️ inny niż przy zapisie'}")
+
+if __name__ == "__main__":
+    main()
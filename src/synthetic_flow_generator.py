@@ -1,146 +1,221 @@
-import random
+#!/usr/bin/env python3
+"""
+synthetic_flow_generator.py
+
+Syntetyczne flowy z 78 cechami kompatybilnymi z CICIDS2017.
+- generate_synthetic_flows(n, attack_ratio, seed): cała macierz naraz, wektorowo
+  (numpy Generator; pakiety flowów o różnej długości jako bloki z maską)
+- write_synthetic_chunks(): zapis shardami float32 .npy + manifest.json (format normalize_dataset,
+  shard_loader.py), opcjonalnie w wielu procesach; shard i dostaje własne ziarno
+  z SeedSequence(seed).spawn(), więc wynik nie zależy od liczby workerów
+- generate_synthetic_flow(label): pojedynczy flow (zgodność wsteczna)
+"""
+
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 
-def generate_synthetic_flow(label="BENIGN"):
+from shard_loader import write_shard, write_manifest, remove_shards
+
+N_FEATURES = 78
+BLOCK_ROWS = 2048           # wiersze generowane naraz (ogranicza pamięć bloków pakietów)
+ROWS_PER_CHUNK = 100_000    # wiersze w jednym pliku chunku
+
+# parametry klas: zakresy włącznie (jak random.randint)
+CLASS_PARAMS = {
+    # BENIGN
+    0: {"fwd": (10, 80), "bwd": (5, 60), "duration": (2000, 200000), "size": (40, 400)},      # 2 ms - 200 ms
+    # ATTACK → duże flowy, szybkie tempo, burst pattern
+    1: {"fwd": (150, 500), "bwd": (80, 300), "duration": (200, 3000), "size": (400, 1400)},   # ekstremalnie szybkie
+}
+ACTIVE_IDLE_SCALE = (5000, 2000, 7000, 100, 10000, 3000, 15000, 100)
+
+# -------------------------------------------------------------
+# STATYSTYKI NA BLOKACH Z MASKĄ
+# -------------------------------------------------------------
+def _randint(rng, low, high, n):
+    return rng.integers(low, high + 1, size=n)
+
+def _masked_block(rng, loc, scale, counts, max_len):
+    """Wiersz i: counts[i] próbek N(loc[i], scale[i]); reszta wiersza zamaskowana."""
+    x = rng.normal(loc[:, None], scale[:, None], size=(counts.size, max_len))
+    mask = np.arange(max_len) < counts[:, None]
+    return x, mask
+
+def _stats(x, mask, counts):
+    """(suma, średnia, std, max, min) po zamaskowanych wierszach — jak np.sum/mean/std/max/min."""
+    total = np.where(mask, x, 0.0).sum(axis=1)
+    mean = total / counts
+    std = np.sqrt(np.where(mask, (x - mean[:, None]) ** 2, 0.0).sum(axis=1) / counts)
+    return total, mean, std, np.where(mask, x, -np.inf).max(axis=1), np.where(mask, x, np.inf).min(axis=1)
+
+def _joint_mean_std(xa, ma, xb, mb, sum_a, sum_b, n_a, n_b):
+    """Średnia i std złączenia dwóch zbiorów próbek (np.concatenate bez kopiowania)."""
+    mean = (sum_a + sum_b) / (n_a + n_b)
+    sq = (np.where(ma, (xa - mean[:, None]) ** 2, 0.0).sum(axis=1) +
+          np.where(mb, (xb - mean[:, None]) ** 2, 0.0).sum(axis=1))
+    return mean, np.sqrt(sq / (n_a + n_b))
+
+def _generate_block(rng, n, label):
+    """n flowów jednej klasy → macierz (n, 78)."""
+    p = CLASS_PARAMS[label]
+    total_fwd = _randint(rng, *p["fwd"], n)
+    total_bwd = _randint(rng, *p["bwd"], n)
+    duration = _randint(rng, *p["duration"], n).astype(np.float64)
+    base = _randint(rng, *p["size"], n).astype(np.float64)
+    total_pkts = total_fwd + total_bwd
+    max_fwd, max_bwd = p["fwd"][1], p["bwd"][1]
+
+    # rozmiary pakietów
+    fwd_x, fwd_m = _masked_block(rng, base, base / 4, total_fwd, max_fwd)
+    bwd_x, bwd_m = _masked_block(rng, base / 1.5, base / 3, total_bwd, max_bwd)
+    np.clip(fwd_x, 20, 1500, out=fwd_x)
+    np.clip(bwd_x, 20, 1500, out=bwd_x)
+
+    # czasy między pakietami (IAT)
+    fwd_t, _ = _masked_block(rng, duration / total_fwd, duration / (total_fwd * 3), total_fwd, max_fwd)
+    bwd_t, _ = _masked_block(rng, duration / total_bwd, duration / (total_bwd * 3), total_bwd, max_bwd)
+    np.abs(fwd_t, out=fwd_t)
+    np.abs(bwd_t, out=bwd_t)
+
+    f_sum, f_mean, f_std, f_max, f_min = _stats(fwd_x, fwd_m, total_fwd)
+    b_sum, b_mean, b_std, b_max, b_min = _stats(bwd_x, bwd_m, total_bwd)
+    ft_sum, ft_mean, ft_std, ft_max, ft_min = _stats(fwd_t, fwd_m, total_fwd)
+    bt_sum, bt_mean, bt_std, bt_max, bt_min = _stats(bwd_t, bwd_m, total_bwd)
+    iat_mean, iat_std = _joint_mean_std(fwd_t, fwd_m, bwd_t, bwd_m, ft_sum, bt_sum, total_fwd, total_bwd)
+    len_mean, len_std = _joint_mean_std(fwd_x, fwd_m, bwd_x, bwd_m, f_sum, b_sum, total_fwd, total_bwd)
+
+    flag = lambda: _randint(rng, 0, 1, n)
+    header = lambda: _randint(rng, 20, 60, n)
+    X = np.empty((n, N_FEATURES), dtype=np.float64)
+    X[:, 0] = _randint(rng, 1, 65535, n)                    # Destination Port
+    X[:, 1] = duration                                       # Flow Duration
+    X[:, 2] = total_fwd                                      # Total Fwd Packets
+    X[:, 3] = total_bwd                                      # Total Backward Packets
+    X[:, 4:14] = np.column_stack([f_sum, b_sum, f_max, f_min, f_mean, f_std, b_max, b_min, b_mean, b_std])
+    X[:, 14] = (f_sum + b_sum) / duration * 1000             # Flow Bytes/s
+    X[:, 15] = total_pkts / duration * 1000                  # Flow Packets/s
+    X[:, 16:20] = np.column_stack([iat_mean, iat_std, np.maximum(ft_max, bt_max), np.minimum(ft_min, bt_min)])
+    X[:, 20:25] = np.column_stack([ft_sum, ft_mean, ft_std, ft_max, ft_min])      # FWD IAT
+    X[:, 25:30] = np.column_stack([bt_sum, bt_mean, bt_std, bt_max, bt_min])      # BWD IAT
+    X[:, 30:34] = np.column_stack([flag() for _ in range(4)])                     # PSH/URG fwd/bwd
+    X[:, 34] = header()                                      # Fwd Header Length
+    X[:, 35] = header()                                      # Bwd Header Length
+    X[:, 36] = total_fwd / (duration / 1000)
+    X[:, 37] = total_bwd / (duration / 1000)
+    X[:, 38] = np.minimum(f_min, b_min)                      # Packet length global
+    X[:, 39] = np.maximum(f_max, b_max)
+    X[:, 40] = len_mean
+    X[:, 41] = len_std
+    X[:, 42] = len_std ** 2
+    X[:, 43:51] = np.column_stack([flag() for _ in range(8)])                     # FIN..ECE
+    X[:, 51] = total_bwd / total_fwd                         # Down/Up ratio
+    X[:, 52] = len_mean                                      # Avg Packet Size
+    X[:, 53] = f_mean                                        # Avg Segment Sizes
+    X[:, 54] = b_mean
+    X[:, 55] = header()                                      # Fwd Header Length (duplikat)
+    X[:, 56:62] = 0                                          # Bulk features
+    X[:, 62:66] = np.column_stack([total_fwd, f_sum, total_bwd, b_sum])           # Subflow
+    X[:, 66] = _randint(rng, 0, 60000, n)                    # Window sizes
+    X[:, 67] = _randint(rng, 0, 60000, n)
+    X[:, 68] = rng.integers(0, total_fwd + 1)                # Act data pkt fwd
+    X[:, 69] = 20                                            # Minimum segment size
+    X[:, 70:78] = rng.random((n, len(ACTIVE_IDLE_SCALE))) * np.array(ACTIVE_IDLE_SCALE)  # Active / Idle
+    return X
+
+# -------------------------------------------------------------
+# API
+# -------------------------------------------------------------
+def _generate_chunk(n, attack_ratio, seed_seq, block_rows=BLOCK_ROWS):
+    """Jeden chunk: dokładnie round(n * attack_ratio) ataków, wiersze przemieszane."""
+    rng = np.random.default_rng(seed_seq)
+    n_attack = int(round(n * attack_ratio))
+    y = np.zeros(n, dtype=np.int8)
+    y[:n_attack] = 1
+    X = np.empty((n, N_FEATURES), dtype=np.float64)
+    for start in range(0, n, block_rows):
+        stop = min(start + block_rows, n)
+        # blok jednej klasy — bez marnowania maski na krótkie flowy BENIGN
+        for label in (0, 1):
+            lo = start if label == 0 else max(start, n - n_attack)
+            hi = min(stop, n - n_attack) if label == 0 else stop
+            if hi > lo:
+                X[lo:hi] = _generate_block(rng, hi - lo, label)
+    order = rng.permutation(n)
+    return X[order], y[order]
+
+def _chunk_sizes(n, rows_per_chunk):
+    return [min(rows_per_chunk, n - start) for start in range(0, n, rows_per_chunk)]
+
+def generate_synthetic_flows(n, attack_ratio=0.5, seed=None, rows_per_chunk=ROWS_PER_CHUNK, workers=1):
     """
-    Tworzy syntetyczny flow z 78 cechami kompatybilnymi z CICIDS2017.
-    label = "BENIGN" albo "ATTACK"
-    Zwraca: numpy.array shape (78,)
+    Zwraca (X, y): X float64 (n, 78), y int8 (0 = BENIGN, 1 = ATTACK).
+    Ten sam seed i rows_per_chunk → identyczny wynik (także przy workers > 1).
     """
-
-    if label == "BENIGN":
-        total_fwd = random.randint(10, 80)
-        total_bwd = random.randint(5, 60)
-        duration = random.randint(2000, 200000)      # 2 ms - 200 ms
-        pkt_size_base = random.randint(40, 400)
+    sizes = _chunk_sizes(n, rows_per_chunk)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if workers > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_generate_chunk, sizes, [attack_ratio] * len(sizes), seeds))
+    else:
+        parts = [_generate_chunk(s, attack_ratio, ss) for s, ss in zip(sizes, seeds)]
+    if not parts:
+        return np.empty((0, N_FEATURES)), np.empty(0, dtype=np.int8)
+    return np.vstack([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+def _write_chunk(out_dir, name, n, attack_ratio, seed_seq):
+    X, y = _generate_chunk(n, attack_ratio, seed_seq)
+    return write_shard(out_dir, name, X, y)
+
+def write_synthetic_chunks(n, out_dir, attack_ratio=0.5, seed=None, rows_per_chunk=ROWS_PER_CHUNK,
+                           workers=1, prefix="synthetic"):
+    """Zapisuje shardy <prefix>_shard0000_X.npy / _y.npy, ... + manifest.json. Zwraca wpisy manifestu."""
+    os.makedirs(out_dir, exist_ok=True)
+    remove_shards(out_dir)
+    sizes = _chunk_sizes(n, rows_per_chunk)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    names = [f"{prefix}_shard{i:04d}" for i in range(len(sizes))]
+    args = ([out_dir] * len(sizes), names, sizes, [attack_ratio] * len(sizes), seeds)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            entries = list(pool.map(_write_chunk, *args))
     else:
-        # ATTACK → duże flowy, szybkie tempo, burst pattern
-        total_fwd = random.randint(150, 500)
-        total_bwd = random.randint(80, 300)
-        duration = random.randint(200, 3000)         # ekstremalnie szybkie flow
-        pkt_size_base = random.randint(400, 1400)
+        entries = [_write_chunk(*a) for a in zip(*args)]
+    write_manifest(out_dir, entries, extra={"synthetic": {"seed": seed, "attack_ratio": attack_ratio}})
+    return entries
 
-    total_pkts = total_fwd + total_bwd
+_default_rng = np.random.default_rng()
 
-    # Wygeneruj losowe pakiety
-    fwd_sizes = np.random.normal(pkt_size_base, pkt_size_base/4, total_fwd).clip(20, 1500)
-    bwd_sizes = np.random.normal(pkt_size_base/1.5, pkt_size_base/3, total_bwd).clip(20, 1500)
-
-    # Times (IAT)
-    fwd_iat = np.abs(np.random.normal(duration/total_fwd, duration/(total_fwd*3), total_fwd))
-    bwd_iat = np.abs(np.random.normal(duration/total_bwd, duration/(total_bwd*3), total_bwd))
-
-    # Konwersja na cechy (tak jak w CICIDS2017 — uproszczone, ale zgodne z formatem)
-    features = [
-        random.randint(1, 65535),                          # Destination Port
-        duration,                                           # Flow Duration
-        total_fwd,                                          # Total Fwd Packets
-        total_bwd,                                          # Total Backward Packets
-        fwd_sizes.sum(),                                    # Total Len Fwd
-        bwd_sizes.sum(),                                    # Total Len Bwd
-        fwd_sizes.max(),
-        fwd_sizes.min(),
-        fwd_sizes.mean(),
-        fwd_sizes.std(),
-        bwd_sizes.max(),
-        bwd_sizes.min(),
-        bwd_sizes.mean(),
-        bwd_sizes.std(),
-
-        # Flow Bytes/s
-        (fwd_sizes.sum() + bwd_sizes.sum()) / duration * 1000,
-        # Flow Packets/s
-        total_pkts / duration * 1000,
-
-        # Flow IAT
-        np.concatenate([fwd_iat, bwd_iat]).mean(),
-        np.concatenate([fwd_iat, bwd_iat]).std(),
-        np.concatenate([fwd_iat, bwd_iat]).max(),
-        np.concatenate([fwd_iat, bwd_iat]).min(),
-
-        # FWD IAT
-        fwd_iat.sum(),
-        fwd_iat.mean(),
-        fwd_iat.std(),
-        fwd_iat.max(),
-        fwd_iat.min(),
-
-        # BWD IAT
-        bwd_iat.sum(),
-        bwd_iat.mean(),
-        bwd_iat.std(),
-        bwd_iat.max(),
-        bwd_iat.min(),
-
-        # Flags
-        random.randint(0, 1),  # Fwd PSH
-        random.randint(0, 1),  # Bwd PSH
-        random.randint(0, 1),  # Fwd URG
-        random.randint(0, 1),  # Bwd URG
-
-        random.randint(20, 60),  # Fwd Header Length
-        random.randint(20, 60),  # Bwd Header Length
-
-        # Packet rates
-        total_fwd / (duration / 1000),
-        total_bwd / (duration / 1000),
-
-        # Packet length global
-        min(fwd_sizes.min(), bwd_sizes.min()),
-        max(fwd_sizes.max(), bwd_sizes.max()),
-        np.concatenate([fwd_sizes, bwd_sizes]).mean(),
-        np.concatenate([fwd_sizes, bwd_sizes]).std(),
-        np.concatenate([fwd_sizes, bwd_sizes]).var(),
-
-        # Flag counters (random)
-        random.randint(0, 1),  # FIN
-        random.randint(0, 1),  # SYN
-        random.randint(0, 1),  # RST
-        random.randint(0, 1),  # PSH
-        random.randint(0, 1),  # ACK
-        random.randint(0, 1),  # URG
-        random.randint(0, 1),  # CWE
-        random.randint(0, 1),  # ECE
-
-        # Down/Up ratio
-        total_bwd / total_fwd if total_fwd else 0,
-
-        # Avg Packet Size
-        (np.concatenate([fwd_sizes, bwd_sizes]).mean()),
-
-        # Avg Segment Sizes
-        fwd_sizes.mean(),
-        bwd_sizes.mean(),
-
-        # Duplicate field in dataset
-        random.randint(20, 60),    # Fwd Header Length (duplicate)
-
-        # Bulk features — ustawione na 0 (tak było w dataset)
-        0, 0, 0, 0, 0, 0,
-
-        # Subflow
-        total_fwd, fwd_sizes.sum(), total_bwd, bwd_sizes.sum(),
-
-        # Window sizes
-        random.randint(0, 60000),
-        random.randint(0, 60000),
-
-        # Act data pkt fwd
-        random.randint(0, total_fwd),
-
-        # Minimum segment size
-        20,
-
-        # Active / Idle
-        random.random() * 5000,
-        random.random() * 2000,
-        random.random() * 7000,
-        random.random() * 100,
-
-        random.random() * 10000,
-        random.random() * 3000,
-        random.random() * 15000,
-        random.random() * 100,
-    ]
-
-    return np.array(features, dtype=float)
+def generate_synthetic_flow(label="BENIGN", rng=None):
+    """
+    Tworzy syntetyczny flow z 78 cechami kompatybilnymi z CICIDS2017.
+    label = "BENIGN" albo "ATTACK"
+    Zwraca: numpy.array shape (78,)
+    """
+    return _generate_block(rng or _default_rng, 1, 0 if label == "BENIGN" else 1)[0]
+
+def parse_args():
+    from config_and_db import DATA_DIR
+    p = argparse.ArgumentParser(description="Generowanie syntetycznych flowów (shardy .npy na dysk).")
+    p.add_argument("--rows", type=int, required=True)
+    p.add_argument("--attack-ratio", type=float, default=0.5)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--out-dir", default=os.path.join(DATA_DIR, "synthetic"))
+    p.add_argument("--rows-per-chunk", type=int, default=ROWS_PER_CHUNK)
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    t0 = time.perf_counter()
+    written = write_synthetic_chunks(args.rows, args.out_dir, args.attack_ratio, args.seed,
+                                     args.rows_per_chunk, args.workers)
+    elapsed = time.perf_counter() - t0
+    print(f"🎉 {args.rows} flowów w {len(written)} shardach → {args.out_dir} "
+          f"({args.rows / elapsed:,.0f} wierszy/s)")
+
+if __name__ == "__main__":
+    main()
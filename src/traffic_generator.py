@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+traffic_generator.py
+
+Generator ruchu testowego na interfejsie loopback (lo) do testów obciążeniowych silnika.
+- Ramki budowane raz (scapy) jako szablony; warianty (porty, adres źródłowy) powstają przez
+  podmianę bajtów i przyrostową korektę sum kontrolnych (RFC 1624) — bez scapy w pętli wysyłki
+- Wysyłka przez gniazdo AF_PACKET paczkami ramek, z precyzyjnym tempem (sleep + dokładne czekanie)
+- Scenariusze: syn_flood, udp_flood, slow_scan, benign_http (sesje z odpowiedziami serwera)
+- Wiele procesów wysyłających (--workers), każdy z własnym gniazdem i częścią tempa
+Uwaga: gniazdo AF_PACKET wymaga roota (lub CAP_NET_RAW).
+"""
+
+import sys
+import time
+import errno
+import socket
+import argparse
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scapy.layers.l2 import Ether
+from scapy.layers.inet import IP, TCP, UDP
+from scapy.packet import Raw
+
+INTERFACE = "lo"
+TARGET_IP = "127.0.0.1"
+ATTACKER_IP = "127.0.0.2"
+MAX_BATCH = 256
+SPIN_THRESHOLD = 0.002    # poniżej tego czasu czekamy aktywnie zamiast time.sleep
+LO_MAC = "00:00:00:00:00:00"  # lo: nagłówek Ethernet z zerowymi adresami (bez zapytań ARP)
+
+# -------------------------------------------------------------
+# SZABLONY RAMEK
+# -------------------------------------------------------------
+def _csum_replace(csum, old, new):
+    """Przyrostowa korekta 16-bitowej sumy kontrolnej po zmianie słowa old → new (RFC 1624)."""
+    s = (~csum & 0xFFFF) + (~old & 0xFFFF) + new
+    s = (s & 0xFFFF) + (s >> 16)
+    s = (s & 0xFFFF) + (s >> 16)
+    return ~s & 0xFFFF
+
+class FrameTemplate:
+    """Gotowa ramka Ether/IP/(TCP|UDP); variant() podmienia porty / IP źródłowy."""
+    def __init__(self, pkt):
+        self.frame = bytes(pkt)
+        self.ip_off = 14
+        ihl = (self.frame[self.ip_off] & 0x0F) * 4
+        self.l4_off = self.ip_off + ihl
+        self.l4_csum_off = self.l4_off + (16 if TCP in pkt else 6)
+
+    @staticmethod
+    def _get16(b, off):
+        return (b[off] << 8) | b[off + 1]
+
+    @staticmethod
+    def _put16(b, off, v):
+        b[off] = v >> 8
+        b[off + 1] = v & 0xFF
+
+    def _replace16(self, b, off, new, csum_offs):
+        old = self._get16(b, off)
+        self._put16(b, off, new)
+        for c in csum_offs:
+            cur = self._get16(b, c)
+            if c == self.l4_csum_off and cur == 0 and self.l4_csum_off == self.l4_off + 6:
+                continue  # UDP bez sumy kontrolnej
+            self._put16(b, c, _csum_replace(cur, old, new))
+
+    def _replace_ip(self, b, off, ip):
+        # adres jest w nagłówku IP i w pseudo-nagłówku sumy L4
+        raw = socket.inet_aton(ip)
+        for i in (0, 2):
+            self._replace16(b, off + i, (raw[i] << 8) | raw[i + 1], (self.ip_off + 10, self.l4_csum_off))
+
+    def variant(self, sport=None, dport=None, src_ip=None, dst_ip=None):
+        b = bytearray(self.frame)
+        if sport is not None:
+            self._replace16(b, self.l4_off, int(sport), (self.l4_csum_off,))
+        if dport is not None:
+            self._replace16(b, self.l4_off + 2, int(dport), (self.l4_csum_off,))
+        if src_ip is not None:
+            self._replace_ip(b, self.ip_off + 12, src_ip)
+        if dst_ip is not None:
+            self._replace_ip(b, self.ip_off + 16, dst_ip)
+        return bytes(b)
+
+@lru_cache(maxsize=None)
+def _tcp(src, dst, sport, dport, flags, payload=0):
+    pkt = Ether(src=LO_MAC, dst=LO_MAC) / IP(src=src, dst=dst) / TCP(sport=sport, dport=dport, flags=flags)
+    return FrameTemplate(pkt / Raw(b"\x00" * payload) if payload else pkt)
+
+def _udp(src, dst, sport, dport, payload=0):
+    pkt = Ether(src=LO_MAC, dst=LO_MAC) / IP(src=src, dst=dst) / UDP(sport=sport, dport=dport)
+    return FrameTemplate(pkt / Raw(b"\x00" * payload) if payload else pkt)
+
+# -------------------------------------------------------------
+# SCENARIUSZE (jeden cykl ramek + domyślne tempo)
+# -------------------------------------------------------------
+def syn_flood(rng, target=TARGET_IP, src=ATTACKER_IP, dport=80):
+    """Jak dawne main.py force_drop_test: SYN z losowych portów źródłowych — każdy pakiet to nowy flow."""
+    tpl = _tcp(src, target, 1024, dport, "S")
+    return [tpl.variant(sport=s) for s in rng.permutation(np.arange(1024, 65536))]
+
+def udp_flood(rng, target=TARGET_IP, src=ATTACKER_IP, n_variants=65536, payload=512):
+    tpl = _udp(src, target, 1024, 53, payload)
+    sports = rng.integers(1024, 65536, size=n_variants)
+    dports = rng.integers(1, 65536, size=n_variants)
+    return [tpl.variant(sport=s, dport=d) for s, d in zip(sports, dports)]
+
+def slow_scan(rng, target=TARGET_IP, src=ATTACKER_IP, ports=1024):
+    """SYN na kolejne porty docelowe (kolejność losowa, stały port źródłowy)."""
+    tpl = _tcp(src, target, 40000, 1, "S")
+    return [tpl.variant(dport=p) for p in rng.permutation(np.arange(1, ports + 1))]
+
+def benign_http(rng, target=TARGET_IP, n_sessions=2048, concurrent=32):
+    """
+    Sesje HTTP-podobne z odpowiedziami serwera: handshake, żądanie, kilka segmentów
+    odpowiedzi, zamknięcie. Sesje przeplatane po `concurrent` naraz.
+    """
+    clients = ["127.0.1.%d" % i for i in range(1, 255)]
+    c = lambda flags, payload=0: _tcp("127.0.1.1", target, 1024, 80, flags, payload)
+    s = lambda flags, payload=0: _tcp(target, "127.0.1.1", 80, 1024, flags, payload)
+    script = [c("S"), s("SA"), c("A"), c("PA", 320), s("A")]
+    script_tail = [c("A"), c("FA"), s("FA"), c("A")]
+
+    sessions = []
+    for _ in range(n_sessions):
+        sport = int(rng.integers(1024, 65536))
+        client = clients[int(rng.integers(len(clients)))]
+        # rozmiary segmentów zaokrąglone do 100 B — szablony z cache zamiast budowy w scapy
+        body = [s("PA", int(rng.integers(2, 14)) * 100) for _ in range(int(rng.integers(1, 8)))]
+        frames = []
+        for tpl in script + body + script_tail:
+            from_client = tpl.frame[tpl.l4_off + 2:tpl.l4_off + 4] == (80).to_bytes(2, "big")
+            if from_client:
+                frames.append(tpl.variant(sport=sport, src_ip=client))
+            else:
+                frames.append(tpl.variant(dport=sport, dst_ip=client))
+        sessions.append(frames)
+
+    # przeplatanie: w każdej grupie `concurrent` sesji ramki idą na zmianę
+    stream = []
+    for g in range(0, len(sessions), concurrent):
+        group = sessions[g:g + concurrent]
+        for step in range(max(len(x) for x in group)):
+            stream.extend(x[step] for x in group if step < len(x))
+    return stream
+
+SCENARIOS = {
+    "syn_flood": (syn_flood, 50_000),
+    "udp_flood": (udp_flood, 50_000),
+    "slow_scan": (slow_scan, 20),
+    "benign_http": (benign_http, 2_000),
+}
+
+# -------------------------------------------------------------
+# WYSYŁKA
+# -------------------------------------------------------------
+def open_socket(iface=INTERFACE):
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+    sock.bind((iface, 0))
+    return sock
+
+def send_frames(frames, rate, duration=None, count=None, iface=INTERFACE, batch=None, sock=None):
+    """
+    Wysyła ramki cyklicznie z tempem `rate` pakietów/s (0 = bez limitu) przez `duration`
+    sekund albo do `count` pakietów. Zwraca statystyki.
+    """
+    sock = sock or open_socket(iface)
+    send = sock.send
+    n = len(frames)
+    batch = batch or (MAX_BATCH if not rate else max(1, min(MAX_BATCH, int(rate // 1000))))
+    perf = time.perf_counter
+    t0 = perf()
+    deadline = t0 + duration if duration else None
+    sent = dropped = i = 0
+    while True:
+        if count is not None and sent + dropped >= count:
+            break
+        if deadline is not None and perf() >= deadline:
+            break
+        todo = batch if count is None else min(batch, count - sent - dropped)
+        for _ in range(todo):
+            try:
+                send(frames[i])
+                sent += 1
+            except OSError as e:
+                if e.errno not in (errno.ENOBUFS, errno.EAGAIN):
+                    raise
+                dropped += 1
+            i += 1
+            if i == n:
+                i = 0
+        if rate:
+            # pacing: pakiet k powinien wyjść w chwili t0 + k / rate
+            target = t0 + (sent + dropped) / rate
+            delay = target - perf()
+            if delay > SPIN_THRESHOLD:
+                time.sleep(delay - SPIN_THRESHOLD / 2)
+            while perf() < target:
+                pass
+    elapsed = perf() - t0
+    return {"sent": sent, "dropped": dropped, "seconds": elapsed, "pps": sent / elapsed if elapsed else 0.0}
+
+def _worker(scenario, seed, rate, duration, count, iface, target):
+    build, _ = SCENARIOS[scenario]
+    frames = build(np.random.default_rng(seed), target=target)
+    return send_frames(frames, rate, duration=duration, count=count, iface=iface)
+
+def run_scenario(scenario, rate=None, duration=None, count=None, workers=1, iface=INTERFACE,
+                 target=TARGET_IP, seed=42):
+    """Uruchamia scenariusz w `workers` procesach (tempo i liczba pakietów dzielone po równo)."""
+    if scenario not in SCENARIOS:
+        raise ValueError(f"Nieznany scenariusz: {scenario} (dostępne: {', '.join(SCENARIOS)})")
+    if duration is None and count is None:
+        raise ValueError("Podaj duration albo count")
+    rate = SCENARIOS[scenario][1] if rate is None else rate
+    per_rate = rate / workers if rate else 0
+    per_count = None if count is None else -(-count // workers)
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    if workers == 1:
+        results = [_worker(scenario, seeds[0], per_rate, duration, per_count, iface, target)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_worker, scenario, s, per_rate, duration, per_count, iface, target)
+                       for s in seeds]
+            results = [f.result() for f in futures]
+    total = {
+        "scenario": scenario,
+        "workers": workers,
+        "sent": sum(r["sent"] for r in results),
+        "dropped": sum(r["dropped"] for r in results),
+        "seconds": max(r["seconds"] for r in results),
+    }
+    total["pps"] = total["sent"] / total["seconds"] if total["seconds"] else 0.0
+    return total
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Generator ruchu testowego (AF_PACKET, interfejs lo).")
+    p.add_argument("scenario", choices=list(SCENARIOS))
+    p.add_argument("--rate", type=float, default=None, help="Pakiety/s łącznie (0 = bez limitu).")
+    p.add_argument("--duration", type=float, default=None, help="Czas trwania w sekundach.")
+    p.add_argument("--count", type=int, default=None, help="Liczba pakietów.")
+    p.add_argument("--workers", type=int, default=1)
+    p.add_argument("--iface", default=INTERFACE)
+    p.add_argument("--target", default=TARGET_IP)
+    p.add_argument("--seed", type=int, default=42)
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    if args.duration is None and args.count is None:
+        args.duration = 10.0
+    try:
+        res = run_scenario(args.scenario, args.rate, args.duration, args.count, args.workers,
+                           args.iface, args.target, args.seed)
+    except PermissionError:
+        print("❌ Gniazdo AF_PACKET wymaga uprawnień roota (lub CAP_NET_RAW).")
+        sys.exit(1)
+    print(f"✅ {res['scenario']}: wysłano {res['sent']} pakietów w {res['seconds']:.2f}s "
+          f"({res['pps']:,.0f} pkt/s, {res['workers']} procesów, odrzucone przez jądro: {res['dropped']})")
+
+if __name__ == "__main__":
+    main()
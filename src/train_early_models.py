@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+train_early_models.py
+
+Modele wczesnego werdyktu: klasyfikatory trenowane na cechach flowów uciętych
+po N pakietach (X_early_N.pkl z build_dataset_flow.py).
+- Jeden model na checkpoint, zapisywany w rejestrze jako Early<N> (scaler + klasyfikator)
+- Raport przy progu EARLY_DROP_THRESHOLD: jaka część ataków zostanie zablokowana
+  od razu i jaka część ruchu BENIGN zostałaby zablokowana błędnie
+- Wyniki zapisywane do tabeli logs
+"""
+
+import os
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.metrics import accuracy_score, f1_score
+
+from config_and_db import DATA_DIR, DB_PATH
+from model_registry import ModelRegistry, EARLY_CHECKPOINTS, EARLY_DROP_THRESHOLD, early_model_name
+from cascade import attack_probability
+from log_db import log_run
+
+def build_early_model():
+    # płytki las: szybka predykcja pojedynczego wiersza, dobrze skalibrowane predict_proba
+    return Pipeline([
+        ("scaler", StandardScaler()),
+        ("clf", RandomForestClassifier(n_estimators=50, max_depth=12, n_jobs=-1, random_state=42)),
+    ])
+
+def early_drop_report(model, X, y, threshold=EARLY_DROP_THRESHOLD):
+    """Odsetek ataków blokowanych od razu i odsetek BENIGN blokowanych błędnie."""
+    y = np.asarray(y).ravel()
+    dropped = attack_probability(model, X) >= threshold
+    attacks = y != 0
+    return {
+        "threshold": threshold,
+        "attack_caught": float(dropped[attacks].mean()) if attacks.any() else None,
+        "benign_dropped": float(dropped[~attacks].mean()) if (~attacks).any() else None,
+        "precision": float(attacks[dropped].mean()) if dropped.any() else None,
+    }
+
+def train_checkpoint(n, data_dir=DATA_DIR, threshold=EARLY_DROP_THRESHOLD):
+    X = pd.read_pickle(os.path.join(data_dir, f"X_early_{n}.pkl")).values
+    y = pd.read_pickle(os.path.join(data_dir, f"y_early_{n}.pkl")).values.ravel()
+    if len(np.unique(y)) < 2:
+        raise ValueError(f"checkpoint {n}: potrzebne obie klasy (BENIGN i ATTACK)")
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, stratify=y, random_state=42)
+    model = build_early_model()
+    model.fit(X_train, y_train)
+
+    y_pred = model.predict(X_test)
+    report = early_drop_report(model, X_test, y_test, threshold)
+    report.update({
+        "checkpoint": n,
+        "n_rows": int(X.shape[0]),
+        "accuracy": float(accuracy_score(y_test, y_pred)),
+        "f1": float(f1_score(y_test, y_pred, average="weighted")),
+    })
+    return model, report
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Trenowanie modeli wczesnego werdyktu (po N pakietach).")
+    p.add_argument("--checkpoints", nargs="*", type=int, default=list(EARLY_CHECKPOINTS))
+    p.add_argument("--threshold", type=float, default=EARLY_DROP_THRESHOLD)
+    p.add_argument("--data-dir", default=DATA_DIR)
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    registry = ModelRegistry()
+    for n in args.checkpoints:
+        try:
+            model, report = train_checkpoint(n, args.data_dir, args.threshold)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"⚠️ Pomijam checkpoint {n}: {e}")
+            continue
+
+        path = registry.publish(model, early_model_name(n), extra=report)
+        caught = report["attack_caught"] or 0.0
+        benign = report["benign_dropped"] or 0.0
+        print(f"✅ Early{n}: accuracy={report['accuracy']:.4f} F1={report['f1']:.4f} | "
+              f"p>={args.threshold}: ataki blokowane od razu {caught * 100:.1f}%, "
+              f"BENIGN błędnie {benign * 100:.2f}% → {path}")
+        try:
+            log_run(script="train_early_models",
+                    n_rows=report["n_rows"],
+                    models_used=early_model_name(n),
+                    ensemble_used=False,
+                    accuracy=report["accuracy"],
+                    f1_score=report["f1"],
+                    notes=json.dumps(report),
+                    db_path=DB_PATH)
+        except Exception as e:
+            print(f"Błąd logowania: {e}")
+
+if __name__ == "__main__":
+    main()
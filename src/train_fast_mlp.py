@@ -8,7 +8,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.neural_network import MLPClassifier
 from sklearn.metrics import accuracy_score
-from tqdm import tqdm
+from shard_loader import ShardSet
 
 BASE = "/home/jakub-wasiewicz/Desktop/inzynierka/projekt_inzynierski"
 
@@ -26,23 +26,11 @@ scaler = joblib.load(SCALER_PATH)
 print("Scaler załadowany.")
 
 # -----------------------------------------------------------
-# 2. Load chunks
+# 2. Load shards (float32 .npy przez mmap, manifest z normalize_dataset.py)
 # -----------------------------------------------------------
-chunk_files = [
-    os.path.join(NORMALIZED_DIR, f)
-    for f in os.listdir(NORMALIZED_DIR)
-    if f.endswith(".pkl") and f != "scaler.pkl"
-]
-
-X_list, y_list = [], []
-print("Ładowanie chunków...")
-for file in tqdm(chunk_files, desc="Chunk files"):
-    Xc, yc = joblib.load(file)
-    X_list.append(Xc)
-    y_list.append(yc)
-
-X = np.vstack(X_list)
-y = np.hstack(y_list)
+print("Ładowanie shardów...")
+shards = ShardSet(NORMALIZED_DIR)
+X, y, _ = shards.load_all()
 
 print("Kształt danych:", X.shape, y.shape)
 
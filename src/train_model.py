@@ -2,9 +2,12 @@
 """
 train_model.py - Trenuje modele ML dla CICIDS2017 w pipeline z scalerem.
 Zapisuje pipeline jako jeden plik .pkl dla realtime predykcji.
+--sample-weights: liczności wierszy po deduplikacji (data/w_train.pkl z build_dataset.py)
+jako sample_weight klasyfikatora.
 """
 
 import os
+import argparse
 import joblib
 import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
@@ -19,7 +22,20 @@ MODEL_DIR = "../models/"
 DB_PATH = "../logs/project_logs.db"
 os.makedirs(MODEL_DIR, exist_ok=True)
 
+def parse_args():
+    p = argparse.ArgumentParser(description="Trening RF / LR / MLP w pipeline ze scalerem.")
+    p.add_argument("--sample-weights", action="store_true",
+                   help="Użyj data/w_train.pkl (liczności po dedup_dataset.py) jako sample_weight.")
+    return p.parse_args()
+
+def load_weights(path):
+    if not os.path.exists(path):
+        print(f"⚠️ Brak {path} — trening bez wag")
+        return None
+    return pd.read_pickle(path).values.ravel().astype(float)
+
 def main():
+    args = parse_args()
     create_db(DB_PATH)
 
     # Wczytanie danych i scalera
@@ -28,6 +44,7 @@ def main():
     y_train = pd.read_pickle(os.path.join(DATA_DIR, "y_train.pkl")).values.ravel()
     y_test  = pd.read_pickle(os.path.join(DATA_DIR, "y_test.pkl")).values.ravel()
     scaler  = joblib.load(os.path.join(DATA_DIR, "scaler.pkl"))
+    w_train = load_weights(os.path.join(DATA_DIR, "w_train.pkl")) if args.sample_weights else None
 
     # Modele
     models = {
@@ -42,7 +59,8 @@ def main():
             ('scaler', scaler),
             ('clf', model)
         ])
-        pipeline.fit(X_train, y_train)
+        fit_params = {"clf__sample_weight": w_train} if w_train is not None else {}
+        pipeline.fit(X_train, y_train, **fit_params)
         y_pred = pipeline.predict(X_test)
 
         acc = accuracy_score(y_test, y_pred)
@@ -69,7 +87,8 @@ def main():
                     ensemble_used=False,
                     accuracy=acc,
                     f1_score=f1,
-                    notes="Pipeline ML bez klasy balansowanych, ensemble będzie stosowane",
+                    notes="Pipeline ML bez klasy balansowanych, ensemble będzie stosowane"
+                          + ("; sample_weight = liczności po deduplikacji" if w_train is not None else ""),
                     db_path=DB_PATH)
         except Exception as e:
             print(f"Błąd logowania: {e}")
@@ -3,12 +3,11 @@
 
 import os
 from joblib import load, dump
-import numpy as np
 from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.linear_model import LogisticRegression
 from sklearn.neural_network import MLPClassifier
-from tqdm import tqdm
+from shard_loader import ShardSet
 
 # -------------------------------
 # Ścieżki
@@ -29,41 +28,14 @@ if os.path.exists(SCALER_PATH):
         print(f"Nie udało się wczytać scalera: {e}")
 
 # -------------------------------
-# Znajdź wszystkie joblib chunk
+# Shardy float32 z manifestu (mmap) → jedna macierz
 # -------------------------------
-chunk_files = [os.path.join(DATA_DIR, f) for f in os.listdir(DATA_DIR) if f.endswith(".pkl")]
-print(f"Znaleziono {len(chunk_files)} chunków joblib.")
+shards = ShardSet(DATA_DIR)
+print(f"Znaleziono {len(shards)} shardów ({shards.n_rows} wierszy).")
 
-# -------------------------------
-# Wczytaj chunk bez błędów
-# -------------------------------
-chunks = []
-for file in tqdm(chunk_files, desc="Ładowanie chunków"):
-    try:
-        chunk = load(file)
-        if isinstance(chunk, tuple) and len(chunk) == 2:
-            chunks.append(chunk)
-        else:
-            print(f"Pomijam {file}: niepoprawna struktura ({type(chunk)})")
-    except Exception as e:
-        print(f"Nie udało się wczytać {file}: {e}")
-
-if len(chunks) == 0:
-    raise RuntimeError("Nie wczytano żadnego poprawnego chunku joblib!")
-
-print(f"Wczytano {len(chunks)}/{len(chunk_files)} poprawnych chunków.")
-
-# -------------------------------
-# Połącz dane
-# -------------------------------
-X_list, y_list = [], []
-for X_chunk, y_chunk in chunks:
-    X_list.append(X_chunk)
-    y_list.append(y_chunk)
-
-X = np.vstack(X_list)
-y = np.hstack(y_list)
-print(f"Złączono dane: X={X.shape}, y={y.shape}")
+# liczności wierszy po deduplikacji jako sample_weight (gdy shardy je mają)
+X, y, sample_weight = shards.load_all()
+print(f"Złączono dane: X={X.shape} {X.dtype}, y={y.shape}, wagi: {'tak' if sample_weight is not None else 'nie'}")
 
 # Skalowanie
 if scaler is not None:
@@ -75,7 +47,7 @@ if scaler is not None:
 # -------------------------------
 def train_and_save_model(model, model_name):
     print(f"\nTrenowanie modelu: {model_name}")
-    model.fit(X, y)
+    model.fit(X, y, sample_weight=sample_weight)
     path = os.path.join(MODEL_DIR, f"{model_name}.pkl")
     dump(model, path)  # używamy joblib
     print(f"Model {model_name} zapisany: {path}")
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+train_orchestrator.py
+
+Równoległe trenowanie modeli i przeszukiwanie hiperparametrów dla CICIDS2017.
+- Macierz treningowa zapisywana raz do pliku .npy i mapowana (mmap) przez workery bez kopiowania
+- Kandydaci (model + parametry) uruchamiani w puli procesów z budżetem CPU na zadanie
+- Wyniki (score, czas fit, latencja predykcji, rozmiar modelu) zapisywane do tabeli logs
+- Najlepszy kandydat z każdej rodziny zapisywany jako <Nazwa>_pipeline.pkl
+"""
+
+import os
+import json
+import time
+import pickle
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.neural_network import MLPClassifier
+from sklearn.model_selection import ParameterGrid
+from sklearn.pipeline import Pipeline
+from sklearn.metrics import accuracy_score, f1_score
+from threadpoolctl import threadpool_limits
+
+from config_and_db import DATA_DIR, MODEL_DIR, DB_PATH
+from log_db import log_run, create_db
+from model_registry import ModelRegistry
+
+MEMMAP_DIR = os.path.join(DATA_DIR, "memmap")
+CANDIDATES_DIR = os.path.join(MODEL_DIR, "candidates")
+LATENCY_ROWS = 200  # liczba pojedynczych wierszy do pomiaru latencji predykcji
+
+# -------------------------------------------------------------
+# PRZESTRZEŃ HIPERPARAMETRÓW
+# -------------------------------------------------------------
+SEARCH_SPACE = {
+    "RandomForest": (RandomForestClassifier, {
+        "n_estimators": [100, 200],
+        "max_depth": [None, 20],
+        "n_jobs": [-1],
+        "random_state": [42],
+    }),
+    "LogisticRegression": (LogisticRegression, {
+        "C": [0.1, 1.0, 10.0],
+        "max_iter": [1000],
+    }),
+    "MLP": (MLPClassifier, {
+        "hidden_layer_sizes": [(100, 50), (48, 24)],
+        "alpha": [1e-4, 1e-3],
+        "max_iter": [500],
+        "random_state": [42],
+    }),
+}
+
+# -------------------------------------------------------------
+# DANE WSPÓŁDZIELONE (memmap)
+# -------------------------------------------------------------
+def dump_memmap(X_train, y_train, X_test, y_test, memmap_dir=MEMMAP_DIR):
+    """Zapisuje macierze raz do .npy (float32/int8). Zwraca słownik ścieżek."""
+    os.makedirs(memmap_dir, exist_ok=True)
+    arrays = {
+        "X_train": np.ascontiguousarray(X_train, dtype=np.float32),
+        "y_train": np.ascontiguousarray(y_train, dtype=np.int8),
+        "X_test": np.ascontiguousarray(X_test, dtype=np.float32),
+        "y_test": np.ascontiguousarray(y_test, dtype=np.int8),
+    }
+    paths = {}
+    for name, arr in arrays.items():
+        paths[name] = os.path.join(memmap_dir, f"{name}.npy")
+        np.save(paths[name], arr)
+    return paths
+
+_worker_data = {}
+_worker_budget = 1
+
+def _init_worker(paths, cpu_budget):
+    """Inicjalizacja workera: mapuje dane tylko do odczytu i ustawia budżet CPU."""
+    global _worker_budget
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(cpu_budget)
+    _worker_budget = cpu_budget
+    for name, path in paths.items():
+        _worker_data[name] = np.load(path, mmap_mode="r")
+
+def _apply_cpu_budget(params, cpu_budget):
+    """n_jobs=-1 (lub większe od budżetu) zastępowane budżetem zadania."""
+    params = dict(params)
+    if "n_jobs" in params and (params["n_jobs"] is None or params["n_jobs"] < 0 or params["n_jobs"] > cpu_budget):
+        params["n_jobs"] = cpu_budget
+    return params
+
+def _measure_latency_us(model, X, n_rows=LATENCY_ROWS):
+    """Mediana czasu predykcji pojedynczego wiersza w mikrosekundach."""
+    n_rows = min(n_rows, X.shape[0])
+    times = []
+    for i in range(n_rows):
+        row = np.asarray(X[i:i + 1])
+        t0 = time.perf_counter()
+        model.predict(row)
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times) * 1e6) if times else None
+
+def _run_candidate(family, params, candidate_path):
+    """Trenuje jednego kandydata na współdzielonych danych i zwraca metryki."""
+    estimator_cls, _ = SEARCH_SPACE[family]
+    params = _apply_cpu_budget(params, _worker_budget)
+    X_train, y_train = _worker_data["X_train"], _worker_data["y_train"]
+    X_test, y_test = _worker_data["X_test"], _worker_data["y_test"]
+
+    with threadpool_limits(limits=_worker_budget):
+        model = estimator_cls(**params)
+        t0 = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_time = time.perf_counter() - t0
+
+        y_pred = model.predict(X_test)
+        latency_us = _measure_latency_us(model, X_test)
+
+    joblib.dump(model, candidate_path)
+    return {
+        "family": family,
+        "params": params,
+        "path": candidate_path,
+        "accuracy": float(accuracy_score(y_test, y_pred)),
+        "f1": float(f1_score(y_test, y_pred, average="weighted")),
+        "fit_time_s": fit_time,
+        "predict_latency_us": latency_us,
+        "model_size_bytes": len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)),
+    }
+
+# -------------------------------------------------------------
+# ORKIESTRACJA
+# -------------------------------------------------------------
+def build_jobs(families=None):
+    jobs = []
+    for family, (_, grid) in SEARCH_SPACE.items():
+        if families and family not in families:
+            continue
+        for i, params in enumerate(ParameterGrid(grid)):
+            jobs.append((family, params, os.path.join(CANDIDATES_DIR, f"{family}_{i}.pkl")))
+    return jobs
+
+def run_search(paths, jobs, workers, cpu_budget):
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(paths, cpu_budget)) as pool:
+        futures = {pool.submit(_run_candidate, *job): job for job in jobs}
+        for fut in as_completed(futures):
+            family, params, _ = futures[fut]
+            try:
+                res = fut.result()
+            except Exception as e:
+                print(f"❌ Kandydat {family} {params} nie powiódł się: {e}")
+                continue
+            print(f"✅ {family} {res['params']} → F1={res['f1']:.4f} "
+                  f"fit={res['fit_time_s']:.1f}s latencja={res['predict_latency_us']:.0f}µs")
+            results.append(res)
+    return results
+
+def pick_winners(results):
+    """Najwyższe F1 w rodzinie; przy remisie krótsza latencja predykcji."""
+    winners = {}
+    for res in results:
+        best = winners.get(res["family"])
+        key = (res["f1"], -(res["predict_latency_us"] or 0.0))
+        if best is None or key > (best["f1"], -(best["predict_latency_us"] or 0.0)):
+            winners[res["family"]] = res
+    return winners
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Równoległe trenowanie i przeszukiwanie hiperparametrów.")
+    p.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2),
+                   help="Liczba równoległych zadań (procesów).")
+    p.add_argument("--cpu-budget", type=int, default=None,
+                   help="Liczba rdzeni na zadanie (domyślnie cpu_count // workers).")
+    p.add_argument("--families", nargs="*", choices=list(SEARCH_SPACE.keys()),
+                   help="Ogranicz przeszukiwanie do wybranych rodzin modeli.")
+    p.add_argument("--keep-candidates", action="store_true", help="Nie usuwaj plików przegranych kandydatów.")
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    create_db(DB_PATH)
+    cpu_budget = args.cpu_budget or max(1, (os.cpu_count() or 1) // args.workers)
+
+    # Dane z build_dataset są już zeskalowane scalerem z data/scaler.pkl
+    X_train = pd.read_pickle(os.path.join(DATA_DIR, "X_train.pkl")).values
+    X_test  = pd.read_pickle(os.path.join(DATA_DIR, "X_test.pkl")).values
+    y_train = pd.read_pickle(os.path.join(DATA_DIR, "y_train.pkl")).values.ravel()
+    y_test  = pd.read_pickle(os.path.join(DATA_DIR, "y_test.pkl")).values.ravel()
+    scaler  = joblib.load(os.path.join(DATA_DIR, "scaler.pkl"))
+
+    paths = dump_memmap(X_train, y_train, X_test, y_test)
+    n_rows = int(X_train.shape[0])
+    del X_train, X_test, y_train, y_test
+    print(f"Dane zapisane do memmap: {MEMMAP_DIR}")
+
+    os.makedirs(CANDIDATES_DIR, exist_ok=True)
+    jobs = build_jobs(args.families)
+    print(f"➡️ {len(jobs)} kandydatów, {args.workers} workerów × {cpu_budget} CPU\n")
+
+    results = run_search(paths, jobs, args.workers, cpu_budget)
+    winners = pick_winners(results)
+
+    for res in results:
+        is_winner = winners.get(res["family"]) is res
+        notes = {
+            "params": {k: v for k, v in res["params"].items()},
+            "fit_time_s": round(res["fit_time_s"], 3),
+            "predict_latency_us": res["predict_latency_us"],
+            "model_size_bytes": res["model_size_bytes"],
+            "winner": is_winner,
+        }
+        try:
+            log_run(script="train_orchestrator",
+                    n_rows=n_rows,
+                    models_used=res["family"],
+                    ensemble_used=False,
+                    accuracy=res["accuracy"],
+                    f1_score=res["f1"],
+                    notes=json.dumps(notes, default=str),
+                    db_path=DB_PATH)
+        except Exception as e:
+            print(f"Błąd logowania: {e}")
+
+    # Zwycięzcy: dopasowany scaler (fit na surowych danych) + klasyfikator
+    registry = ModelRegistry()
+    for family, res in winners.items():
+        pipeline = Pipeline([
+            ('scaler', scaler),
+            ('clf', joblib.load(res["path"]))
+        ])
+        filepath = registry.publish(pipeline, family, extra={"params": res["params"], "f1": res["f1"]})
+        print(f"🎉 {family}: najlepszy {res['params']} (F1={res['f1']:.4f}) → {filepath}")
+
+    if not args.keep_candidates:
+        shutil.rmtree(CANDIDATES_DIR, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()